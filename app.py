@@ -3,18 +3,44 @@
 # Description: Main FastAPI server for ChatterBox Text-to-Speech
 
 from contextlib import asynccontextmanager
+import asyncio
+import hashlib
 import os
 import time
 from datetime import datetime
 import uuid
+from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import markdown2
-from audio.audio_utils import convert_to_wav
-from audio.convert_audio import join_audio_files
-from tts.inference import generate_audio
-from tts.model import load_tts_model, unload_tts_model
+from audio.encoders import MAX_SPEED, MEDIA_TYPES, MIN_SPEED, StreamEncoder, apply_speed, can_encode, encode_audio, media_type
+from audio.stream import CrossfadeStreamer
+from tts.batcher import get_sample_rate, prepare_voice, start_backend, stop_backend, worker_stats
+from tts.chunker import TOKENS_PER_CHARACTER, chunk_text, needs_chunking, split_complete
+from tts.conditioning import pin_voice, unpin_voice
+from tts.inference import generate_audio, synthesize
+from tts.normalize import normalize_text
+from tts.janitor import get_janitor, start_janitor, stop_janitor, track_file
+from tts.jobs import get_job_manager, start_job_manager, stop_job_manager
+from tts.metrics import (
+    ENCODE_TIME,
+    ERRORS,
+    QUEUE_WAIT,
+    REJECTIONS,
+    REQUESTS,
+    RESPONSE_BYTES,
+    current_endpoint,
+    record_cache,
+    record_synthesis,
+    registry,
+    voice_label,
+)
+from tts.priority import PRIORITY_CLASSES, current_client, current_priority
+from tts.result_cache import get_result_cache
+from tts.profiling import profiler
+from tts.scheduler import QueueFullError, get_scheduler, start_scheduler, stop_scheduler
+from tts.tracing import current_span, record_span, server_timing, span, tracer
 from tts.voices import add_voice, get_voice_by_name, get_voices
+from tts.warmup import run_warmup, warmup_state
 
 # Delete restart.flag if it exists (to ensure clean restart)
 if os.path.exists("restart.flag"):
@@ -62,29 +88,47 @@ ensure_env_file_exists()
 # Load environment variables from .env file
 load_dotenv(override=True)
 
-from fastapi import FastAPI, Request, Form, HTTPException, Depends, File, UploadFile
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, StreamingResponse
+from fastapi import FastAPI, Request, Form, HTTPException, Depends, File, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
-
-model = None
+from starlette.requests import HTTPConnection
+from config.constants import (
+    API_ONLY,
+    INFERENCE_BACKEND,
+    INFERENCE_RETRY_AFTER,
+    JOB_MAX_CHARACTERS,
+    STREAM_CHUNK_SIZE,
+    STREAM_FIRST_CHUNK_SIZE,
+    STREAM_THRESHOLD,
+    TRACE_DEBUG_HEADER,
+    TRACING_ENABLED,
+)
 
 
 @asynccontextmanager
 async def startup_event(app: FastAPI):
     # Startup logic
-    global model
-    if model is None:
-        print("Loading Chatterbox TTS model")
-        model = load_tts_model()
+    print(f"Loading Chatterbox TTS model ({INFERENCE_BACKEND} backend)")
+    start_backend()
 
     print("Model loaded")
+    await start_scheduler()
+    start_janitor()
+    # Unfinished jobs from a previous run resume from their last checkpointed chunk
+    await start_job_manager()
+    # Warm up in the background so /healthz answers while /readyz keeps traffic away
+    warmup_task = asyncio.create_task(asyncio.to_thread(run_warmup))
   
     yield
     # Shutdown logic (optional)
+    warmup_task.cancel()
+    await stop_job_manager()
+    stop_janitor()
+    await stop_scheduler()
     print("Model unloaded")
-    unload_tts_model()
+    stop_backend()
 
 
 # Create FastAPI app
@@ -96,13 +140,6 @@ app = FastAPI(
 )
 
 
-# after the model is loaded, load the custom voice interface
-from ui.custom_voice import voice_interface
-import gradio as gr
-
-
-
-
 # Ensure directories exist
 os.makedirs("outputs", exist_ok=True)
 os.makedirs("voices", exist_ok=True)
@@ -115,8 +152,252 @@ app.mount("/voices", StaticFiles(directory="voices"), name="voices")
 
 
 
-print("Mounting custom voice interface")
-app = gr.mount_gradio_app(app, voice_interface, path="/custom_voice")
+if not API_ONLY:
+    # Gradio and the voice UI are only imported when the UI is served
+    from ui.custom_voice import voice_interface
+    import gradio as gr
+
+    print("Mounting custom voice interface")
+    app = gr.mount_gradio_app(app, voice_interface, path="/custom_voice")
+
+
+# Endpoints whose requests are counted and labelled in /metrics
+SYNTHESIS_ENDPOINTS = ("/v1/audio/speech", "/speak")
+
+
+@app.middleware("http")
+async def synthesis_metrics(request: Request, call_next):
+    """Count synthesis requests, server errors and audio bytes sent, labelled by endpoint and voice"""
+    endpoint = request.url.path
+    if endpoint not in SYNTHESIS_ENDPOINTS:
+        return await call_next(request)
+    token = current_endpoint.set(endpoint)
+    try:
+        response = await call_next(request)
+    except Exception:
+        ERRORS.inc(endpoint=endpoint, voice=getattr(request.state, "voice", "unknown"))
+        raise
+    finally:
+        current_endpoint.reset(token)
+    # Handlers set the voice label once they have resolved the voice
+    voice = getattr(request.state, "voice", "unknown")
+    REQUESTS.inc(endpoint=endpoint, voice=voice)
+    if response.status_code >= 500:
+        ERRORS.inc(endpoint=endpoint, voice=voice)
+    content_length = response.headers.get("content-length")
+    if content_length and response.headers.get("content-type", "").startswith("audio/"):
+        RESPONSE_BYTES.observe(int(content_length), endpoint=endpoint, format=getattr(request.state, "response_format", "wav"))
+    return response
+
+
+@app.middleware("http")
+async def request_tracing(request: Request, call_next):
+    """Trace synthesis requests stage by stage and profile slow ones.
+
+    Requests are traced when TRACING_ENABLED is set, when they carry an X-Debug-Trace
+    header (answered with Server-Timing and X-Trace-Id headers), or when the slow
+    request profiler is on. Streamed responses are finished once the stream ends.
+    """
+    endpoint = request.url.path
+    debug = TRACE_DEBUG_HEADER and "x-debug-trace" in request.headers
+    if endpoint not in SYNTHESIS_ENDPOINTS or not (TRACING_ENABLED or debug or profiler.enabled):
+        return await call_next(request)
+
+    root = tracer.start_trace(endpoint, method=request.method)
+    if profiler.enabled:
+        profiler.start(root.trace_id)
+
+    def finish(status):
+        root.attributes.update(status=status, voice=getattr(request.state, "voice", "unknown"))
+        tracer.end_trace(root)
+        if profiler.enabled:
+            profiler.stop(root.trace_id, root.duration_ms)
+
+    token = current_span.set(root)
+    try:
+        response = await call_next(request)
+    except Exception as e:
+        root.error = f"{type(e).__name__}: {e}"
+        finish(500)
+        raise
+    finally:
+        current_span.reset(token)
+
+    if debug:
+        response.headers["Server-Timing"] = server_timing(tracer.spans(root.trace_id), root.duration_ms)
+        response.headers["X-Trace-Id"] = root.trace_id
+    body = response.body_iterator
+
+    async def traced_body():
+        try:
+            async for part in body:
+                yield part
+        finally:
+            finish(response.status_code)
+
+    response.body_iterator = traced_body()
+    return response
+
+
+def request_client(request: HTTPConnection):
+    """Client identity used for fair queuing: X-Client-Id, else the API key, else the peer address"""
+    if request.headers.get("x-client-id"):
+        return request.headers["x-client-id"]
+    if request.headers.get("authorization"):
+        # Hashed so API keys never end up in logs or stats
+        return "key-" + hashlib.sha256(request.headers["authorization"].encode()).hexdigest()[:12]
+    return request.client.host if request.client else "anonymous"
+
+
+def invalid_priority(priority: str):
+    return f"Unknown priority '{priority}', expected one of: {', '.join(PRIORITY_CLASSES)}"
+
+
+@app.middleware("http")
+async def request_priority(request: Request, call_next):
+    """Queue synthesis work under the caller's client id and X-Priority class (interactive by default)"""
+    if request.url.path not in SYNTHESIS_ENDPOINTS and request.url.path != "/v1/audio/jobs":
+        return await call_next(request)
+    priority = request.headers.get("x-priority", "").strip().lower() or current_priority.get()
+    if priority not in PRIORITY_CLASSES:
+        return JSONResponse(status_code=400, content={"detail": invalid_priority(priority)})
+    priority_token = current_priority.set(priority)
+    client_token = current_client.set(request_client(request))
+    try:
+        return await call_next(request)
+    finally:
+        current_priority.reset(priority_token)
+        current_client.reset(client_token)
+
+
+def use_priority(priority: Optional[str]):
+    """Apply a priority given in the request body, which takes precedence over the X-Priority header"""
+    if priority is None:
+        return
+    if priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail=invalid_priority(priority))
+    current_priority.set(priority)
+
+
+async def run_inference(fn, **kwargs):
+    """Run a blocking TTS call on the inference scheduler so the event loop stays responsive"""
+    endpoint = current_endpoint.get()
+    queued = time.perf_counter()
+    queued_ns = time.time_ns()
+
+    def timed(**kwargs):
+        QUEUE_WAIT.observe(time.perf_counter() - queued, endpoint=endpoint)
+        record_span(current_span.get(), "queue_wait", queued_ns)
+        return fn(**kwargs)
+
+    try:
+        return await get_scheduler().run(timed, **kwargs)
+    except QueueFullError:
+        REJECTIONS.inc(endpoint=endpoint, reason="queue_full")
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry later",
+            headers={"Retry-After": str(INFERENCE_RETRY_AFTER)},
+        )
+    except asyncio.TimeoutError:
+        REJECTIONS.inc(endpoint=endpoint, reason="timeout")
+        raise HTTPException(status_code=504, detail="Speech generation timed out")
+
+
+def wants_cache(http_request: Request, cache: bool = True):
+    """Callers bypass the result cache with "cache": false or a Cache-Control: no-cache/no-store header"""
+    cache_control = http_request.headers.get("cache-control", "").lower()
+    return cache and "no-cache" not in cache_control and "no-store" not in cache_control
+
+
+async def lookup_cached_speech(text: str, voice_path: str, exaggeration: float, cfg_weight: float, response_format: str = "wav", speed: float = 1.0):
+    """Return (cache_key, cached bytes or None) for a synthesis request"""
+    result_cache = get_result_cache()
+    with span("cache_lookup") as stage:
+        cache_key = await asyncio.to_thread(result_cache.make_key, text, voice_path, exaggeration, cfg_weight, response_format, speed)
+        cached = await asyncio.to_thread(result_cache.get, cache_key)
+        if stage:
+            stage.attributes["hit"] = cached is not None
+    record_cache("result", cached is not None, voice_path)
+    return cache_key, cached
+
+
+async def stream_speech_response(text: str, response_format: str = "wav", speed: float = 1.0, cache_key: str = None, **voice_settings):
+    """Synthesize text chunk by chunk and stream each chunk's audio as soon as it is ready"""
+    with span("normalize"):
+        text = normalize_text(text)
+    chunks = chunk_text(text, STREAM_CHUNK_SIZE * TOKENS_PER_CHARACTER, first_target_tokens=STREAM_FIRST_CHUNK_SIZE * TOKENS_PER_CHARACTER)
+    if not chunks:
+        raise HTTPException(status_code=400, detail="Missing input text")
+
+    # Synthesize the first chunk before responding so a full queue or timeout still maps to an HTTP status
+    started = time.perf_counter()
+    first_audio = await run_inference(synthesize, text=chunks[0], use_cache=cache_key is not None, **voice_settings)
+    sample_rate = get_sample_rate()
+    streamer = CrossfadeStreamer(sample_rate)
+    encoder = StreamEncoder(sample_rate, response_format)
+    endpoint = current_endpoint.get()
+    priority, client = current_priority.get(), current_client.get()
+    encode_seconds = 0.0
+    audio_samples = 0
+
+    def encode_chunk(audio):
+        nonlocal encode_seconds, audio_samples
+        encode_started = time.perf_counter()
+        audio_samples += audio.shape[-1]
+        # Stretch before crossfading so chunk boundaries line up at the requested speed
+        with span("encode"):
+            data = encoder.push(streamer.push(apply_speed(audio.squeeze(0).numpy(), speed)))
+        encode_seconds += time.perf_counter() - encode_started
+        return data
+
+    def encode_tail():
+        nonlocal encode_seconds
+        encode_started = time.perf_counter()
+        with span("encode"):
+            data = encoder.push(streamer.flush()) + encoder.close()
+        encode_seconds += time.perf_counter() - encode_started
+        return data
+
+    async def audio_stream():
+        # The body is sent after the handler returns, so later chunks queue under the request's priority explicitly
+        current_priority.set(priority)
+        current_client.set(client)
+        audio = first_audio
+        next_chunk = None
+        parts = [encoder.start()]
+        yield parts[0]
+        try:
+            for index in range(len(chunks)):
+                # Queue the next chunk before sending this one so synthesis overlaps the network write
+                if index + 1 < len(chunks):
+                    next_chunk = asyncio.ensure_future(
+                        run_inference(synthesize, text=chunks[index + 1], use_cache=cache_key is not None, **voice_settings)
+                    )
+                parts.append(await asyncio.to_thread(encode_chunk, audio))
+                yield parts[-1]
+                if next_chunk is not None:
+                    audio = await next_chunk
+                    next_chunk = None
+            parts.append(await asyncio.to_thread(encode_tail))
+            yield parts[-1]
+            ENCODE_TIME.observe(encode_seconds, endpoint=endpoint, format=response_format)
+            RESPONSE_BYTES.observe(sum(len(part) for part in parts), endpoint=endpoint, format=response_format)
+            record_synthesis(voice_settings.get("voice_path"), time.perf_counter() - started, audio_samples / sample_rate, len(chunks))
+            if cache_key:
+                # Store a complete file so later hits get correct headers
+                await asyncio.to_thread(get_result_cache().put, cache_key, encoder.as_file(b"".join(parts)))
+        except Exception as e:
+            # Headers are already sent, so the stream can only end early
+            ERRORS.inc(endpoint=endpoint, voice=voice_label(voice_settings.get("voice_path")))
+            print(f"Error while streaming speech: {e}")
+        finally:
+            if next_chunk is not None:
+                next_chunk.cancel()
+            encoder.abort()
+
+    return StreamingResponse(audio_stream(), media_type=media_type(response_format))
+
 
 # API models
 class SpeechRequest(BaseModel):
@@ -125,6 +406,12 @@ class SpeechRequest(BaseModel):
     voice: str = "default"
     response_format: str = "wav" 
     speed: float = 1.0
+    # None streams automatically for long input
+    stream: Optional[bool] = None
+    # False skips the result cache and always generates fresh audio
+    cache: bool = True
+    # "interactive" or "bulk"; overrides the X-Priority header
+    priority: Optional[str] = None
 
 
 class APIResponse(BaseModel):
@@ -141,68 +428,297 @@ class CustomVoiceRequest(BaseModel):
     cfg_weight: float
 
 
+class JobRequest(BaseModel):
+    input: str
+    voice: str = "default"
+    response_format: str = "wav"
+    speed: float = 1.0
+
+
+def validate_speech_request(text: str, response_format: str, speed: float):
+    if not text:
+        raise HTTPException(status_code=400, detail="Missing input text")
+    validate_output(response_format, speed)
+
+
+def validate_output(response_format: str, speed: float):
+    if response_format not in MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported response_format '{response_format}', expected one of: {', '.join(MEDIA_TYPES)}",
+        )
+    if not can_encode(response_format):
+        raise HTTPException(status_code=400, detail=f"{response_format} requires ffmpeg")
+    if not MIN_SPEED <= speed <= MAX_SPEED:
+        raise HTTPException(status_code=400, detail=f"speed must be between {MIN_SPEED} and {MAX_SPEED}")
+
+
+def resolve_voice(voice: str):
+    """(voice_path, exaggeration, cfg_weight) for a voice name; "default" is the built-in voice"""
+    voice_obj = get_voice_by_name(voice)
+    if not voice_obj and voice is not None and voice != "default":
+        raise HTTPException(status_code=400, detail=f"Voice '{voice}' not found")
+    if not voice_obj:
+        return None, 0.5, 0.4
+    return voice_obj["path"], voice_obj["exaggeration"], voice_obj["cfg_weight"]
+
+
 # OpenAI-compatible API endpoint
 @app.post("/v1/audio/speech")
-async def create_speech_api(request: SpeechRequest):
+async def create_speech_api(request: SpeechRequest, http_request: Request):
     """
     Generate speech from text using the Orpheus TTS model.
     Compatible with OpenAI's /v1/audio/speech endpoint.
     """
-    if not request.input:
-        raise HTTPException(status_code=400, detail="Missing input text")
-
-    voice_obj = get_voice_by_name(request.voice)
-    if not voice_obj and request.voice is not None and request.voice != "default":
-        raise HTTPException(status_code=400, detail=f"Voice '{request.voice}' not found")
-    voice_path = voice_obj["path"] if voice_obj else None
-    exaggeration = voice_obj["exaggeration"] if voice_obj else 0.5
-    cfg_weight = voice_obj["cfg_weight"] if voice_obj else 0.4
-
-    # Generate unique filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    unique_id = str(uuid.uuid4())
-    output_path = f"outputs/{timestamp}_{unique_id}.wav"
-
-    # handle batching (1000 characters per chunk) 
-    if len(request.input) > 1000:
-        print(f"Using batching for long text from web form ({len(request.input)} characters)")
-
-        generate_audio(
+    validate_speech_request(request.input, request.response_format, request.speed)
+    use_priority(request.priority)
+    voice_path, exaggeration, cfg_weight = resolve_voice(request.voice)
+    http_request.state.voice = voice_label(voice_path)
+    http_request.state.response_format = request.response_format
+
+    cache_key = None
+    if wants_cache(http_request, request.cache):
+        cache_key, cached = await lookup_cached_speech(
+            request.input, voice_path, exaggeration, cfg_weight, request.response_format, request.speed
+        )
+        if cached is not None:
+            return Response(content=cached, media_type=media_type(request.response_format), headers={"X-Cache": "HIT"})
+
+    stream = request.stream if request.stream is not None else len(request.input) > STREAM_THRESHOLD
+    if stream:
+        return await stream_speech_response(
+            request.input,
+            request.response_format,
+            speed=request.speed,
+            cache_key=cache_key,
             voice_path=voice_path,
-            text=request.input,
             exaggeration=exaggeration,
             cfg_weight=cfg_weight,
-            output_path=output_path,
-            batching=True,
-        )
-        return FileResponse(
-            path=output_path,
-            media_type="audio/wav",
-            filename=os.path.basename(output_path),
         )
 
-    if voice_path:
-        generate_audio(
+    # Text too long for one generate call is split into chunks that are synthesized in parallel
+    batching = needs_chunking(normalize_text(request.input))
+    if batching:
+        print(f"Using batching for long text from web form ({len(request.input)} characters)")
+
+    # Encode straight from the generated samples into the response; nothing is written to disk
+    sample_rate, samples = await run_inference(
+        generate_audio,
+        voice_path=voice_path,
+        text=request.input,
+        exaggeration=exaggeration,
+        cfg_weight=cfg_weight,
+        batching=batching,
+        use_cache=cache_key is not None,
+    )
+    with span("encode"), ENCODE_TIME.time(endpoint=current_endpoint.get(), format=request.response_format):
+        data = await asyncio.to_thread(encode_audio, samples, sample_rate, request.response_format, request.speed)
+    if cache_key:
+        await asyncio.to_thread(get_result_cache().put, cache_key, data)
+    return Response(content=data, media_type=media_type(request.response_format))
+
+
+@app.post("/v1/audio/jobs", status_code=202)
+async def create_job(request: JobRequest):
+    """Queue a long-form synthesis job; poll its status and download the result when it is done"""
+    validate_speech_request(request.input, request.response_format, request.speed)
+    if len(request.input) > JOB_MAX_CHARACTERS:
+        raise HTTPException(status_code=413, detail=f"Input is longer than {JOB_MAX_CHARACTERS} characters")
+    voice_path, exaggeration, cfg_weight = resolve_voice(request.voice)
+    try:
+        job = await get_job_manager().submit(
+            request.input,
+            voice=request.voice,
             voice_path=voice_path,
-            text=request.input,
             exaggeration=exaggeration,
             cfg_weight=cfg_weight,
-            output_path=output_path,
+            response_format=request.response_format,
+            speed=request.speed,
+            client=current_client.get(),
         )
-    else:
-        generate_audio(
-            text=request.input,
-            output_path=output_path,
-        )
-
-    # Return audio file
-    return FileResponse(
-        path=output_path,
-        media_type="audio/wav",
-        filename=f"{timestamp}_{unique_id}.wav",
+    except ValueError:
+        # Nothing left to speak once markdown, emoji and the like are removed
+        raise HTTPException(status_code=400, detail="Missing input text")
+    return JSONResponse(
+        status_code=202,
+        content={**job.status_dict(), "status_url": f"/v1/audio/jobs/{job.id}", "result_url": f"/v1/audio/jobs/{job.id}/result"},
     )
 
 
+def find_job(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+
+@app.get("/v1/audio/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Progress of a job: chunks done out of the total and an estimate of the time left"""
+    return JSONResponse(content=find_job(job_id).status_dict())
+
+
+@app.get("/v1/audio/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    """The assembled audio of a finished job"""
+    job = find_job(job_id)
+    if job.status == "failed":
+        # Final: asking again will not help
+        raise HTTPException(status_code=410, detail=f"Job failed: {job.error}")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}", headers={"Retry-After": str(INFERENCE_RETRY_AFTER)})
+    return FileResponse(job.result_path, media_type=media_type(job.response_format), filename=f"{job.id}.{job.response_format}")
+
+
+@app.delete("/v1/audio/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """Cancel a job if it is still running and delete its files"""
+    job = await get_job_manager().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return JSONResponse(content={"status": "ok", "id": job_id})
+
+
+@app.websocket("/v1/audio/speech/ws")
+async def speech_websocket(websocket: WebSocket):
+    """Incremental synthesis: text arrives in pieces, audio goes back sentence by sentence.
+
+    The voice, response_format (pcm by default), speed and priority are query parameters.
+    Every message from the client is JSON: {"type": "text", "text": ...} appends text, and
+    each sentence is synthesized as soon as the next one starts. "flush" synthesizes
+    whatever is buffered, "cancel" drops the buffered text and the audio not sent yet, and
+    "close" flushes and ends the session. Audio is sent as binary frames of one continuous
+    stream; ready, flushed, cancelled, error and done events as JSON.
+    """
+    await websocket.accept()
+    current_endpoint.set("/v1/audio/speech/ws")
+    current_client.set(request_client(websocket))
+    params = websocket.query_params
+    try:
+        response_format, speed = params.get("response_format", "pcm"), float(params.get("speed", 1.0))
+        validate_output(response_format, speed)
+        priority = params.get("priority") or websocket.headers.get("x-priority")
+        use_priority(priority.strip().lower() if priority else None)
+        voice_path, exaggeration, cfg_weight = resolve_voice(params.get("voice", "default"))
+    except (HTTPException, ValueError) as e:
+        await websocket.send_json({"type": "error", "detail": getattr(e, "detail", str(e))})
+        await websocket.close(code=1008)
+        return
+
+    voice_settings = {"voice_path": voice_path, "exaggeration": exaggeration, "cfg_weight": cfg_weight}
+    # The session's voice is prepared while the client produces its first sentence and stays in memory until it ends
+    pinned = pin_voice(voice_path)
+    preparing = asyncio.ensure_future(asyncio.to_thread(prepare_voice, voice_path, exaggeration))
+    sample_rate = get_sample_rate()
+    encoder = StreamEncoder(sample_rate, response_format)
+    chunk_tokens = STREAM_CHUNK_SIZE * TOKENS_PER_CHARACTER
+    outbox = asyncio.Queue()
+    pending = set()
+    buffer = ""
+    submitted = False
+
+    def submit(text: str):
+        """Queue synthesis of complete text now; its audio is sent in order by send_events"""
+        nonlocal submitted
+        # Only the session's first chunk is kept short, since later ones are generated while earlier ones play
+        first_tokens = None if submitted else STREAM_FIRST_CHUNK_SIZE * TOKENS_PER_CHARACTER
+        for chunk in chunk_text(normalize_text(text), chunk_tokens, first_target_tokens=first_tokens):
+            submitted = True
+            task = asyncio.ensure_future(run_inference(synthesize, text=chunk, use_cache=True, **voice_settings))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            outbox.put_nowait(("audio", task))
+
+    async def send_events():
+        # The only writer to the socket, so audio and events go out in the order they were queued
+        streamer = CrossfadeStreamer(sample_rate)
+        await websocket.send_json({"type": "ready", "sample_rate": sample_rate, "response_format": response_format})
+        await websocket.send_bytes(encoder.start())
+        while True:
+            kind, value = await outbox.get()
+            if kind == "audio":
+                try:
+                    audio = await value
+                except asyncio.CancelledError:
+                    if not value.cancelled():
+                        raise
+                    continue
+                except HTTPException as e:
+                    await websocket.send_json({"type": "error", "detail": e.detail})
+                    continue
+                except Exception as e:
+                    ERRORS.inc(endpoint="/v1/audio/speech/ws", voice=voice_label(voice_path))
+                    print(f"Error while streaming speech: {e}")
+                    await websocket.send_json({"type": "error", "detail": "Speech generation failed"})
+                    continue
+                samples = apply_speed(audio.squeeze(0).numpy(), speed)
+                await websocket.send_bytes(await asyncio.to_thread(lambda: encoder.push(streamer.push(samples))))
+            elif kind == "flush":
+                # The crossfade tail is held back for the next chunk; a flush sends it now
+                await websocket.send_bytes(await asyncio.to_thread(lambda: encoder.push(streamer.flush())))
+                await websocket.send_json({"type": "flushed"})
+            elif kind == "cancel":
+                streamer = CrossfadeStreamer(sample_rate)
+                await websocket.send_json({"type": "cancelled"})
+            elif kind == "close":
+                # close() waits for ffmpeg to finish, so it runs off the event loop like the encoding above
+                await websocket.send_bytes(await asyncio.to_thread(lambda: encoder.push(streamer.flush()) + encoder.close()))
+                await websocket.send_json({"type": "done"})
+                return
+            else:
+                await websocket.send_json(value)
+
+    sender = asyncio.create_task(send_events())
+    receive = None
+    try:
+        while True:
+            receive = asyncio.ensure_future(websocket.receive_json())
+            # Stop listening if the sender fails, e.g. because the client went away
+            await asyncio.wait([receive, sender], return_when=asyncio.FIRST_COMPLETED)
+            if not receive.done():
+                break
+            try:
+                message = receive.result()
+            except (ValueError, KeyError):
+                outbox.put_nowait(("event", {"type": "error", "detail": "Messages must be JSON text"}))
+                continue
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind == "text":
+                buffer += str(message.get("text") or "")
+                complete, buffer = split_complete(buffer, chunk_tokens)
+                if complete:
+                    submit(complete)
+            elif kind in ("flush", "close"):
+                if buffer.strip():
+                    submit(buffer)
+                buffer = ""
+                outbox.put_nowait((kind, None))
+                if kind == "close":
+                    await asyncio.wait([sender])
+                    if sender.exception() is None:
+                        await websocket.close()
+                    break
+            elif kind == "cancel":
+                buffer = ""
+                submitted = False
+                for task in list(pending):
+                    task.cancel()
+                while not outbox.empty():
+                    outbox.get_nowait()
+                outbox.put_nowait(("cancel", None))
+            else:
+                outbox.put_nowait(("event", {"type": "error", "detail": f"Unknown message type '{kind}'"}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        tasks = [sender, preparing] + ([receive] if receive else [])
+        for task in tasks + list(pending):
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        encoder.abort()
+        unpin_voice(pinned)
+
+
 @app.get("/v1/audio/voices")
 async def list_voices():
     """Return list of available voices"""
@@ -217,6 +733,53 @@ async def list_models():
     return JSONResponse(content={"status": "ok", "models": ["chatterbox"]})
 
 
+@app.get("/v1/audio/cache")
+async def cache_stats():
+    """Return synthesis result cache hit/miss statistics and the size of the directories under retention"""
+    return JSONResponse(content={"status": "ok", "cache": get_result_cache().stats(), "files": get_janitor().stats()})
+
+
+@app.get("/v1/audio/workers")
+async def list_workers():
+    """Return the device, health and queue depth of each model replica"""
+    return JSONResponse(content={"status": "ok", "workers": worker_stats()})
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for the synthesis pipeline"""
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the server process is up and serving requests"""
+    return JSONResponse(content={"status": "ok"})
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: warmup finished, a model worker is healthy and the inference queue has room"""
+    scheduler = get_scheduler()
+    workers = worker_stats() if scheduler.running else []
+    checks = {
+        "warmup": warmup_state.done,
+        "scheduler": scheduler.running,
+        "workers": any(worker["healthy"] for worker in workers),
+        "queue": scheduler.depth < scheduler.queue_size,
+    }
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not ready",
+            "checks": checks,
+            "warmup": warmup_state.to_dict(),
+            "queue_depth": scheduler.depth,
+        },
+    )
+
+
 # Legacy API endpoint for compatibility
 @app.post("/speak")
 async def speak(request: Request):
@@ -227,70 +790,76 @@ async def speak(request: Request):
 
     if not text:
         return JSONResponse(status_code=400, content={"error": "Missing 'text'"})
+    if data.get("priority") is not None and data["priority"] not in PRIORITY_CLASSES:
+        return JSONResponse(status_code=400, content={"error": invalid_priority(data["priority"])})
+    use_priority(data.get("priority"))
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     unique_id = str(uuid.uuid4())
     output_path = f"outputs/{voice}_{timestamp}_{unique_id}.wav"
-    voices = get_voices()
     voice_path = None
     exaggeration = 0.5
     cfg_weight = 0.4
     
-    if voice in [voice["name"] for voice in voices]:
-        voice_obj = next((voice for voice in voices if voice["name"] == voice), None)
-        if voice_obj:
-            voice_path = voice_obj["path"]
-            exaggeration = voice_obj["exaggeration"]
-            cfg_weight = voice_obj["cfg_weight"]
+    voice_obj = get_voice_by_name(voice)
+    if voice_obj:
+        voice_path = voice_obj["path"]
+        exaggeration = voice_obj["exaggeration"]
+        cfg_weight = voice_obj["cfg_weight"]
+    request.state.voice = voice_label(voice_path)
+
+    cache_key = None
+    cached = None
+    if wants_cache(request, data.get("cache", True)):
+        cache_key, cached = await lookup_cached_speech(text, voice_path, exaggeration, cfg_weight)
     
-    if len(text) > 1000:
+    # Same test as the speech endpoint: chunk when the normalized text is too long for one generation
+    batching = needs_chunking(normalize_text(text))
+    if batching:
+        if cached is not None:
+            return Response(content=cached, media_type="audio/wav", headers={"X-Cache": "HIT"})
         print(f"Using batching for long text from web form ({len(text)} characters)")
-    
-     
-        
-        # Split text into chunks
-        chunks = [text[i:i+1000] for i in range(0, len(text), 1000)]
-        chunk_files = []
-        for chunk in chunks:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_id = str(uuid.uuid4())
-            chunk_output_path = f"outputs/{timestamp}_{unique_id}.wav"
-            generate_audio(
-                text=chunk,
-                exaggeration=exaggeration,
-                cfg_weight=cfg_weight,
-                output_path=chunk_output_path,
-                voice_path=voice_path,
-            )
-            chunk_files.append(chunk_output_path)
-        # Join all chunk files into one
-        final_output_path = f"outputs/{timestamp}_{unique_id}_joined.wav"
-        join_audio_files(chunk_files, final_output_path)
-        # Optionally, clean up chunk files
-        for f in chunk_files:
-            try:
-                os.remove(f)
-            except Exception:
-                pass
-        return FileResponse(
-            path=final_output_path,
+
+        # Chunked at sentence boundaries and joined in memory; the audio itself is the answer and no file is kept
+        sample_rate, joined = await run_inference(
+            generate_audio,
+            text=text,
+            exaggeration=exaggeration,
+            cfg_weight=cfg_weight,
+            voice_path=voice_path,
+            batching=True,
+            use_cache=cache_key is not None,
+        )
+        with span("encode"), ENCODE_TIME.time(endpoint=current_endpoint.get(), format="wav"):
+            data = await asyncio.to_thread(encode_audio, joined, sample_rate)
+        if cache_key:
+            await asyncio.to_thread(get_result_cache().put, cache_key, data)
+        return Response(
+            content=data,
             media_type="audio/wav",
-            filename=os.path.basename(final_output_path),
+            headers={"Content-Disposition": f'attachment; filename="{timestamp}_{unique_id}_joined.wav"'},
         )
     
    
 
     start = time.time()
-    if voice_path:
-        generate_audio(
+    data = cached
+    if data is None:
+        sample_rate, samples = await run_inference(
+            generate_audio,
             voice_path=voice_path,
             text=text,
             exaggeration=exaggeration,
             cfg_weight=cfg_weight,
-            output_path=output_path,
         )
-    else:
-        generate_audio(text=text, output_path=output_path)
+        with span("encode"), ENCODE_TIME.time(endpoint=current_endpoint.get(), format="wav"):
+            data = await asyncio.to_thread(encode_audio, samples, sample_rate)
+        if cache_key:
+            await asyncio.to_thread(get_result_cache().put, cache_key, data)
+    # /speak hands back output_file for later download, so this is the one path that writes to disk
+    with span("save"):
+        await asyncio.to_thread(Path(output_path).write_bytes, data)
+    track_file(output_path)
     end = time.time()
     generation_time = round(end - start, 2)
 
@@ -324,6 +893,8 @@ async def custom_voice(
         )
 
     if audio_type != "wav":
+        from audio.audio_utils import convert_to_wav
+
         # convert audio file to wav
         wav_path = f"voices/{voice_name}.wav"
         convert_to_wav(file_location, wav_path)
@@ -502,6 +1073,8 @@ async def api_docs():
     </style>
     """
     
+    import markdown2
+
     html = markdown2.markdown(content, extras=['tables', 'fenced-code-blocks'])
     return HTMLResponse(content=css + html)
 
@@ -1,15 +1,10 @@
-from tqdm import tqdm
 import sys
 import torch
 import shutil
-import perth
 from pathlib import Path
 import argparse
 import os
-import librosa
 import soundfile as sf
-from chatterbox.models.s3tokenizer import S3_SR
-from chatterbox.models.s3gen import S3GEN_SR, S3Gen
 
 AUDIO_EXTENSIONS = ["wav", "mp3", "flac", "opus"]
 
@@ -17,6 +12,13 @@ AUDIO_EXTENSIONS = ["wav", "mp3", "flac", "opus"]
 
 @torch.inference_mode()
 def main():
+    # The voice conversion stack is only needed by this script, not by the server
+    import librosa
+    import perth
+    from tqdm import tqdm
+    from chatterbox.models.s3tokenizer import S3_SR
+    from chatterbox.models.s3gen import S3GEN_SR, S3Gen
+
     parser = argparse.ArgumentParser(description="Voice Conversion")
     parser.add_argument(
         "input", type=str, help="Path to input (a sample or folder of samples)."
@@ -95,6 +97,9 @@ def main():
 
 
 def convert_to_wav(audio_file_path, new_audio_file_path):
+    import librosa
+    from chatterbox.models.s3tokenizer import S3_SR
+
     audio, sr = librosa.load(audio_file_path, sr=S3_SR)
     sf.write(new_audio_file_path, audio, sr)
     return new_audio_file_path
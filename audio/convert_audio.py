@@ -1,20 +1,41 @@
-from pydub import AudioSegment
+import numpy as np
+import soundfile as sf
 
+from audio.stream import CROSSFADE_MS, equal_power_fades
 
 
+def join_audio_arrays(segments, sample_rate: int, crossfade_ms: int = CROSSFADE_MS):
+    """Concatenate mono audio arrays with an equal-power crossfade between segments.
 
+    The output buffer is allocated once and each segment is copied into it a single
+    time, so joining N chunks costs O(total samples) with no temp files.
+    """
+    segments = [np.asarray(segment, dtype=np.float32).reshape(-1) for segment in segments]
+    if not segments:
+        raise ValueError("No audio segments provided.")
+    overlap = int(sample_rate * crossfade_ms / 1000)
+    # Size every boundary first so the output can be allocated once
+    overlaps = []
+    length = len(segments[0])
+    for segment in segments[1:]:
+        overlaps.append(min(overlap, length, len(segment)))
+        length += len(segment) - overlaps[-1]
+    joined = np.empty(length, dtype=np.float32)
 
+    joined[:len(segments[0])] = segments[0]
+    position = len(segments[0])
+    for segment, segment_overlap in zip(segments[1:], overlaps):
+        if segment_overlap:
+            fade_out, fade_in = equal_power_fades(segment_overlap)
+            start = position - segment_overlap
+            joined[start:position] = joined[start:position] * fade_out + segment[:segment_overlap] * fade_in
+        remainder = len(segment) - segment_overlap
+        joined[position:position + remainder] = segment[segment_overlap:]
+        position += remainder
+    return joined
 
-def join_audio_files(input_paths, output_path):
-    # Concatenate audio files with a 50ms crossfade between segments
-    if not input_paths:
-        raise ValueError("No input audio files provided.")
-    audio_segments = [AudioSegment.from_file(path) for path in input_paths]
-    combined_audio = audio_segments[0]
-    for segment in audio_segments[1:]:
-        combined_audio = combined_audio.append(segment, crossfade=50)
-    combined_audio.export(output_path, format="wav")
-    
-    
-    
-    
+
+def save_audio(output_path, samples, sample_rate: int):
+    """Write mono float samples to a WAV file in one pass"""
+    sf.write(output_path, np.asarray(samples, dtype=np.float32).reshape(-1), sample_rate)
+    return output_path
@@ -0,0 +1,215 @@
+import io
+import shutil
+import subprocess
+import threading
+from functools import lru_cache
+
+import numpy as np
+import soundfile as sf
+
+from audio.stream import to_pcm16, wav_stream_header
+
+# OpenAI response formats -> media type
+MEDIA_TYPES = {
+    "mp3": "audio/mpeg",
+    "opus": "audio/ogg",
+    "aac": "audio/aac",
+    "flac": "audio/flac",
+    "wav": "audio/wav",
+    "pcm": "audio/pcm",
+}
+
+# Formats libsndfile can encode in-process: (format, subtype)
+SOUNDFILE_FORMATS = {
+    "mp3": ("MP3", None),
+    "opus": ("OGG", "OPUS"),
+    "flac": ("FLAC", "PCM_16"),
+    "wav": ("WAV", "PCM_16"),
+}
+
+# ffmpeg arguments for formats libsndfile cannot encode (or when it was built without them)
+FFMPEG_FORMATS = {
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "64k", "-f", "mp3"],
+    "opus": ["-c:a", "libopus", "-b:a", "32k", "-f", "ogg"],
+    "aac": ["-c:a", "aac", "-b:a", "64k", "-f", "adts"],
+    "flac": ["-c:a", "flac", "-f", "flac"],
+}
+
+# libsndfile rewrites the header of these when the file is closed (MP3's frame count, FLAC's
+# STREAMINFO), so bytes sent before that describe the wrong length
+REWRITES_HEADER = {"mp3", "flac"}
+
+MIN_SPEED = 0.25
+MAX_SPEED = 4.0
+
+
+def media_type(response_format: str):
+    return MEDIA_TYPES.get(response_format, "audio/wav")
+
+
+def supports_soundfile(response_format: str):
+    if response_format not in SOUNDFILE_FORMATS:
+        return False
+    fmt, subtype = SOUNDFILE_FORMATS[response_format]
+    return fmt in sf.available_formats() and (subtype is None or subtype in sf.available_subtypes(fmt))
+
+
+@lru_cache(maxsize=1)
+def has_ffmpeg():
+    return shutil.which("ffmpeg") is not None
+
+
+def can_encode(response_format: str):
+    """Whether this host can produce response_format (aac, for one, only through ffmpeg)"""
+    if response_format in ("wav", "pcm") or supports_soundfile(response_format):
+        return True
+    return response_format in FFMPEG_FORMATS and has_ffmpeg()
+
+
+def apply_speed(samples: np.ndarray, speed: float = 1.0):
+    """Time-stretch audio without changing pitch, so speed never re-runs the model"""
+    if speed == 1.0 or len(samples) == 0:
+        return samples
+    import librosa
+
+    return librosa.effects.time_stretch(np.asarray(samples, dtype=np.float32), rate=speed)
+
+
+def ffmpeg_command(sample_rate: int, response_format: str):
+    return [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+        *FFMPEG_FORMATS[response_format], "pipe:1",
+    ]
+
+
+def encode_audio(samples: np.ndarray, sample_rate: int, response_format: str = "wav", speed: float = 1.0):
+    """Encode mono float samples to the requested format entirely in memory"""
+    samples = apply_speed(np.asarray(samples, dtype=np.float32).reshape(-1), speed)
+    if response_format == "pcm":
+        return to_pcm16(samples)
+    if supports_soundfile(response_format):
+        fmt, subtype = SOUNDFILE_FORMATS[response_format]
+        buffer = io.BytesIO()
+        sf.write(buffer, samples, sample_rate, format=fmt, subtype=subtype)
+        return buffer.getvalue()
+    if response_format in FFMPEG_FORMATS:
+        result = subprocess.run(
+            ffmpeg_command(sample_rate, response_format), input=to_pcm16(samples), capture_output=True, check=True
+        )
+        return result.stdout
+    raise ValueError(f"Unsupported response format: {response_format}")
+
+
+class StreamEncoder:
+    """Incremental encoder for streamed responses.
+
+    push() takes the next block of float samples and returns whatever encoded bytes
+    are ready; close() flushes the encoder and returns the rest. WAV and PCM are
+    written directly, libsndfile formats are encoded in-process and anything else
+    goes through an ffmpeg pipe. MP3 and FLAC stream through ffmpeg when it is
+    installed; with libsndfile their output is only valid once closed, so it is
+    held back and returned by close().
+    """
+
+    def __init__(self, sample_rate: int, response_format: str = "wav"):
+        self.sample_rate = sample_rate
+        self.response_format = response_format
+        self._soundfile = None
+        self._buffer = None
+        self._emitted = 0
+        self._process = None
+        self._output = []
+        self._output_lock = threading.Lock()
+        self._reader = None
+        self._hold_output = False
+        if response_format in ("wav", "pcm"):
+            return
+        if response_format in REWRITES_HEADER and response_format in FFMPEG_FORMATS and has_ffmpeg():
+            self._start_process()
+        elif supports_soundfile(response_format):
+            fmt, subtype = SOUNDFILE_FORMATS[response_format]
+            self._buffer = io.BytesIO()
+            self._soundfile = sf.SoundFile(
+                self._buffer, "w", samplerate=sample_rate, channels=1, format=fmt, subtype=subtype
+            )
+            self._hold_output = response_format in REWRITES_HEADER
+        elif response_format in FFMPEG_FORMATS:
+            self._start_process()
+        else:
+            raise ValueError(f"Unsupported response format: {response_format}")
+
+    def start(self):
+        """Bytes to send before any audio"""
+        return wav_stream_header(self.sample_rate) if self.response_format == "wav" else b""
+
+    def push(self, samples: np.ndarray):
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        if self._soundfile is not None:
+            self._soundfile.write(samples)
+            return self._take_soundfile_output()
+        if self._process is not None:
+            self._process.stdin.write(to_pcm16(samples))
+            self._process.stdin.flush()
+            return self._take_process_output()
+        return to_pcm16(samples)
+
+    def close(self):
+        if self._soundfile is not None:
+            self._soundfile.close()
+            self._soundfile = None
+            return self._take_soundfile_output()
+        if self._process is not None:
+            self._process.stdin.close()
+            self._process.wait()
+            self._reader.join()
+            self._process = None
+            return self._take_process_output()
+        return b""
+
+    def abort(self):
+        """Release the encoder when a stream ends early"""
+        if self._soundfile is not None:
+            self._soundfile.close()
+            self._soundfile = None
+        if self._process is not None:
+            self._process.kill()
+            self._process = None
+
+    def as_file(self, data: bytes):
+        """Turn the concatenated streamed bytes into a complete file (for caching)"""
+        if self.response_format == "wav":
+            header = wav_stream_header(self.sample_rate)
+            return wav_stream_header(self.sample_rate, data_size=len(data) - len(header)) + data[len(header):]
+        if self._buffer is not None:
+            # libsndfile rewrites header fields on close, so the buffer is the better copy
+            return self._buffer.getvalue()
+        return data
+
+    def _start_process(self):
+        self._process = subprocess.Popen(
+            ffmpeg_command(self.sample_rate, self.response_format),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._reader = threading.Thread(target=self._read_output, daemon=True)
+        self._reader.start()
+
+    def _take_soundfile_output(self):
+        if self._hold_output and self._soundfile is not None:
+            return b""
+        data = self._buffer.getbuffer()[self._emitted:].tobytes()
+        self._emitted += len(data)
+        return data
+
+    def _take_process_output(self):
+        with self._output_lock:
+            data = b"".join(self._output)
+            self._output = []
+        return data
+
+    def _read_output(self):
+        for block in iter(lambda: self._process.stdout.read1(65536), b""):
+            with self._output_lock:
+                self._output.append(block)
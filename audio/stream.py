@@ -0,0 +1,66 @@
+import struct
+
+import numpy as np
+
+CROSSFADE_MS = 50
+
+# Placeholder RIFF/data sizes for a stream whose final length is unknown; players read until EOF
+STREAMING_WAV_SIZE = 0xFFFFFFFF
+
+
+def wav_stream_header(sample_rate: int, channels: int = 1, bits_per_sample: int = 16, data_size: int = None):
+    """WAV header for 16-bit PCM; without data_size it can be sent before the total length is known"""
+    byte_rate = sample_rate * channels * bits_per_sample // 8
+    block_align = channels * bits_per_sample // 8
+    return (
+        b"RIFF"
+        + struct.pack("<I", STREAMING_WAV_SIZE if data_size is None else data_size + 36)
+        + b"WAVEfmt "
+        + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, block_align, bits_per_sample)
+        + b"data"
+        + struct.pack("<I", STREAMING_WAV_SIZE if data_size is None else data_size)
+    )
+
+
+def to_pcm16(samples: np.ndarray):
+    """Convert float samples in [-1, 1] to little-endian 16-bit PCM bytes"""
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def equal_power_fades(length: int):
+    """Fade-out and fade-in curves whose powers sum to one across the overlap"""
+    t = np.linspace(0.0, np.pi / 2, length, dtype=np.float32)
+    return np.cos(t), np.sin(t)
+
+
+class CrossfadeStreamer:
+    """Crossfades consecutive audio chunks as they arrive.
+
+    The last crossfade_ms of each chunk is held back until the next chunk arrives
+    (or the stream is flushed), so the emitted samples match a join of the whole clip.
+    """
+
+    def __init__(self, sample_rate: int, crossfade_ms: int = CROSSFADE_MS):
+        self.overlap = int(sample_rate * crossfade_ms / 1000)
+        self._tail = None
+
+    def push(self, samples: np.ndarray):
+        """Add the next chunk and return the samples that are now final"""
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        if self._tail is not None:
+            overlap = min(len(self._tail), len(samples), self.overlap)
+            if overlap:
+                fade_out, fade_in = equal_power_fades(overlap)
+                mixed = self._tail[-overlap:] * fade_out + samples[:overlap] * fade_in
+                samples = np.concatenate([self._tail[:-overlap], mixed, samples[overlap:]])
+            else:
+                samples = np.concatenate([self._tail, samples])
+        hold = min(self.overlap, len(samples))
+        self._tail = samples[len(samples) - hold:]
+        return samples[:len(samples) - hold]
+
+    def flush(self):
+        """Return the held-back tail at the end of the stream"""
+        tail = self._tail if self._tail is not None else np.zeros(0, dtype=np.float32)
+        self._tail = None
+        return tail
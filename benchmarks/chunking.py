@@ -0,0 +1,182 @@
+"""Compare the text chunker with the splitting it replaced.
+
+Usage:
+    python -m benchmarks.chunking
+    python -m benchmarks.chunking --files book.txt notes.md --workers 4 --compute-rtf 0.1 --output chunks.json
+
+Each document (by default the repository's own markdown docs plus --generated long
+texts) is split by three strategies:
+
+- slices: fixed 1000 character slices, as the legacy /speak endpoint did
+- sentences: the old regex splitter, sentences packed up to 1000 characters
+- chunker: tts.normalize.normalize_text, then tts.chunker.chunk_text
+
+Normalization is reported first: estimated speech tokens before and after it (markdown,
+URLs and emoji the model would otherwise read out are dropped, numbers are written out)
+and its cost on the first call and on a repeated, memoized one. For every split it
+reports the chunk count, the largest chunk in estimated speech tokens, how many chunks
+exceed the 1000 tokens the model generates before stopping (that audio is cut off) and
+the splitting time. Unless --no-synthesis is given the
+chunks are then synthesized by the stub model (see benchmarks/stub_model.py) on
+--workers replicas, reporting time to the first chunk and to the whole document.
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+from benchmarks.pipeline import make_texts
+
+MODEL_TOKEN_LIMIT = 1000
+DEFAULT_FILES = ["README.md", "API_REFERENCE.md"]
+
+
+def split_slices(text: str, chunk_size: int = 1000):
+    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+
+def split_sentences(text: str, chunk_size: int = 1000):
+    """The sentence splitter used before tts.chunker"""
+    sentences = re.compile(r"(?<=[.!?]) +").split(text)
+    chunks = []
+    current_chunk = ""
+    for sentence in sentences:
+        if current_chunk and len(current_chunk) + len(sentence) + 1 > chunk_size:
+            chunks.append(current_chunk.strip())
+            current_chunk = sentence
+        else:
+            current_chunk = current_chunk + " " + sentence if current_chunk else sentence
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return chunks
+
+
+def strategies():
+    from tts.chunker import chunk_text
+    from tts.normalize import normalize_text
+
+    return {"slices": split_slices, "sentences": split_sentences, "chunker": lambda text: chunk_text(normalize_text(text))}
+
+
+def measure_normalization(text: str):
+    from tts.chunker import estimate_tokens
+    from tts.normalize import normalize_text
+
+    started = time.perf_counter()
+    normalized = normalize_text(text)
+    first_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    normalize_text(text)
+    repeat_ms = (time.perf_counter() - started) * 1000
+    result = {
+        "raw_tokens": round(estimate_tokens(text)),
+        "normalized_tokens": round(estimate_tokens(normalized)),
+        "first_ms": round(first_ms, 2),
+        "repeat_ms": round(repeat_ms, 3),
+    }
+    print(f"  {'normalize':<10} " + "  ".join(f"{key} {value}" for key, value in result.items()))
+    return result
+
+
+def synthesize(chunks: list[str]):
+    """(seconds to the first chunk's audio, seconds to all of it) on the configured backend"""
+    from concurrent.futures import wait
+
+    from tts.batcher import get_batcher
+
+    started = time.perf_counter()
+    futures = [get_batcher().submit(chunk) for chunk in chunks]
+    futures[0].result()
+    first = time.perf_counter() - started
+    wait(futures)
+    return first, time.perf_counter() - started
+
+
+def measure(name: str, text: str, split, synthesis: bool):
+    from tts.chunker import estimate_tokens
+
+    started = time.perf_counter()
+    chunks = [chunk for chunk in split(text) if chunk.strip()]
+    split_ms = (time.perf_counter() - started) * 1000
+    tokens = [estimate_tokens(chunk) for chunk in chunks]
+    result = {
+        "chunks": len(chunks),
+        "mean_tokens": round(sum(tokens) / len(tokens)),
+        "max_tokens": round(max(tokens)),
+        "over_limit": sum(count > MODEL_TOKEN_LIMIT for count in tokens),
+        "cut_off_s": round(sum(max(0, count - MODEL_TOKEN_LIMIT) for count in tokens) / 25, 1),
+        "split_ms": round(split_ms, 2),
+    }
+    if synthesis:
+        first, total = synthesize(chunks)
+        result.update(first_chunk_s=round(first, 3), total_s=round(total, 3))
+    print(f"  {name:<10} " + "  ".join(f"{key} {value}" for key, value in result.items()))
+    return result
+
+
+def load_documents(args):
+    documents = {}
+    for path in args.files:
+        with open(path, encoding="utf-8") as f:
+            documents[os.path.basename(path)] = f.read()
+    for index, text in enumerate(make_texts(args.generated, "long", args.seed)):
+        documents[f"generated-{index}"] = text
+    return documents
+
+
+def run(args):
+    documents = load_documents(args)
+    results = {}
+    context = None
+    if not args.no_synthesis:
+        from benchmarks.stub_model import stub_model
+        from tts.batcher import start_backend
+
+        context = stub_model(args.compute_rtf)
+        context.__enter__()
+        start_backend()
+    try:
+        for name, text in documents.items():
+            print(f"{name} ({len(text)} characters)")
+            results[name] = {"normalize": measure_normalization(text)}
+            for strategy, split in strategies().items():
+                results[name][strategy] = measure(strategy, text, split, not args.no_synthesis)
+    finally:
+        if context is not None:
+            from tts.batcher import stop_backend
+
+            stop_backend()
+            context.__exit__(None, None, None)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", nargs="*", default=[path for path in DEFAULT_FILES if os.path.exists(path)])
+    parser.add_argument("--generated", type=int, default=2, help="Seeded long texts to add to the documents")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-synthesis", action="store_true", help="Only split, don't synthesize the chunks")
+    parser.add_argument("--workers", type=int, default=2, help="Stub model replicas synthesizing in parallel")
+    parser.add_argument("--compute-rtf", type=float, default=0.02, help="Simulated stub compute time per second of audio")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Settings are read at import time, so they are set before the server modules load
+    os.environ.setdefault("WARMUP_RUNS", "0")
+    os.environ["NUM_OF_WORKERS"] = str(args.workers)
+    os.environ["INFERENCE_BACKEND"] = "thread"
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Compare the in-process (thread) and worker-process inference backends.
+
+Usage: python -m benchmarks.compare_backends --workers 2 --requests 16 --concurrency 4
+
+Each backend loads --workers model replicas, then --requests synthesis requests are
+sent with up to --concurrency in flight. Reports wall time, throughput, latency
+percentiles and the real-time factor (seconds of wall time per second of audio, lower
+is faster, as in benchmarks/pipeline.py and the tts_real_time_factor metric).
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.pipeline import percentile
+from tts.batcher import MicroBatcher
+from tts.model import ModelPool, plan_replicas, unload_tts_model
+from tts.process_pool import ProcessPool
+
+SAMPLE_TEXT = (
+    "The quick brown fox jumps over the lazy dog. "
+    "Benchmarks should use text long enough to keep the model busy for a few seconds."
+)
+
+
+class ThreadBackend:
+    """In-process replicas, each behind its own micro-batcher, routed to the least loaded"""
+
+    def __init__(self, workers: int):
+        self.pool = ModelPool(plan_replicas(workers)).load()
+        self.batchers = {replica.index: MicroBatcher(replica) for replica in self.pool.replicas}
+        self.sample_rate = self.pool.replicas[0].model.sr
+
+    def submit(self, text: str):
+        return self.batchers[self.pool.least_loaded().index].submit(text)
+
+    def stop(self):
+        self.pool = self.batchers = None
+        unload_tts_model()
+
+
+class ProcessBackend:
+    def __init__(self, workers: int):
+        self.pool = ProcessPool(plan_replicas(workers)).start()
+        self.sample_rate = self.pool.sample_rate
+
+    def submit(self, text: str):
+        return self.pool.submit(text)
+
+    def stop(self):
+        self.pool.stop()
+
+
+BACKENDS = {"thread": ThreadBackend, "process": ProcessBackend}
+
+
+def run(name: str, workers: int, requests: int, concurrency: int, text: str):
+    started = time.perf_counter()
+    backend = BACKENDS[name](workers)
+    load_time = time.perf_counter() - started
+
+    # One untimed request per replica so lazy initialisation doesn't skew the numbers
+    for future in [backend.submit(text) for _ in range(workers)]:
+        future.result()
+
+    def one_request(_):
+        request_started = time.perf_counter()
+        audio = backend.submit(text).result()
+        return time.perf_counter() - request_started, audio.shape[-1] / backend.sample_rate
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one_request, range(requests)))
+    wall = time.perf_counter() - started
+    backend.stop()
+
+    latencies = [latency for latency, _ in results]
+    audio_seconds = sum(seconds for _, seconds in results)
+    return {
+        "backend": name,
+        "load_s": round(load_time, 2),
+        "wall_s": round(wall, 2),
+        "requests_per_s": round(requests / wall, 3),
+        "p50_s": round(statistics.median(latencies), 2),
+        "p95_s": round(percentile(latencies, 95), 2),
+        "rtf": round(wall / audio_seconds, 3) if audio_seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--text", default=SAMPLE_TEXT)
+    args = parser.parse_args()
+
+    rows = [run(name, args.workers, args.requests, args.concurrency, args.text) for name in args.backends]
+    columns = list(rows[0])
+    print("  ".join(f"{column:>14}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{str(row[column]):>14}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
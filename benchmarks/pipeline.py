@@ -0,0 +1,297 @@
+"""Benchmark latency, throughput and real-time factor of the synthesis pipeline.
+
+Usage:
+    python -m benchmarks.pipeline --stub --target api --requests 50 --concurrency 4 --output run.json
+    python -m benchmarks.pipeline --target generate --mix long --voices default,alice
+    python -m benchmarks.pipeline --url http://localhost:8880 --requests 20
+
+--target api starts the server in this process on a free port (or uses --url) and
+drives /v1/audio/speech over HTTP; --target generate calls generate_audio directly.
+--stub replaces the model with a deterministic stand-in (see benchmarks/stub_model.py)
+so the pipeline overhead (chunking, joining, encoding, file I/O) can be measured on
+CPU without weights. Texts are drawn from a seeded length distribution (--mix), so
+runs are reproducible. Reports p50/p95/p99 latency and time to first byte,
+throughput, real-time factor (seconds of wall time per second of audio, lower is
+faster) and peak RSS; --output writes the results as JSON for comparing commits.
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+SENTENCES = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Dr. Smith arrived at 5:30 p.m. with 3 boxes of equipment.",
+    "Would you like to hear the weather forecast for tomorrow?",
+    "Our quarterly revenue grew by 12.5% compared to last year.",
+    "Please remember to bring your passport, your tickets and a warm jacket!",
+    "In the beginning, the project had only two contributors and a handful of users.",
+    "She paused, looked out of the window, and said nothing for a long while.",
+    "Chapter one: the lighthouse keeper had not spoken to anyone in weeks.",
+    "Turn left at the second intersection, then continue straight for about 400 metres.",
+    "If the light turns red, stop; if it turns green, go.",
+]
+
+# Text length distributions: (weight, min characters, max characters)
+TEXT_MIXES = {
+    "short": [(1.0, 20, 150)],
+    "chat": [(0.7, 20, 150), (0.3, 150, 600)],
+    "mixed": [(0.5, 20, 200), (0.35, 200, 900), (0.15, 900, 3000)],
+    "long": [(1.0, 1000, 4000)],
+}
+
+
+def percentile(values: list[float], pct: float):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def distribution(values: list, digits: int = 3):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {
+        "mean": round(sum(values) / len(values), digits),
+        "p50": round(percentile(values, 50), digits),
+        "p95": round(percentile(values, 95), digits),
+        "p99": round(percentile(values, 99), digits),
+        "max": round(max(values), digits),
+    }
+
+
+def make_texts(count: int, mix: str = "mixed", seed: int = 0):
+    """count texts whose lengths follow the named mix; the same seed gives the same texts"""
+    rng = random.Random(seed)
+    buckets = TEXT_MIXES[mix]
+    texts = []
+    for _ in range(count):
+        _, low, high = rng.choices(buckets, weights=[weight for weight, _, _ in buckets])[0]
+        target = rng.randint(low, high)
+        words = []
+        while sum(len(word) + 1 for word in words) < target:
+            words.extend(rng.choice(SENTENCES).split())
+        text = " ".join(words)
+        texts.append(text[:target].rsplit(" ", 1)[0] if len(text) > target else text)
+    return texts
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def audio_duration(data: bytes, response_format: str, sample_rate: int):
+    """Seconds of audio in a response body, or None if it cannot be decoded"""
+    if response_format == "pcm":
+        return len(data) / 2 / sample_rate
+    if response_format == "wav" and data[:4] == b"RIFF":
+        # Streamed WAVs carry a placeholder size, so count the data bytes instead
+        channels, rate, _, _, bits = struct.unpack("<HIIHH", data[22:36])
+        return (len(data) - 44) / (rate * channels * bits // 8)
+    try:
+        import soundfile as sf
+
+        return sf.info(io.BytesIO(data)).duration
+    except Exception:
+        return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def local_server():
+    """Serve the app with uvicorn on a background thread; yields its base URL"""
+    import uvicorn
+
+    from app import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="benchmark-server", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("Benchmark server failed to start")
+        time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+@contextmanager
+def local_backend():
+    from tts.batcher import start_backend, stop_backend
+
+    start_backend()
+    try:
+        yield
+    finally:
+        stop_backend()
+
+
+def api_request(client, text: str, voice: str, response_format: str, stream: bool, sample_rate: int):
+    started = time.perf_counter()
+    ttfb = None
+    body = bytearray()
+    payload = {"input": text, "voice": voice, "response_format": response_format, "stream": stream, "cache": False}
+    with client.stream("POST", "/v1/audio/speech", json=payload) as response:
+        for part in response.iter_bytes():
+            if ttfb is None and part:
+                ttfb = time.perf_counter() - started
+            body.extend(part)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {bytes(body[:200]).decode(errors='replace')}")
+    return time.perf_counter() - started, ttfb, audio_duration(bytes(body), response_format, sample_rate), len(body)
+
+
+def generate_request(text: str, voice_path: str, save: bool):
+    from tts.inference import generate_audio
+
+    output_path = f"outputs/benchmark_{threading.get_ident()}.wav" if save else None
+    started = time.perf_counter()
+    sample_rate, samples = generate_audio(text, voice_path=voice_path, output_path=output_path, batching=len(text) > 1000)
+    return time.perf_counter() - started, None, len(samples) / sample_rate, 0
+
+
+def run(args):
+    """Run the benchmark described by parsed CLI arguments and return the result dict"""
+    texts = make_texts(args.requests + args.warmup, args.mix, args.seed)
+    voices = [voice.strip() for voice in args.voices.split(",") if voice.strip()]
+    stub = nullcontext()
+    if args.stub:
+        from benchmarks.stub_model import SAMPLE_RATE, stub_model
+
+        stub = stub_model(args.compute_rtf)
+    sample_rate = SAMPLE_RATE if args.stub else args.sample_rate
+
+    client = None
+    with stub:
+        if args.target == "generate":
+            from tts.voices import get_voice_by_name
+
+            paths = [(get_voice_by_name(voice) or {}).get("path") for voice in voices]
+            context = local_backend()
+
+            def one_request(index):
+                return generate_request(texts[index], paths[index % len(paths)], args.save)
+
+        else:
+            import httpx
+
+            context = nullcontext(args.url) if args.url else local_server()
+
+            def one_request(index):
+                return api_request(client, texts[index], voices[index % len(voices)], args.format, args.stream, sample_rate)
+
+        with context as url:
+            if args.target == "api":
+                client = httpx.Client(base_url=url, timeout=args.timeout)
+            # Untimed requests so lazy initialisation doesn't skew the numbers
+            for index in range(args.warmup):
+                one_request(index)
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                results = list(executor.map(one_request, range(args.warmup, len(texts))))
+            wall = time.perf_counter() - started
+            if client is not None:
+                client.close()
+
+    latencies = [latency for latency, _, _, _ in results]
+    audio_seconds = [seconds for _, _, seconds, _ in results]
+    decoded = sum(seconds for seconds in audio_seconds if seconds)
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            key: getattr(args, key)
+            for key in ("target", "stub", "compute_rtf", "requests", "concurrency", "mix", "voices", "format", "stream", "workers", "seed")
+        },
+        "requests": len(results),
+        "characters": sum(len(text) for text in texts[args.warmup:]),
+        "wall_s": round(wall, 3),
+        "requests_per_s": round(len(results) / wall, 3),
+        "audio_s_per_s": round(decoded / wall, 3),
+        "latency_s": distribution(latencies),
+        "ttfb_s": distribution([ttfb for _, ttfb, _, _ in results]),
+        "rtf": distribution([latency / seconds if seconds else None for latency, _, seconds, _ in results]),
+        "response_bytes": distribution([size for _, _, _, size in results if size], 0),
+        "peak_rss_mb": None if args.url else peak_rss_mb(),
+    }
+
+
+def print_report(result: dict):
+    print(f"{result['requests']} requests in {result['wall_s']}s: {result['requests_per_s']} req/s, {result['audio_s_per_s']} s of audio per s")
+    for name in ("latency_s", "ttfb_s", "rtf"):
+        if result[name]:
+            print(f"  {name:<10} " + "  ".join(f"{key} {value}" for key, value in result[name].items()))
+    if result["peak_rss_mb"] is not None:
+        print(f"  peak RSS   {result['peak_rss_mb']} MB")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["api", "generate"], default="api")
+    parser.add_argument("--url", help="Benchmark an already running server instead of starting one")
+    parser.add_argument("--stub", action="store_true", help="Use the deterministic stub model instead of the real one")
+    parser.add_argument("--compute-rtf", type=float, default=0.0, help="Simulated stub compute time per second of audio")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--mix", choices=list(TEXT_MIXES), default="mixed")
+    parser.add_argument("--voices", default="default", help="Comma separated voice names, used round-robin")
+    parser.add_argument("--format", default="wav", help="response_format for the api target")
+    parser.add_argument("--stream", action="store_true", help="Ask the api target for streamed responses")
+    parser.add_argument("--save", action="store_true", help="Write each generate target result to outputs/ (measures file I/O)")
+    parser.add_argument("--workers", type=int, default=1, help="Model replicas for the in-process backend")
+    parser.add_argument("--sample-rate", type=int, default=24000, help="Sample rate of pcm responses from the real model")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Settings are read at import time, so they are set before the server modules load
+    os.environ.setdefault("API_ONLY", "true")
+    os.environ.setdefault("WARMUP_RUNS", "0")
+    os.environ["NUM_OF_WORKERS"] = str(args.workers)
+    if args.stub:
+        os.environ["INFERENCE_BACKEND"] = "thread"
+
+    result = run(args)
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
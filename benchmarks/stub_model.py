@@ -0,0 +1,87 @@
+"""Deterministic stand-in for ChatterboxTTS, so the serving pipeline can be benchmarked without weights.
+
+The same text always produces the same audio, with a length proportional to the text
+(about 15 characters per second of speech). compute_rtf simulates model time as
+seconds of compute per second of audio (0 measures pipeline overhead only); the sleep
+releases the GIL like a GPU kernel would.
+"""
+
+import time
+import zlib
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import torch
+
+SAMPLE_RATE = 24000
+SECONDS_PER_CHARACTER = 1 / 15
+# Share of the simulated compute spent in each model stage
+STAGE_SHARES = {"t3": 0.8, "s3gen": 0.2}
+
+
+def stub_conditionals(seed: int = 0):
+    from chatterbox.models.t3.modules.cond_enc import T3Cond
+    from chatterbox.tts import Conditionals
+
+    generator = torch.Generator().manual_seed(seed)
+    return Conditionals(T3Cond(speaker_emb=torch.randn(1, 256, generator=generator)), {"embedding": torch.randn(1, 192, generator=generator)})
+
+
+class StubStage:
+    def __init__(self, model, share: float):
+        self.model = model
+        self.share = share
+
+    def inference(self, seconds: float):
+        if self.model.compute_rtf:
+            time.sleep(seconds * self.model.compute_rtf * self.share)
+
+
+class StubTTS:
+    """Implements the parts of ChatterboxTTS the server uses: sr, device, conds, generate, prepare_conditionals"""
+
+    def __init__(self, device: str = "cpu", compute_rtf: float = 0.0):
+        self.sr = SAMPLE_RATE
+        self.device = device
+        self.compute_rtf = compute_rtf
+        self.conds = stub_conditionals()
+        self.t3 = StubStage(self, STAGE_SHARES["t3"])
+        self.s3gen = StubStage(self, STAGE_SHARES["s3gen"])
+        self.watermarker = SimpleNamespace(apply_watermark=lambda wav, sample_rate=None: wav)
+
+    def prepare_conditionals(self, wav_fpath: str, exaggeration: float = 0.5):
+        self.conds = stub_conditionals(zlib.crc32(str(wav_fpath).encode()))
+
+    def generate(self, text: str, exaggeration: float = 0.5, cfg_weight: float = 0.5, **kwargs):
+        seconds = max(0.1, len(text) * SECONDS_PER_CHARACTER)
+        self.t3.inference(seconds)
+        self.s3gen.inference(seconds)
+        # A tone whose pitch depends on the text, with a syllable-rate envelope
+        t = np.arange(int(seconds * self.sr), dtype=np.float32) / self.sr
+        pitch = 110 + zlib.crc32(text.encode()) % 110
+        wav = 0.3 * np.sin(2 * np.pi * pitch * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+        wav = self.watermarker.apply_watermark(wav.astype(np.float32), sample_rate=self.sr)
+        return torch.from_numpy(wav).unsqueeze(0)
+
+
+@contextmanager
+def stub_model(compute_rtf: float = 0.0):
+    """Make the in-process backend load StubTTS instead of the real model.
+
+    Only the snapshot loader is replaced, so the rest of model loading (default voice,
+    tracing wrappers) runs as usual. Worker processes of the process backend load the
+    real model, so use the thread backend with the stub.
+    """
+    from tts.model import unload_tts_model
+
+    def load_from_snapshot(device, *args, **kwargs):
+        return StubTTS(device, compute_rtf), {"stub": 0.0}
+
+    unload_tts_model()
+    try:
+        with mock.patch("tts.snapshot.load_from_snapshot", load_from_snapshot):
+            yield
+    finally:
+        unload_tts_model()
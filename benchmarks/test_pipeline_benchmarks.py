@@ -0,0 +1,87 @@
+"""pytest-benchmark entries for the synthesis pipeline, run against the stub model.
+
+    pytest benchmarks --benchmark-json=bench.json
+    pytest-benchmark compare bench-old.json bench.json
+
+Skipped when pytest-benchmark is not installed.
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+os.environ.setdefault("API_ONLY", "true")
+os.environ.setdefault("WARMUP_RUNS", "0")
+
+from benchmarks.pipeline import make_texts
+from benchmarks.stub_model import stub_model
+
+SHORT_TEXT = make_texts(1, "short", seed=1)[0]
+LONG_TEXT = make_texts(1, "long", seed=1)[0]
+
+
+@pytest.fixture(scope="module")
+def stub_backend():
+    from tts.batcher import start_backend, stop_backend
+
+    with stub_model():
+        start_backend()
+        yield
+        stop_backend()
+
+
+@pytest.fixture(scope="module")
+def client(stub_backend):
+    from fastapi.testclient import TestClient
+
+    from app import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_chunk_text(benchmark):
+    from tts.chunker import chunk_text
+    from tts.normalize import normalize_text
+
+    benchmark(chunk_text, normalize_text(LONG_TEXT * 10))
+
+
+def test_normalize_text(benchmark):
+    from tts.normalize import expand
+
+    # expand is the uncached pipeline; normalize_text memoizes it
+    benchmark(expand, LONG_TEXT)
+
+
+def test_generate_audio_short(benchmark, stub_backend):
+    from tts.inference import generate_audio
+
+    benchmark(generate_audio, SHORT_TEXT)
+
+
+def test_generate_audio_long(benchmark, stub_backend):
+    from tts.inference import generate_audio
+
+    benchmark(generate_audio, LONG_TEXT, batching=True)
+
+
+@pytest.mark.parametrize("response_format", ["wav", "mp3", "flac"])
+def test_encode_audio(benchmark, response_format):
+    import numpy as np
+
+    from audio.encoders import encode_audio
+
+    samples = np.sin(np.linspace(0, 2000, 24000 * 10, dtype=np.float32)) * 0.3
+    benchmark(encode_audio, samples, 24000, response_format)
+
+
+@pytest.mark.parametrize("response_format", ["wav", "mp3"])
+def test_speech_endpoint(benchmark, client, response_format):
+    def request():
+        response = client.post("/v1/audio/speech", json={"input": SHORT_TEXT, "response_format": response_format, "cache": False})
+        assert response.status_code == 200
+
+    benchmark(request)
@@ -6,7 +6,127 @@ load_dotenv()
 # Audio temp directory size limit in megabytes
 AUDIO_TEMP_DIRECTORY_SIZE_LIMIT = int(os.getenv("AUDIO_TEMP_DIRECTORY_SIZE_LIMIT", "2000").split()[0])  
 
+# Number of model workers serving inference jobs (increase based on VRAM)
+NUM_OF_WORKERS = max(1, int(os.getenv("NUM_OF_WORKERS", "1").split()[0]))
 
+# Maximum number of inference jobs waiting for a worker before new requests are rejected
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "32").split()[0])
+
+# Seconds a request may spend queued and generating before it times out
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "300").split()[0])
+
+# Seconds clients are asked to wait (Retry-After) when the inference queue is full
+INFERENCE_RETRY_AFTER = int(os.getenv("INFERENCE_RETRY_AFTER", "5").split()[0])
+
+# Milliseconds the micro-batcher waits for more requests sharing a voice before running a batch (a lone request runs at once)
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "10").split()[0])
+
+# Maximum number of requests the micro-batcher groups into one model call
+MAX_BATCH_SIZE = max(1, int(os.getenv("MAX_BATCH_SIZE", "8").split()[0]))
+
+# Memory budget in megabytes for cached voice conditioning
+VOICE_CACHE_MEMORY_MB = float(os.getenv("VOICE_CACHE_MEMORY_MB", "512").split()[0])
+
+# Directory where voice conditioning is persisted between restarts (empty to disable)
+VOICE_CACHE_DIR = os.getenv("VOICE_CACHE_DIR", "cache/conditionals").strip()
+
+# Write numbers, dates, currency and URLs out as words and drop markdown and emoji before synthesis
+TEXT_NORMALIZATION = os.getenv("TEXT_NORMALIZATION", "true").split()[0].lower() in ("1", "true", "yes")
+
+# Long text is split into chunks of about CHUNK_TARGET_TOKENS estimated speech tokens (25 per second of
+# audio) and never more than CHUNK_MAX_TOKENS; the model stops generating at 1000
+CHUNK_TARGET_TOKENS = float(os.getenv("CHUNK_TARGET_TOKENS", "400").split()[0])
+CHUNK_MAX_TOKENS = float(os.getenv("CHUNK_MAX_TOKENS", "800").split()[0])
+
+# Characters per chunk when streaming; smaller chunks mean a faster first byte
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "250").split()[0])
+# Characters in the first chunk of a stream, which is all the client waits for before audio starts
+STREAM_FIRST_CHUNK_SIZE = int(os.getenv("STREAM_FIRST_CHUNK_SIZE", "100").split()[0])
+
+# Requests longer than this many characters stream by default unless "stream" is false
+STREAM_THRESHOLD = int(os.getenv("STREAM_THRESHOLD", "1000").split()[0])
+
+# Synthesis result cache: RAM and disk budgets in megabytes (0 disables the disk tier)
+RESULT_CACHE_MEMORY_MB = float(os.getenv("RESULT_CACHE_MEMORY_MB", "256").split()[0])
+RESULT_CACHE_DISK_MB = float(os.getenv("RESULT_CACHE_DISK_MB", "2000").split()[0])
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "cache/results").strip()
+
+# Per-chunk synthesis cache used to reuse unchanged chunks of long documents
+CHUNK_CACHE_MEMORY_MB = float(os.getenv("CHUNK_CACHE_MEMORY_MB", "256").split()[0])
+CHUNK_CACHE_DISK_MB = float(os.getenv("CHUNK_CACHE_DISK_MB", "4000").split()[0])
+CHUNK_CACHE_DIR = os.getenv("CHUNK_CACHE_DIR", "cache/chunks").strip()
+
+# Seconds between checks of config/voices.json for changes made by other workers
+VOICES_RELOAD_INTERVAL = float(os.getenv("VOICES_RELOAD_INTERVAL", "1").split()[0])
+
+# Model replicas: NUM_OF_WORKERS copies are loaded and spread over MODEL_DEVICES
+# (comma separated, e.g. "cuda:0,cuda:1"; auto-detected when empty). CPU replicas can be
+# pinned to core sets such as "0-3;4-7" and limited to TORCH_NUM_THREADS (0 = core set size)
+MODEL_DEVICES = os.getenv("MODEL_DEVICES", "").strip()
+REPLICA_CPU_CORES = os.getenv("REPLICA_CPU_CORES", "").strip()
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0").split()[0])
+
+# Local safetensors snapshot of the model weights, converted once from the hub checkpoints.
+# MODEL_DTYPE is the precision the snapshot is stored and loaded in; MODEL_OFFLINE builds
+# the snapshot from the local hub cache only (an existing snapshot never touches the hub)
+MODEL_SNAPSHOT_DIR = os.getenv("MODEL_SNAPSHOT_DIR", "cache/model").split()[0]
+MODEL_DTYPE = os.getenv("MODEL_DTYPE", "float32").split()[0].lower()
+MODEL_OFFLINE = os.getenv("MODEL_OFFLINE", "false").split()[0].lower() in ("1", "true", "yes")
+
+# Inference backend: "thread" runs the model replicas in this process, "process" runs
+# each replica in its own worker process (avoids the GIL on CPU-only hosts)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "thread").split()[0].lower()
+# Seconds to wait for worker processes to load the model, and the minimum time between restarts of a crashed worker
+WORKER_START_TIMEOUT = float(os.getenv("WORKER_START_TIMEOUT", "600").split()[0])
+WORKER_RESTART_DELAY = float(os.getenv("WORKER_RESTART_DELAY", "5").split()[0])
+
+# Startup warmup: WARMUP_RUNS rounds of synthetic generations (0 disables) for each
+# WARMUP_VOICES entry ("all", "default" or comma separated names) and each text length
+# bucket in WARMUP_LENGTHS (characters). /readyz reports not ready until it finishes
+WARMUP_RUNS = int(os.getenv("WARMUP_RUNS", "1").split()[0])
+WARMUP_VOICES = os.getenv("WARMUP_VOICES", "all").strip() or "all"
+WARMUP_LENGTHS = [int(length) for length in os.getenv("WARMUP_LENGTHS", "30,250").split()[0].split(",") if length]
+
+# Serve only the API: skip the Gradio voice UI and its imports for faster startup
+API_ONLY = os.getenv("API_ONLY", "false").split()[0].lower() in ("1", "true", "yes")
+
+# Request tracing: TRACING_ENABLED appends every span of synthesis requests to TRACE_FILE
+# (OTLP/JSON, one span per line). With TRACE_DEBUG_HEADER a request carrying X-Debug-Trace
+# is traced on its own and gets its stage breakdown back in a Server-Timing header
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").split()[0].lower() in ("1", "true", "yes")
+TRACE_FILE = os.getenv("TRACE_FILE", "logs/traces.jsonl").strip()
+TRACE_DEBUG_HEADER = os.getenv("TRACE_DEBUG_HEADER", "true").split()[0].lower() in ("1", "true", "yes")
+
+# Sampling profiler: requests slower than PROFILE_SLOW_REQUEST_MS (0 disables) dump a
+# collapsed-stack flamegraph into PROFILE_DIR, sampling every PROFILE_INTERVAL_MS
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "0").split()[0])
+PROFILE_DIR = os.getenv("PROFILE_DIR", "logs/profiles").strip()
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10").split()[0])
+
+# Retention janitor: a background thread that deletes the oldest generated files in outputs/
+# once it exceeds OUTPUTS_MAX_MB or they are older than OUTPUTS_TTL_HOURS (0 = no limit), and
+# result/chunk cache files older than CACHE_TTL_HOURS. Runs every JANITOR_INTERVAL seconds and
+# rescans the directories every JANITOR_RESCAN_INTERVAL seconds for files written by other workers
+OUTPUTS_MAX_MB = float(os.getenv("OUTPUTS_MAX_MB", "2000").split()[0])
+OUTPUTS_TTL_HOURS = float(os.getenv("OUTPUTS_TTL_HOURS", "24").split()[0])
+CACHE_TTL_HOURS = float(os.getenv("CACHE_TTL_HOURS", "0").split()[0])
+JANITOR_INTERVAL = float(os.getenv("JANITOR_INTERVAL", "60").split()[0])
+JANITOR_RESCAN_INTERVAL = float(os.getenv("JANITOR_RESCAN_INTERVAL", "3600").split()[0])
+
+# Long-form synthesis jobs (/v1/audio/jobs): state and per-chunk checkpoints live in JOBS_DIR
+# so a restarted server resumes unfinished jobs. JOB_WORKERS jobs run at once, each with
+# JOB_CHUNK_CONCURRENCY chunks in the inference queue; finished jobs are kept JOB_TTL_HOURS
+JOBS_DIR = os.getenv("JOBS_DIR", "cache/jobs").strip()
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1").split()[0])
+JOB_CHUNK_CONCURRENCY = int(os.getenv("JOB_CHUNK_CONCURRENCY", "2").split()[0])
+JOB_TTL_HOURS = float(os.getenv("JOB_TTL_HOURS", "24").split()[0])
+JOB_MAX_CHARACTERS = int(os.getenv("JOB_MAX_CHARACTERS", "1000000").split()[0])
+# Seconds a job waits before retrying a chunk the full inference queue rejected
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "1").split()[0])
+# Times a job retries a chunk whose inference timed out before the job fails
+MAX_CHUNK_RETRIES = int(os.getenv("MAX_CHUNK_RETRIES", "5").split()[0])
+# Interactive chunks that may run in a row while bulk (job) chunks wait before one bulk chunk goes first; 0 disables
+PRIORITY_STARVATION_LIMIT = int(os.getenv("PRIORITY_STARVATION_LIMIT", "8").split()[0])
 
 # Chatterbox port
 CHATTERBOX_PORT = os.getenv("CHATTERBOX_PORT")
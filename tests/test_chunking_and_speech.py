@@ -1,18 +1,27 @@
+import json
 import os
+import subprocess
 import sys
+import time
 
+import pytest
 from fastapi.testclient import TestClient
 
 # Ensure app and chunking are importable
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from app import app
 
-client = TestClient(app)
 
+@pytest.fixture(scope="module")
+def client():
+    # Entering the client runs the lifespan, which loads the model and starts the inference scheduler
+    with TestClient(app) as test_client:
+        yield test_client
 
 
 
-def test_restart_server():
+
+def test_restart_server(client):
     """Test the restart server endpoint"""
     response = client.post("/restart_server")
     assert response.status_code == 200
@@ -22,7 +31,55 @@ def test_restart_server():
 
 
 
-def test_speech_endpoint_v1_audio_speech():
+def test_chunk_text():
+    """Chunks end at real sentence ends and fit the model's token budget"""
+    from tts.chunker import chunk_text, estimate_tokens
+
+    text = "Notes.\n\nDr. Smith paid at five p.m. for two items. J. R. R. Tolkien wrote books. Really? Yes!"
+    assert chunk_text(text, target_tokens=60, max_tokens=200) == [
+        "Notes. Dr. Smith paid at five p.m. for two items.",
+        "J. R. R. Tolkien wrote books.",
+        "Really? Yes!",
+    ]
+
+    run_on = "word, " * 500 + "end."
+    chunks = chunk_text(run_on, target_tokens=100, max_tokens=200)
+    assert max(estimate_tokens(chunk) for chunk in chunks) <= 200
+    assert " ".join(chunks).split() == run_on.split()
+    assert chunk_text("") == []
+
+    # The last chunk is evened out with the one before instead of being left tiny
+    sizes = [len(chunk) for chunk in chunk_text("Hello world! " * 100)]
+    assert min(sizes) > max(sizes) / 2
+
+    # Words too long for one chunk are cut without spaces put inside them
+    url = "https://example.com/" + "/".join(f"segment{index}" for index in range(80))
+    chunks = chunk_text(f"See {url} for details.", target_tokens=100, max_tokens=200)
+    assert max(estimate_tokens(chunk) for chunk in chunks) <= 200
+    assert url in "".join(chunks)
+
+    # A stream's first chunk is kept short so audio starts sooner
+    sentences = " ".join(f"Sentence number {i} is here." for i in range(20))
+    chunks = chunk_text(sentences, target_tokens=200, max_tokens=400, first_target_tokens=60)
+    assert estimate_tokens(chunks[0]) <= 60
+    assert estimate_tokens(chunks[1]) > 2 * estimate_tokens(chunks[0])
+    assert " ".join(chunks) == sentences
+
+
+def test_normalize_text():
+    """Numbers, currency, dates, URLs, emoji and markdown are rewritten the way they are spoken"""
+    from tts.normalize import normalize_text
+
+    text = "# Update\n\nOn 2024-03-15 at 5:30 pm, **1,200** users paid $3.50 (12.5% more) 🎉 via https://example.com/pay."
+    expected = (
+        "Update.\n\nOn March fifteenth, twenty twenty-four at five thirty p.m., one thousand two hundred users "
+        "paid three dollars and fifty cents (twelve point five percent more) via example dot com."
+    )
+    assert normalize_text(text) == expected
+    assert normalize_text(expected) == expected
+
+
+def test_speech_endpoint_v1_audio_speech(client):
     """Test the speech endpoint"""
     # Short text (no batching)
     response = client.post("/v1/audio/speech", json={"input": "Hello world!", "voice": "default"})
@@ -36,7 +93,15 @@ def test_speech_endpoint_v1_audio_speech():
     assert response.headers["content-type"].startswith("audio/")
 
 
-def test_speech_endpoint_legacy():
+def test_speech_endpoint_writes_no_files(client):
+    """/v1/audio/speech answers from memory; only /speak keeps a file in outputs/"""
+    before = set(os.listdir("outputs"))
+    response = client.post("/v1/audio/speech", json={"input": "Nothing on disk.", "voice": "default", "cache": False})
+    assert response.status_code == 200
+    assert set(os.listdir("outputs")) == before
+
+
+def test_speech_endpoint_legacy(client):
     """Test the legacy speech endpoint"""
     # Short text
     response = client.post("/speak", json={"text": "Legacy endpoint test.", "voice": "default"})
@@ -51,4 +116,537 @@ def test_speech_endpoint_legacy():
     # response = client.post("/speak", json={"text": long_text, "voice": "default"})
     # assert response.status_code == 200
     # # Should return a file (joined wav)
-    # assert response.headers["content-type"].startswith("audio/") 
\ No newline at end of file
+    # assert response.headers["content-type"].startswith("audio/") 
+
+def test_speech_endpoint_streaming(client):
+    """Test the streaming speech endpoint"""
+    response = client.post("/v1/audio/speech", json={"input": "Hello world! " * 30, "voice": "default", "stream": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("audio/wav")
+    assert response.content[:4] == b"RIFF"
+    assert len(response.content) > 44
+
+
+def test_speech_websocket(client):
+    """Text sent in pieces comes back as audio sentence by sentence, with flush and close events"""
+    from tts.chunker import split_complete
+
+    assert split_complete("I met Dr. Smith. He") == ("I met Dr. Smith.", "He")
+    assert split_complete("Hello there. ") == ("", "Hello there. ")
+
+    with client.websocket_connect("/v1/audio/speech/ws?response_format=pcm") as websocket:
+        assert websocket.receive_json()["type"] == "ready"
+        assert websocket.receive_bytes() == b""
+        for piece in ["Hello ", "there. How ", "are you? I am", " fine"]:
+            websocket.send_json({"type": "text", "text": piece})
+        # Both complete sentences are synthesized before the flush asks for the rest
+        websocket.send_json({"type": "flush"})
+        audio = b""
+        message = websocket.receive()
+        while "bytes" in message:
+            audio += message["bytes"]
+            message = websocket.receive()
+        assert json.loads(message["text"]) == {"type": "flushed"}
+        assert len(audio) > 0 and len(audio) % 2 == 0
+
+        websocket.send_json({"type": "text", "text": "Goodbye."})
+        websocket.send_json({"type": "close"})
+        message = websocket.receive()
+        while "bytes" in message:
+            message = websocket.receive()
+        assert json.loads(message["text"]) == {"type": "done"}
+
+    with client.websocket_connect("/v1/audio/speech/ws?voice=missing") as websocket:
+        assert websocket.receive_json()["type"] == "error"
+
+
+def test_speech_endpoint_result_cache(client):
+    """Repeated requests are served from the result cache unless the caller opts out"""
+    payload = {"input": "Result cache test.", "voice": "default", "stream": False}
+    first = client.post("/v1/audio/speech", json=payload)
+    assert first.status_code == 200
+
+    second = client.post("/v1/audio/speech", json=payload)
+    assert second.status_code == 200
+    assert second.headers.get("x-cache") == "HIT"
+    assert second.content == first.content
+
+    fresh = client.post("/v1/audio/speech", json={**payload, "cache": False})
+    assert fresh.status_code == 200
+    assert "x-cache" not in fresh.headers
+
+
+def test_speech_endpoint_response_formats(client):
+    """Test that response_format selects the encoder and unknown formats are rejected"""
+    response = client.post("/v1/audio/speech", json={"input": "Format test.", "response_format": "mp3", "stream": False})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("audio/mpeg")
+
+    response = client.post("/v1/audio/speech", json={"input": "Format test.", "response_format": "flac", "speed": 1.5})
+    assert response.status_code == 200
+    assert response.content[:4] == b"fLaC"
+
+    response = client.post("/v1/audio/speech", json={"input": "Format test.", "response_format": "xyz"})
+    assert response.status_code == 400
+
+    # aac is only encoded through ffmpeg; without it the request is rejected up front
+    from audio.encoders import has_ffmpeg
+
+    response = client.post("/v1/audio/speech", json={"input": "Format test.", "response_format": "aac", "stream": False})
+    if has_ffmpeg():
+        assert response.status_code == 200
+    else:
+        assert response.status_code == 400
+        assert response.json()["detail"] == "aac requires ffmpeg"
+
+
+@pytest.mark.parametrize("response_format", ["mp3", "flac"])
+def test_streamed_audio_decodes_to_full_length(client, response_format):
+    """A streamed mp3 or flac decodes to as much audio as the same request without streaming"""
+    import io
+
+    import soundfile as sf
+
+    payload = {"input": "Hello world! " * 30, "voice": "default", "response_format": response_format, "cache": False}
+    streamed = client.post("/v1/audio/speech", json={**payload, "stream": True})
+    whole = client.post("/v1/audio/speech", json={**payload, "stream": False})
+    assert streamed.status_code == whole.status_code == 200
+    streamed_samples, _ = sf.read(io.BytesIO(streamed.content))
+    whole_samples, _ = sf.read(io.BytesIO(whole.content))
+    # Chunk crossfades and encoder padding account for small differences
+    assert abs(len(streamed_samples) - len(whole_samples)) < 0.05 * len(whole_samples)
+
+
+def test_speech_job(client):
+    """A job reports progress, serves its result once done and can be deleted"""
+    response = client.post("/v1/audio/jobs", json={"input": "First part of the job. Second part of the job.", "voice": "default"})
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    deadline = time.time() + 300
+    status = response.json()
+    while status["status"] not in ("done", "failed") and time.time() < deadline:
+        time.sleep(0.5)
+        status = client.get(f"/v1/audio/jobs/{job_id}").json()
+    assert status["status"] == "done"
+    assert status["chunks_done"] == status["chunks_total"]
+
+    result = client.get(f"/v1/audio/jobs/{job_id}/result")
+    assert result.status_code == 200
+    assert result.headers["content-type"].startswith("audio/")
+    assert client.delete(f"/v1/audio/jobs/{job_id}").status_code == 200
+    assert client.get(f"/v1/audio/jobs/{job_id}").status_code == 404
+
+    # Input with nothing to speak once normalized is rejected up front
+    for text in ["🎉🎉", "---", "```\n```"]:
+        assert client.post("/v1/audio/jobs", json={"input": text}).status_code == 400
+
+
+def test_job_retries_timed_out_chunks(tmp_path, monkeypatch):
+    """A chunk that times out behind interactive work is retried, up to max_retries times"""
+    import asyncio
+
+    import torch
+
+    import tts.jobs
+    from tts.jobs import Job, JobManager
+
+    attempts = []
+
+    class SlowScheduler:
+        async def run(self, fn, **kwargs):
+            attempts.append(kwargs["text"])
+            if len(attempts) < 3:
+                raise asyncio.TimeoutError()
+            return torch.zeros(1, 100)
+
+    monkeypatch.setattr(tts.jobs, "get_scheduler", lambda: SlowScheduler())
+    manager = JobManager(jobs_dir=str(tmp_path), retry_delay=0, max_retries=2)
+    job = Job("job", ["Only chunk."], status="running", jobs_dir=str(tmp_path))
+    job.save()
+    asyncio.run(manager._synthesize_chunk(job, 0))
+    assert attempts == ["Only chunk."] * 3
+    assert job.done_chunks == {0}
+    assert os.path.exists(job.chunk_path(0))
+
+    # A chunk that keeps timing out fails the job instead of retrying forever
+    attempts.clear()
+    manager = JobManager(jobs_dir=str(tmp_path), retry_delay=0, max_retries=1)
+    job = Job("stuck", ["Only chunk."], status="running", jobs_dir=str(tmp_path))
+    job.save()
+    with pytest.raises(RuntimeError, match="timed out 2 times"):
+        asyncio.run(manager._synthesize_chunk(job, 0))
+    assert len(attempts) == 2
+
+
+def test_metrics_endpoint(client):
+    """Synthesis requests show up in the Prometheus metrics"""
+    client.post("/v1/audio/speech", json={"input": "Metrics check.", "voice": "default"})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'tts_requests_total{endpoint="/v1/audio/speech",voice="default"}' in response.text
+    assert "tts_queue_wait_seconds_bucket" in response.text
+    assert "tts_real_time_factor_count" in response.text
+
+
+def test_debug_trace_header(client):
+    """X-Debug-Trace returns the request's stage breakdown as a Server-Timing header"""
+    response = client.post(
+        "/v1/audio/speech",
+        json={"input": "Tracing test.", "voice": "default", "cache": False},
+        headers={"X-Debug-Trace": "1"},
+    )
+    assert response.status_code == 200
+    assert response.headers["x-trace-id"]
+    stages = [entry.split(";")[0].strip() for entry in response.headers["server-timing"].split(",")]
+    assert {"queue_wait", "generate", "total"} <= set(stages)
+
+
+def test_janitor_enforces_size_and_age(tmp_path):
+    """The janitor deletes the oldest tracked files until the directory is within its limits"""
+    from tts.janitor import Janitor, RetentionArea
+
+    now = time.time()
+    for index, age in enumerate([500, 300, 100, 10]):
+        path = tmp_path / f"{index}.wav"
+        path.write_bytes(b"a" * 100)
+        os.utime(path, (now - age, now - age))
+    janitor = Janitor({"outputs": RetentionArea(str(tmp_path), max_bytes=250, max_age=400)}, cache_ttl=0, rescan_interval=3600)
+    janitor.rescan()
+    assert janitor.stats()["outputs"]["bytes"] == 400
+
+    assert janitor.sweep(now) == 2
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["2.wav", "3.wav"]
+    assert janitor.stats()["outputs"]["bytes"] == 200
+
+
+def test_fair_queue_priority_and_round_robin():
+    """Interactive work goes first, clients take turns, and bulk work is not starved"""
+    from tts.priority import FairQueue
+
+    queue = FairQueue(starvation_limit=3)
+    for index in range(2):
+        queue.push(("job", index), rank=1, client="a")
+    for index in range(3):
+        queue.push(("alice", index), rank=0, client="alice")
+    queue.push(("bob", 0), rank=0, client="bob")
+    assert [queue.pop() for _ in range(len(queue))] == [
+        ("alice", 0), ("bob", 0), ("alice", 1), ("job", 0), ("alice", 2), ("job", 1),
+    ]
+
+
+def test_voice_registry_lookup_and_invalidation(tmp_path, monkeypatch):
+    """Lookups come from the index, edits drop stale conditioning and other writers' changes are picked up"""
+    import tts.voices
+    from tts.voices import VoiceRegistry
+
+    invalidated = []
+    monkeypatch.setattr(tts.voices, "invalidate_voice_conditioning", invalidated.append)
+    path = str(tmp_path / "voices.json")
+    registry = VoiceRegistry(path, reload_interval=0.05)
+    assert registry.all() == [] and registry.get("alice") is None
+
+    registry.add({"name": "alice", "path": "voices/alice.wav", "exaggeration": 0.5, "cfg_weight": 0.4})
+    assert registry.get("alice")["path"] == "voices/alice.wav"
+    registry.add({"name": "alice", "path": "voices/alice2.wav", "exaggeration": 0.7, "cfg_weight": 0.4})
+    assert registry.get("alice")["exaggeration"] == 0.7 and len(registry.all()) == 1
+    assert invalidated == ["voices/alice.wav", "voices/alice.wav", "voices/alice2.wav"]
+
+    # Another worker's registry sees the change once the watcher reloads the file
+    registry.start_watching()
+    VoiceRegistry(path).add({"name": "bob", "path": "voices/bob.wav", "exaggeration": 0.5, "cfg_weight": 0.5})
+    deadline = time.time() + 5
+    while registry.get("bob") is None and time.time() < deadline:
+        time.sleep(0.05)
+    assert registry.get("bob") is not None
+
+    registry.delete("alice")
+    assert registry.get("alice") is None
+    assert invalidated[-1] == "voices/alice2.wav"
+    assert [voice["name"] for voice in VoiceRegistry(path).all()] == ["bob"]
+
+
+def test_voice_registry_concurrent_writers(tmp_path):
+    """Processes adding voices at the same time never lose each other's entries"""
+    script = (
+        "import sys; from tts.voices import VoiceRegistry; registry = VoiceRegistry(sys.argv[1]); "
+        "[registry.add({'name': f'{sys.argv[2]}-{i}', 'path': f'v{i}.wav', 'exaggeration': 0.5, 'cfg_weight': 0.5}) for i in range(20)]"
+    )
+    path = str(tmp_path / "voices.json")
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    writers = [
+        subprocess.Popen([sys.executable, "-c", script, path, f"writer{index}"], cwd=tmp_path, env={**os.environ, "PYTHONPATH": root})
+        for index in range(4)
+    ]
+    assert all(writer.wait(timeout=120) == 0 for writer in writers)
+
+    from tts.voices import VoiceRegistry
+
+    names = {voice["name"] for voice in VoiceRegistry(path).all()}
+    assert names == {f"writer{index}-{i}" for index in range(4) for i in range(20)}
+
+
+def test_join_audio_arrays():
+    """Segments overlap by the crossfade length, or by all of a segment shorter than that"""
+    import numpy as np
+
+    from audio.convert_audio import join_audio_arrays
+    from audio.stream import equal_power_fades
+
+    segments = [np.zeros(200), np.ones(300), np.full(30, 2.0)]
+    joined = join_audio_arrays(segments, sample_rate=1000, crossfade_ms=50)
+    assert joined.dtype == np.float32
+    assert len(joined) == 200 + (300 - 50) + (30 - 30)
+
+    _, fade_in = equal_power_fades(50)
+    assert np.all(joined[:150] == 0)
+    np.testing.assert_allclose(joined[150:200], fade_in, rtol=1e-6)
+    assert np.all(joined[200:420] == 1)
+    fade_out, fade_in = equal_power_fades(30)
+    np.testing.assert_allclose(joined[420:], fade_out + 2 * fade_in, rtol=1e-6)
+
+    np.testing.assert_array_equal(join_audio_arrays([np.ones(10)], 1000), np.ones(10))
+    with pytest.raises(ValueError):
+        join_audio_arrays([], 1000)
+
+
+def test_edited_document_reuses_cached_chunks(monkeypatch):
+    """Only the chunks that changed since the last synthesis are sent to the batcher"""
+    from concurrent.futures import Future
+
+    import torch
+
+    import tts.inference
+    import tts.result_cache
+    from tts.result_cache import ResultCache
+
+    submitted = []
+
+    class CountingBatcher:
+        def submit(self, text, **kwargs):
+            submitted.append(text)
+            future = Future()
+            future.set_result(torch.full((1, 100), float(len(text))))
+            return future
+
+    monkeypatch.setattr(tts.inference, "get_batcher", lambda: CountingBatcher())
+    monkeypatch.setattr(tts.result_cache, "chunk_cache", ResultCache(memory_mb=1, disk_mb=0))
+
+    chunks = ["First paragraph.", "Second paragraph.", "Third paragraph."]
+    original = tts.inference.synthesize_chunks(chunks, use_cache=True)
+    assert submitted == chunks
+
+    submitted.clear()
+    edited = tts.inference.synthesize_chunks([chunks[0], "Second paragraph, edited.", chunks[2]], use_cache=True)
+    assert submitted == ["Second paragraph, edited."]
+    assert torch.equal(edited[0], original[0]) and torch.equal(edited[2], original[2])
+    assert edited[1][0, 0] == len("Second paragraph, edited.")
+
+
+def test_process_pool_restarts_crashed_worker(monkeypatch):
+    """Requests on a worker that dies fail with WorkerCrashedError and the worker is restarted"""
+    import multiprocessing as mp
+    import signal
+
+    import tts.process_pool
+    from tts.model import ModelReplica
+    from tts.process_pool import ProcessPool, WorkerCrashedError
+
+    def crashing_worker(index, device, cpu_cores, num_threads, tasks, results):
+        results.send(("ready", index, 24000))
+        tasks.get()
+        # Killed outright, like the OOM killer would
+        os.kill(os.getpid(), signal.SIGKILL)
+
+    monkeypatch.setattr(tts.process_pool, "worker_main", crashing_worker)
+    pool = ProcessPool([ModelReplica(0, "cpu")], start_timeout=30, restart_delay=0)
+    # fork, so the stub worker defined here runs in the child without being importable there
+    pool.context = mp.get_context("fork")
+    worker = pool.workers[0]
+    worker.context = pool.context
+    pool.start()
+    try:
+        future = pool.submit("This request crashes the worker.")
+        assert isinstance(future.exception(timeout=30), WorkerCrashedError)
+        deadline = time.time() + 30
+        while not (worker.restarts == 1 and worker.ready and worker.alive()) and time.time() < deadline:
+            time.sleep(0.05)
+        assert worker.restarts == 1 and worker.ready and worker.alive()
+        assert pool.stats()[0]["errors"] == 1
+    finally:
+        pool.stop()
+
+
+def test_result_cache_key_tracks_model(tmp_path, monkeypatch):
+    """Changing the precision or the weights the snapshot was built from changes every cache key"""
+    import tts.result_cache
+    from tts.result_cache import ResultCache, get_model_version
+
+    def key(dtype, revision):
+        (tmp_path / dtype).mkdir(exist_ok=True)
+        (tmp_path / dtype / "manifest.json").write_text(json.dumps({"revision": revision}))
+        monkeypatch.setattr(tts.result_cache, "MODEL_SNAPSHOT_DIR", str(tmp_path))
+        monkeypatch.setattr(tts.result_cache, "MODEL_DTYPE", dtype)
+        get_model_version.cache_clear()
+        return ResultCache(disk_mb=0).make_key("Same text.")
+
+    try:
+        assert key("float32", "abc") == key("float32", "abc")
+        assert key("float32", "abc") != key("bfloat16", "abc")
+        assert key("float32", "abc") != key("float32", "def")
+    finally:
+        get_model_version.cache_clear()
+
+
+def test_conditioning_cache(tmp_path):
+    """Voices are prepared once, evicted beyond the memory budget and re-prepared when the clip changes"""
+    from benchmarks.stub_model import StubTTS
+    from tts.conditioning import ConditioningCache, conditionals_size
+
+    model = StubTTS()
+    prepared = []
+
+    def prepare_conditionals(path, exaggeration=0.5):
+        prepared.append(os.path.basename(path))
+        StubTTS.prepare_conditionals(model, path, exaggeration)
+
+    model.prepare_conditionals = prepare_conditionals
+    first, second = tmp_path / "first.wav", tmp_path / "second.wav"
+    first.write_bytes(b"a" * 10)
+    second.write_bytes(b"b" * 10)
+    # Room for a single entry
+    cache = ConditioningCache(memory_budget_mb=conditionals_size(model.conds) * 1.5 / 1024 / 1024, cache_dir=None)
+
+    conds = cache.get(model, str(first))
+    assert cache.get(model, str(first)) is conds
+    assert prepared == ["first.wav"]
+
+    cache.get(model, str(second))
+    cache.get(model, str(first))
+    assert prepared == ["first.wav", "second.wav", "first.wav"]
+
+    # A replaced clip has a new fingerprint, and invalidate() drops whatever is cached for the path
+    first.write_bytes(b"c" * 20)
+    cache.get(model, str(first))
+    cache.invalidate(str(first))
+    cache.get(model, str(first))
+    assert prepared == ["first.wav", "second.wav", "first.wav", "first.wav", "first.wav"]
+
+
+def test_batcher_resolves_each_request_when_generated():
+    """Requests grouped together share the conditioning but do not wait for the whole group"""
+    from benchmarks.stub_model import StubTTS
+    from tts.batcher import MicroBatcher
+    from tts.model import ModelReplica
+
+    replica = ModelReplica(0, "cpu")
+    replica.model = StubTTS(compute_rtf=0.2)
+    replica.model.default_conds = replica.model.conds
+    batcher = MicroBatcher(replica, window_ms=50, max_batch_size=4)
+
+    started = time.perf_counter()
+    finished = []
+    futures = [batcher.submit(f"Sentence {index}, fifteen.") for index in range(4)]
+    for future in futures:
+        future.add_done_callback(lambda _: finished.append(time.perf_counter() - started))
+    audios = [future.result(timeout=30) for future in futures]
+    assert all(audio.shape[-1] > 0 for audio in audios)
+    # Each text takes about 0.3s to generate; the first is delivered long before the last
+    assert finished[0] < finished[-1] - 0.5
+    assert replica.processed == 4
+
+
+def test_batcher_runs_lone_request_without_waiting():
+    """A request with nothing to group with does not wait for the batching window"""
+    from benchmarks.stub_model import StubTTS
+    from tts.batcher import MicroBatcher
+    from tts.model import ModelReplica
+    from tts.scheduler import InferenceScheduler
+
+    replica = ModelReplica(0, "cpu")
+    replica.model = StubTTS(compute_rtf=0.0)
+    replica.model.default_conds = replica.model.conds
+    batcher = MicroBatcher(replica, window_ms=5000, max_batch_size=4)
+    started = time.perf_counter()
+    batcher.submit("Alone.").result(timeout=30)
+    batcher.submit("Other settings.", exaggeration=0.7).result(timeout=30)
+    assert time.perf_counter() - started < 2.5
+    # Job slots match the model workers; batch size is not extra parallel capacity
+    assert InferenceScheduler(num_workers=2).slots == 2
+
+
+def test_timed_out_document_cancels_remaining_chunks(monkeypatch):
+    """When the scheduler gives up on a document, its chunks not yet started are cancelled"""
+    import asyncio
+    from concurrent.futures import Future
+
+    import tts.inference
+    from tts.inference import synthesize_chunks
+    from tts.scheduler import InferenceScheduler
+
+    submitted = []
+
+    class StuckBatcher:
+        def submit(self, text, **kwargs):
+            submitted.append(Future())
+            return submitted[-1]
+
+    monkeypatch.setattr(tts.inference, "get_batcher", lambda: StuckBatcher())
+
+    async def run():
+        scheduler = InferenceScheduler(num_workers=1, timeout=0.2)
+        await scheduler.start()
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await scheduler.run(synthesize_chunks, [f"Chunk {index}." for index in range(5)])
+            deadline = time.monotonic() + 5
+            while not all(future.cancelled() for future in submitted) and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(run())
+    assert len(submitted) == 5
+    assert all(future.cancelled() for future in submitted)
+
+
+def test_invalid_priority(client):
+    """Unknown priority classes are rejected"""
+    response = client.post("/v1/audio/speech", json={"input": "Hi.", "voice": "default", "priority": "urgent"})
+    assert response.status_code == 400
+    response = client.post("/v1/audio/speech", json={"input": "Hi.", "voice": "default"}, headers={"X-Priority": "urgent"})
+    assert response.status_code == 400
+
+
+def test_health_and_readiness(client):
+    """Liveness is always ok; readiness reports its checks and turns ready once warmup finishes"""
+    assert client.get("/healthz").json() == {"status": "ok"}
+    response = client.get("/readyz")
+    assert response.status_code in (200, 503)
+    assert set(response.json()["checks"]) == {"warmup", "scheduler", "workers", "queue"}
+    assert response.json()["checks"]["scheduler"]
+
+
+# Seconds "import app" may take in API-only mode before the test fails
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "5"))
+
+
+def test_api_only_import_time():
+    """API-only startup must not import the UI or model stack and must stay within the import budget"""
+    script = (
+        "import json, sys, time; started = time.perf_counter(); import app; "
+        "print(json.dumps({'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), '..')),
+        env={**os.environ, "API_ONLY": "true"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    for module in ("gradio", "ui.custom_voice", "markdown2", "perth", "librosa", "chatterbox"):
+        assert module not in report["modules"], f"{module} is imported at startup in API-only mode"
+    assert report["seconds"] < IMPORT_TIME_BUDGET, f"import app took {report['seconds']:.2f}s (budget {IMPORT_TIME_BUDGET}s)"
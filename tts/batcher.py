@@ -0,0 +1,242 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from config.constants import BATCH_WINDOW_MS, INFERENCE_BACKEND, MAX_BATCH_SIZE
+from tts.conditioning import get_conditionals, get_conditioning_cache
+from tts.metrics import GENERATE_TIME, voice_label
+from tts.model import ModelReplica, get_model, get_model_pool, unload_tts_model
+from tts.priority import PRIORITY_CLASSES, FairQueue, current_client, priority_rank
+from tts.process_pool import get_process_pool, stop_process_pool
+from tts.tracing import current_span, record_span, span, within
+
+
+def generate_batch(replica: ModelReplica, texts: list[str], exaggeration: float = 0.5, cfg_weight: float = 0.5, voice_path: str = None, parents: list = None, on_audio=None):
+    """Generate audio for several texts that share the same voice settings.
+
+    The voice conditioning comes from the conditioning cache and is installed once for
+    the whole group, then each text is decoded with it. Returns one (1, samples) tensor per text.
+    parents are the spans of the traced requests the texts belong to (None for untraced ones).
+    on_audio(index, audio) is called as soon as each text is generated, so its caller does not
+    wait for the rest of the group.
+    """
+    model = replica.model
+    parents = parents or [None] * len(texts)
+    with replica.lock:
+        started = time.time_ns()
+        model.conds = get_conditionals(model, voice_path, exaggeration)
+        finished = time.time_ns()
+        for parent in parents:
+            record_span(parent, "conditioning", started, finished, voice=voice_label(voice_path))
+        audios = []
+        for text, parent in zip(texts, parents):
+            with within(parent), span("generate", characters=len(text), replica=replica.index):
+                with GENERATE_TIME.time(voice=voice_label(voice_path)):
+                    audios.append(model.generate(text, exaggeration=exaggeration, cfg_weight=cfg_weight))
+            if on_audio is not None:
+                on_audio(len(audios) - 1, audios[-1])
+        return audios
+
+
+class BatchRequest:
+    """One queued text with the context of the request it belongs to"""
+
+    def __init__(self, key: tuple, text: str, future: Future):
+        self.key = key
+        self.text = text
+        self.future = future
+        self.rank = priority_rank()
+        self.client = current_client.get()
+        # The caller's span travels with the request so the dispatch thread can attach its stages to it
+        self.parent = current_span.get()
+        self.queued = time.time_ns()
+
+
+class MicroBatcher:
+    """Collects synthesis requests arriving within a short window and runs compatible
+    ones (same voice, exaggeration and cfg_weight) together on one model replica.
+
+    The model has no batched generate, so a group shares its voice conditioning and is
+    decoded text by text; each request resolves as soon as its own text is done.
+
+    Requests are taken by priority class and round-robin between clients. Lower
+    priority texts run one at a time, and when more urgent work arrives the rest of
+    them go back to the queue, so an interactive request waits for at most one
+    bulk chunk.
+    """
+
+    def __init__(self, replica: ModelReplica, window_ms: float = BATCH_WINDOW_MS, max_batch_size: int = MAX_BATCH_SIZE):
+        self.replica = replica
+        self.window = window_ms / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending = FairQueue()
+        self._available = threading.Condition()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, text: str, exaggeration: float = 0.5, cfg_weight: float = 0.5, voice_path: str = None) -> Future:
+        """Queue a text for synthesis; the returned future resolves to a (1, samples) tensor"""
+        self._ensure_running()
+        future = Future()
+        with self._start_lock:
+            self.replica.pending += 1
+        future.add_done_callback(self._release)
+        request = BatchRequest((voice_path, exaggeration, cfg_weight), text, future)
+        with self._available:
+            self._pending.push(request, request.rank, request.client)
+            self._available.notify()
+        return future
+
+    def _release(self, _future):
+        with self._start_lock:
+            self.replica.pending -= 1
+
+    def _ensure_running(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"tts-batcher-{self.replica.index}", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        """Block for the first request, then gather more until the window closes or the batch is full.
+
+        Only a group that shares a voice gains from waiting, so a lone request, or one no
+        other queued request shares its voice with, is dispatched right away.
+        """
+        with self._available:
+            while not len(self._pending):
+                self._available.wait()
+            batch = [self._pending.pop()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                if len(self._pending):
+                    batch.append(self._pending.pop())
+                    continue
+                if not any(request.key == batch[0].key for request in batch[1:]):
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._available.wait(remaining):
+                    break
+        return batch
+
+    def _more_urgent_waiting(self, rank: int):
+        with self._available:
+            top = self._pending.top_rank()
+        return top is not None and top < rank
+
+    def _requeue(self, requests: list[BatchRequest]):
+        """Put preempted requests back at the head of their clients' queues, in their original order"""
+        with self._available:
+            for request in reversed(requests):
+                self._pending.push(request, request.rank, request.client, front=True)
+
+    def _run(self):
+        self.replica.configure_thread()
+        top_rank = min(PRIORITY_CLASSES.values())
+        while True:
+            groups = {}
+            for request in self._collect():
+                groups.setdefault((request.rank, request.key), []).append(request)
+
+            # Most urgent groups first; lower priority ones one text at a time so they can be preempted
+            steps = []
+            for (rank, _), requests in sorted(groups.items(), key=lambda group: group[0][0]):
+                size = len(requests) if rank == top_rank else 1
+                steps.extend((rank, requests[start:start + size]) for start in range(0, len(requests), size))
+            for index, (rank, requests) in enumerate(steps):
+                if rank > top_rank and self._more_urgent_waiting(rank):
+                    self._requeue([request for _, later in steps[index:] for request in later])
+                    break
+                self._generate(requests)
+
+    def _generate(self, requests: list[BatchRequest]):
+        dispatched = time.time_ns()
+        # Skip requests whose caller gave up while they were queued
+        requests = [request for request in requests if request.future.set_running_or_notify_cancel()]
+        if not requests:
+            return
+        for request in requests:
+            record_span(request.parent, "batch_wait", request.queued, dispatched)
+        voice_path, exaggeration, cfg_weight = requests[0].key
+        resolved = 0
+
+        def deliver(index, audio):
+            nonlocal resolved
+            self.replica.record(True)
+            requests[index].future.set_result(audio)
+            resolved = index + 1
+
+        try:
+            generate_batch(
+                self.replica,
+                [request.text for request in requests],
+                exaggeration=exaggeration,
+                cfg_weight=cfg_weight,
+                voice_path=voice_path,
+                parents=[request.parent for request in requests],
+                on_audio=deliver,
+            )
+        except Exception as e:
+            # Texts generated before the failure have already been delivered
+            self.replica.record(False, len(requests) - resolved)
+            for request in requests[resolved:]:
+                request.future.set_exception(e)
+
+
+batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher():
+    """Where to submit the next synthesis request.
+
+    With the process backend this is the worker process pool; otherwise the batcher
+    of the least-loaded healthy in-process model replica. Both have the same submit().
+    """
+    if INFERENCE_BACKEND == "process":
+        return get_process_pool()
+    replica = get_model_pool().least_loaded()
+    with _batchers_lock:
+        if replica.index not in batchers or batchers[replica.index].replica is not replica:
+            batchers[replica.index] = MicroBatcher(replica)
+        return batchers[replica.index]
+
+
+def prepare_voice(voice_path: str, exaggeration: float = 0.5):
+    """Compute a custom voice's conditionals ahead of its first request.
+
+    Only the in-process backend shares the conditioning cache with the server; worker
+    processes keep their own and prepare the voice with its first chunk.
+    """
+    if INFERENCE_BACKEND == "process" or not voice_path:
+        return
+    replica = get_model_pool().least_loaded()
+    with replica.lock:
+        get_conditioning_cache().get(replica.model, voice_path, exaggeration)
+
+
+def start_backend():
+    """Load the models for the configured backend (called from the FastAPI lifespan)"""
+    if INFERENCE_BACKEND == "process":
+        get_process_pool()
+    else:
+        get_model_pool()
+
+
+def stop_backend():
+    if INFERENCE_BACKEND == "process":
+        stop_process_pool()
+    else:
+        unload_tts_model()
+
+
+def get_sample_rate():
+    if INFERENCE_BACKEND == "process":
+        return get_process_pool().sample_rate
+    return get_model().sr
+
+
+def worker_stats():
+    if INFERENCE_BACKEND == "process":
+        return get_process_pool().stats()
+    return get_model_pool().stats()
@@ -0,0 +1,212 @@
+import math
+import re
+
+from config.constants import CHUNK_MAX_TOKENS, CHUNK_TARGET_TOKENS
+
+# Chatterbox generates 25 speech tokens per second of audio and stops at 1000, and
+# English speech runs at about 15 characters per second
+SPEECH_TOKENS_PER_SECOND = 25
+CHARACTERS_PER_SECOND = 15
+TOKENS_PER_CHARACTER = SPEECH_TOKENS_PER_SECOND / CHARACTERS_PER_SECOND
+
+# Spoken forms are longer than their written ones: "1995" is "nineteen ninety-five"
+EXTRA_CHARACTERS = {**{digit: 3 for digit in "0123456789"}, "%": 7, "&": 3, "$": 6, "€": 4, "£": 5, "@": 2, "+": 4, "=": 6}
+
+# Words after which a full stop does not end the sentence
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "mt", "rev", "gen", "col", "lt", "sgt", "capt", "hon",
+    "vs", "etc", "e.g", "i.e", "cf", "al", "approx", "ca", "inc", "ltd", "co", "corp", "dept", "est", "fig",
+    "no", "nos", "vol", "p", "pp", "ch", "sec", "ed", "a.m", "p.m", "u.s", "u.k", "ph.d",
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+}
+
+# Candidate sentence ends: terminal punctuation, closing quotes or brackets, then whitespace
+SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*\s+")
+CLAUSE_END = re.compile(r"[,;:]\s+|\s+[—–-]+\s+")
+# Characters after which a word too long for one chunk (a URL, an identifier) may be cut
+WORD_BREAKS = "/.-_?&=#:"
+
+BLANK_LINES = re.compile(r"\n\s*\n")
+SPACES = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str):
+    """Rough number of speech tokens the model generates for text"""
+    return (len(text) + sum(EXTRA_CHARACTERS.get(char, 0) for char in text)) * TOKENS_PER_CHARACTER
+
+
+def paragraphs(text: str):
+    """Blank-line separated paragraphs of plain text, with wrapped lines joined"""
+    for block in BLANK_LINES.split(text):
+        paragraph = SPACES.sub(" ", block).strip()
+        if paragraph:
+            yield paragraph
+
+
+def is_sentence_end(text: str, start: int, end: int):
+    """Whether the punctuation matched at text[start:end] closes a sentence"""
+    following = text[end:end + 1]
+    if following.islower() or following.isdigit():
+        return False
+    if text[start] != ".":
+        return True
+    word = text[text.rfind(" ", 0, start) + 1:start].lower().lstrip("(\"'“‘")
+    # Abbreviations and initials such as "J. R. R. Tolkien"
+    return not (word in ABBREVIATIONS or (len(word) == 1 and word.isalpha()))
+
+
+def split_sentences(paragraph: str):
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(paragraph):
+        if is_sentence_end(paragraph, match.start(), match.end()):
+            sentences.append(paragraph[start:match.end()].strip())
+            start = match.end()
+    if start < len(paragraph):
+        sentences.append(paragraph[start:].strip())
+    return [sentence for sentence in sentences if sentence]
+
+
+def split_long(text: str, max_tokens: float):
+    """Break a sentence longer than max_tokens into (text, tokens, joined) units.
+
+    The sentence is cut at clause boundaries, clauses still too long between words,
+    and words too long on their own (URLs, identifiers) after punctuation inside them
+    where possible. joined marks a piece that continues the word before it, so no
+    space is put back between them.
+    """
+    pieces = []
+    start = 0
+    for match in CLAUSE_END.finditer(text):
+        pieces.append(text[start:match.end()].strip())
+        start = match.end()
+    pieces.append(text[start:].strip())
+
+    units = []
+    for piece in pieces:
+        tokens = estimate_tokens(piece)
+        if tokens <= max_tokens:
+            units.append((piece, tokens, False))
+            continue
+        for word in piece.split():
+            tokens = estimate_tokens(word)
+            if tokens <= max_tokens:
+                units.append((word, tokens, False))
+                continue
+            size = max(1, int(max_tokens / TOKENS_PER_CHARACTER / (1 + max(EXTRA_CHARACTERS.values()))))
+            start = 0
+            while start < len(word):
+                end = start + size
+                if end < len(word):
+                    # Prefer to cut just after punctuation such as "/" or "."
+                    cut = max(word.rfind(char, start, end) for char in WORD_BREAKS) + 1
+                    if cut > start + size // 2:
+                        end = cut
+                units.append((word[start:end], estimate_tokens(word[start:end]), start > 0))
+                start = end
+    return [unit for unit in units if unit[0]]
+
+
+def join_units(units: list):
+    """Text of a chunk: its units separated by spaces, except pieces of a cut word"""
+    return "".join(text if joined or index == 0 else f" {text}" for index, (text, _, joined) in enumerate(units))
+
+
+def units_size(units: list):
+    return sum(tokens for _, tokens, _ in units) + sum(not joined for _, _, joined in units[1:]) * TOKENS_PER_CHARACTER
+
+
+def rebalance(first: list, second: list):
+    """Move the boundary between two consecutive chunks' units so their sizes are as even as possible"""
+    units = first + second
+    total = units_size(units)
+    best, best_size = len(first), max(units_size(first), units_size(second))
+    left = 0.0
+    for index in range(1, len(units)):
+        left += units[index - 1][1] + (TOKENS_PER_CHARACTER if index > 1 and not units[index - 1][2] else 0)
+        size = max(left, total - left)
+        if size < best_size:
+            best, best_size = index, size
+    return units[:best], units[best:]
+
+
+def pack(units: list, target_tokens: float, max_tokens: float, first_target_tokens: float = None):
+    """Greedily pack (text, tokens, ends_paragraph, joined) units into chunks of about the same size.
+
+    The number of chunks is fixed by the target, and the budget is the total spread
+    evenly over them. Greedy packing can still leave a short last chunk, so the last
+    two are evened out at the end. Chunks prefer to end at paragraph ends and never
+    exceed max_tokens. joined units continue the unit before them without a space.
+    """
+    if not units:
+        return []
+    total = units_size([(text, tokens, joined) for text, tokens, _, joined in units])
+    budget = min(max_tokens, total / max(1, math.ceil(total / target_tokens)))
+    chunks = []
+    current = []
+    current_tokens = 0.0
+    for text, tokens, ends_paragraph, joined in units:
+        space = TOKENS_PER_CHARACTER if current and not joined else 0.0
+        limit = min(budget, first_target_tokens) if first_target_tokens and not chunks else budget
+        if current and current_tokens + space + tokens > limit and (current_tokens >= limit / 2 or current_tokens + space + tokens > max_tokens):
+            chunks.append(current)
+            current, current_tokens, space = [], 0.0, 0.0
+        current.append((text, tokens, joined))
+        current_tokens += space + tokens
+        if ends_paragraph and current_tokens >= limit * 0.75:
+            chunks.append(current)
+            current, current_tokens = [], 0.0
+    if current:
+        chunks.append(current)
+    # A deliberately short first chunk is left alone
+    if len(chunks) > (2 if first_target_tokens else 1) and units_size(chunks[-1]) < budget / 2:
+        chunks[-2], chunks[-1] = rebalance(chunks[-2], chunks[-1])
+    return [join_units(chunk) for chunk in chunks]
+
+
+def chunk_text(text: str, target_tokens: float = CHUNK_TARGET_TOKENS, max_tokens: float = CHUNK_MAX_TOKENS, first_target_tokens: float = None):
+    """Split text into chunks for synthesis, sized by the speech tokens the model will generate.
+
+    Expects text from tts.normalize.normalize_text. Chunks end at sentence boundaries
+    (abbreviations and initials do not count), blank lines separate paragraphs, and
+    sentences longer than max_tokens are split at clauses and then words.
+    first_target_tokens makes the first chunk smaller so streamed audio starts sooner.
+    Runs in time linear in the length of the text.
+    """
+    max_tokens = max(1, max_tokens)
+    target_tokens = max(1, min(target_tokens, max_tokens))
+    units = []
+    for paragraph in paragraphs(text or ""):
+        sentences = split_sentences(paragraph)
+        for index, sentence in enumerate(sentences):
+            tokens = estimate_tokens(sentence)
+            parts = split_long(sentence, max_tokens) if tokens > max_tokens else [(sentence, tokens, False)]
+            for part_index, (part, part_tokens, joined) in enumerate(parts):
+                ends_paragraph = index + 1 == len(sentences) and part_index + 1 == len(parts)
+                units.append((part, part_tokens, ends_paragraph, joined))
+    return pack(units, target_tokens, max_tokens, first_target_tokens)
+
+
+def split_complete(text: str, max_tokens: float = CHUNK_TARGET_TOKENS):
+    """Split text that is still arriving into (complete sentences, unfinished remainder).
+
+    A sentence counts as complete once the next one has started, so "Dr. " is not cut
+    off before "Smith" arrives, and a blank line completes everything before it. A
+    remainder over max_tokens is cut at its last clause boundary or space so run-on
+    text without punctuation is not held back indefinitely.
+    """
+    cut = 0
+    for match in SENTENCE_END.finditer(text):
+        if match.end() < len(text) and is_sentence_end(text, match.start(), match.end()):
+            cut = match.end()
+    for match in BLANK_LINES.finditer(text, cut):
+        cut = match.end()
+    if estimate_tokens(text[cut:]) > max_tokens:
+        clauses = [match.end() for match in CLAUSE_END.finditer(text, cut)]
+        cut = clauses[-1] if clauses else max(cut, text.rfind(" ", cut) + 1)
+    return text[:cut].strip(), text[cut:].lstrip()
+
+
+def needs_chunking(text: str, max_tokens: float = CHUNK_MAX_TOKENS):
+    """Whether text is too long for one generate call"""
+    return estimate_tokens(text) > max_tokens
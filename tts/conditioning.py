@@ -0,0 +1,194 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+import torch
+
+from config.constants import VOICE_CACHE_DIR, VOICE_CACHE_MEMORY_MB
+
+if TYPE_CHECKING:
+    # chatterbox pulls in the whole model stack, so it is only imported once a model is in use
+    from chatterbox.tts import Conditionals
+
+
+def voice_fingerprint(voice_path: str):
+    """Identify a reference clip by path, size and modification time so a replaced file gets a new entry"""
+    stat = os.stat(voice_path)
+    return f"{os.path.abspath(voice_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def conditionals_size(conds: "Conditionals"):
+    """Approximate memory held by a Conditionals object in bytes"""
+    tensors = [value for value in vars(conds.t3).values() if torch.is_tensor(value)]
+    tensors += [value for value in conds.gen.values() if torch.is_tensor(value)]
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def copy_conditionals(conds: "Conditionals"):
+    """Shallow copy so ChatterboxTTS.generate can swap the exaggeration cond without touching the cached entry"""
+    from chatterbox.tts import Conditionals
+
+    return Conditionals(conds.t3, conds.gen)
+
+
+class ConditioningCache:
+    """LRU cache of prepared voice conditionals, bounded by a memory budget and
+    optionally persisted to disk so warm restarts skip the reference clip processing.
+    """
+
+    def __init__(self, memory_budget_mb: float = VOICE_CACHE_MEMORY_MB, cache_dir: str = VOICE_CACHE_DIR):
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_size = 0
+        self._pinned = {}  # fingerprint -> number of holders
+        self._lock = threading.Lock()
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, model, voice_path: str, exaggeration: float = 0.5):
+        """Return the conditionals for voice_path on the model's device, computing them on a miss.
+
+        Must be called while holding the model lock: a miss runs model.prepare_conditionals,
+        which overwrites model.conds.
+        """
+        fingerprint = voice_fingerprint(voice_path)
+        key = (fingerprint, str(model.device))
+        with self._lock:
+            conds = self._entries.get(key)
+            if conds is not None:
+                self._entries.move_to_end(key)
+                return conds
+
+        conds = self._load_from_disk(fingerprint, model.device)
+        if conds is None:
+            model.prepare_conditionals(voice_path, exaggeration=exaggeration)
+            conds = model.conds
+            self._save_to_disk(fingerprint, conds)
+        self._store(key, conds)
+        return conds
+
+    def pin(self, voice_path: str):
+        """Keep a voice's conditionals from being evicted until unpin(); returns the key to unpin with"""
+        fingerprint = voice_fingerprint(voice_path)
+        with self._lock:
+            self._pinned[fingerprint] = self._pinned.get(fingerprint, 0) + 1
+        return fingerprint
+
+    def unpin(self, fingerprint: str):
+        with self._lock:
+            holders = self._pinned.pop(fingerprint, 0) - 1
+            if holders > 0:
+                self._pinned[fingerprint] = holders
+
+    def invalidate(self, voice_path: str):
+        """Drop every cached entry (memory and disk) for a reference clip path"""
+        prefix = f"{os.path.abspath(voice_path)}:"
+        with self._lock:
+            for key in [key for key in self._entries if key[0].startswith(prefix)]:
+                self._evict(key)
+        if self.cache_dir and os.path.exists(self.cache_dir):
+            path_hash = self._path_hash(voice_path)
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(path_hash):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError as e:
+                        print(f"Error removing cached conditioning {name}: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_size = 0
+
+    def _store(self, key, conds):
+        size = conditionals_size(conds)
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = conds
+            self._sizes[key] = size
+            self._total_size += size
+            # Always keep the newest entry, even if it alone exceeds the budget, and pinned ones
+            while self._total_size > self.memory_budget:
+                victim = next((entry for entry in self._entries if entry != key and entry[0] not in self._pinned), None)
+                if victim is None:
+                    break
+                self._evict(victim)
+
+    def _evict(self, key):
+        self._entries.pop(key, None)
+        self._total_size -= self._sizes.pop(key, 0)
+
+    @staticmethod
+    def _path_hash(voice_path: str):
+        return hashlib.sha1(os.path.abspath(voice_path).encode()).hexdigest()[:16]
+
+    def _disk_path(self, fingerprint: str):
+        voice_path = fingerprint.rsplit(":", 2)[0]
+        version = hashlib.sha1(fingerprint.encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{self._path_hash(voice_path)}_{version}.pt")
+
+    def _load_from_disk(self, fingerprint: str, device):
+        from chatterbox.tts import Conditionals
+
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(fingerprint)
+        if not os.path.exists(path):
+            return None
+        try:
+            return Conditionals.load(path, map_location=device).to(device)
+        except Exception as e:
+            print(f"Error loading cached conditioning {path}: {e}")
+            return None
+
+    def _save_to_disk(self, fingerprint: str, conds: "Conditionals"):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(fingerprint)
+        try:
+            # Write to a temp file first so a crash never leaves a truncated entry behind
+            conds.save(f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
+        except Exception as e:
+            print(f"Error saving cached conditioning {path}: {e}")
+
+
+conditioning_cache = None
+
+
+def get_conditioning_cache():
+    global conditioning_cache
+    if conditioning_cache is None:
+        conditioning_cache = ConditioningCache()
+    return conditioning_cache
+
+
+def get_conditionals(model, voice_path: str = None, exaggeration: float = 0.5):
+    """Conditionals to install on the model before generate(); the built-in voice when voice_path is None"""
+    if not voice_path:
+        return copy_conditionals(model.default_conds)
+    return copy_conditionals(get_conditioning_cache().get(model, voice_path, exaggeration))
+
+
+def pin_voice(voice_path: str):
+    """Hold a custom voice's conditionals in memory, e.g. for a streaming session; None for the built-in voice"""
+    if not voice_path:
+        return None
+    return get_conditioning_cache().pin(voice_path)
+
+
+def unpin_voice(fingerprint: str):
+    if fingerprint:
+        get_conditioning_cache().unpin(fingerprint)
+
+
+def invalidate_voice_conditioning(voice_path: str):
+    """Forget cached conditioning for a voice that was added, replaced or deleted"""
+    if voice_path:
+        get_conditioning_cache().invalidate(voice_path)
@@ -1,15 +1,21 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, CancelledError, wait
 import os
 import sys
-import uuid
-import re
+import time
 
+import numpy as np
+import torch
 import torchaudio as ta
 from dotenv import load_dotenv
-from audio.convert_audio import join_audio_files
-from tts.model import get_model
-from config.constants import AUDIO_TEMP_DIRECTORY_SIZE_LIMIT
+from audio.convert_audio import join_audio_arrays, save_audio
+from tts.batcher import get_batcher, get_sample_rate
+from tts.chunker import chunk_text
+from tts.normalize import normalize_text
+from tts.janitor import track_file
+from tts.metrics import JOIN_TIME, current_endpoint, record_cache, record_synthesis
+from tts.result_cache import get_chunk_cache
+from tts.scheduler import current_cancel
+from tts.tracing import span
 
 
 # Helper to determine if the process is managed by Uvicorn's reloader
@@ -29,81 +35,124 @@ if not IS_RELOADER:
 
 load_dotenv()
 
+# Seconds between checks whether the caller of synthesize_chunks has given up
+CANCEL_POLL_INTERVAL = 0.1
 
-def limit_audio_temp_directory_size():
-    """Limit the size of the audio temp directory to the AUDIO_TEMP_DIRECTORY_SIZE_LIMIT"""
-    if os.path.exists("audio_temp"):
-        files = [os.path.join("audio_temp", f) for f in os.listdir("audio_temp") if os.path.isfile(os.path.join("audio_temp", f))]
-        files.sort(key=lambda x: int(x.split("_")[-1]))  # sort by modification time
-        total_size = sum(os.path.getsize(f) for f in files)
-        while total_size > AUDIO_TEMP_DIRECTORY_SIZE_LIMIT and files:
-            file_to_remove = files.pop(0)
-            total_size -= os.path.getsize(file_to_remove)
-            os.remove(file_to_remove)
-
-
-def split_text_into_chunks(text: str, chunk_size: int = 1000):
-    """Split text into chunks of around chunk_size, respecting sentence boundaries."""
-    # Split text into sentences using regex
-    sentence_endings = re.compile(r'(?<=[.!?]) +')
-    sentences = sentence_endings.split(text)
-    chunks = []
-    current_chunk = ""
-    for sentence in sentences:
-        # If adding this sentence would exceed the chunk size, start a new chunk
-        if current_chunk and len(current_chunk) + len(sentence) + 1 > chunk_size:
-            chunks.append(current_chunk.strip())
-            current_chunk = sentence
-        else:
-            if current_chunk:
-                current_chunk += " " + sentence
-            else:
-                current_chunk = sentence
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    return chunks
-
-
-def generate_audio(text: str,  exaggeration: float = 0.5, cfg_weight: float = 0.5, output_path: str = None, voice_path: str = None, batching: bool = False):
-    """Generate audio from text using ChatterboxTTS"""
-    limit_audio_temp_directory_size()
-    model = get_model()
+
+def chunk_cache_key(text: str, exaggeration: float = 0.5, cfg_weight: float = 0.5, voice_path: str = None):
+    return get_chunk_cache().make_key(text, voice_path, exaggeration, cfg_weight, "float32")
+
+
+def load_cached_chunk(key: str, voice_path: str = None):
+    """Return a cached chunk as a (1, samples) tensor, or None on a miss"""
+    data = get_chunk_cache().get(key)
+    record_cache("chunk", data is not None, voice_path)
+    if data is None:
+        return None
+    return torch.from_numpy(np.frombuffer(data, dtype=np.float32).copy()).unsqueeze(0)
+
+
+def store_cached_chunk(key: str, audio):
+    get_chunk_cache().put(key, audio.squeeze(0).numpy().astype(np.float32).tobytes())
+
+
+def synthesize(text: str, exaggeration: float = 0.5, cfg_weight: float = 0.5, voice_path: str = None, use_cache: bool = False):
+    """Synthesize a single chunk of text and return it as a (1, samples) tensor"""
+    key = chunk_cache_key(text, exaggeration, cfg_weight, voice_path) if use_cache else None
+    if key:
+        cached = load_cached_chunk(key, voice_path)
+        if cached is not None:
+            return cached
+    # Concurrent requests with the same voice settings are batched together
+    audio = get_batcher().submit(text, exaggeration=exaggeration, cfg_weight=cfg_weight, voice_path=voice_path).result()
+    if key:
+        store_cached_chunk(key, audio)
+    return audio
+
+
+def synthesize_chunks(chunks: list[str], exaggeration: float = 0.5, cfg_weight: float = 0.5, voice_path: str = None, use_cache: bool = False):
+    """Synthesize several chunks at once and return their (1, samples) tensors in input order.
+
+    With use_cache, chunks already in the chunk cache are reused and only the changed
+    ones are generated. The rest are submitted up front so the batcher can group them
+    instead of running them one after another. If any chunk fails, or the scheduler job
+    is cancelled because it timed out or its client disconnected, the chunks not yet
+    started are cancelled and the error is raised.
+    """
+    results = [None] * len(chunks)
+    keys = [None] * len(chunks)
+    if use_cache:
+        for idx, chunk in enumerate(chunks):
+            keys[idx] = chunk_cache_key(chunk, exaggeration, cfg_weight, voice_path)
+            results[idx] = load_cached_chunk(keys[idx], voice_path)
+
+    # Each chunk goes to whichever replica is least loaded at submit time, so long
+    # documents are spread over all replicas
+    futures = {
+        get_batcher().submit(chunk, exaggeration=exaggeration, cfg_weight=cfg_weight, voice_path=voice_path): idx
+        for idx, chunk in enumerate(chunks)
+        if results[idx] is None
+    }
+    cancel = current_cancel.get()
+    waiting = set(futures)
+    try:
+        while waiting:
+            done, waiting = wait(waiting, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            if cancel is not None and cancel.is_set():
+                raise CancelledError()
+            for future in done:
+                idx = futures[future]
+                results[idx] = future.result()
+                if keys[idx]:
+                    store_cached_chunk(keys[idx], results[idx])
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return results
+
+
+def generate_audio(text: str,  exaggeration: float = 0.5, cfg_weight: float = 0.5, output_path: str = None, voice_path: str = None, batching: bool = False, use_cache: bool = False):
+    """Generate audio from text using ChatterboxTTS
+
+    use_cache reuses (and fills) the chunk cache, so re-rendering an edited document
+    only generates the chunks that changed.
+    """
+    sample_rate = get_sample_rate()
+    started = time.perf_counter()
+    with span("normalize"):
+        text = normalize_text(text)
 
     if batching:
-        # Split text into chunks of 1000 characters, we need to make sure we don't split in the middle of a word or sentence
-        chunks = split_text_into_chunks(text, 1000)
-        chunk_files = []
+        # Split at sentence (or clause) boundaries into chunks the model can generate in one go
+        with span("split_text"):
+            chunks = chunk_text(text)
         if not chunks:
             raise ValueError("No chunks generated")
-        for idx, chunk in enumerate(chunks):
-          
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_id = str(uuid.uuid4())
-            chunk_output_path = f"outputs/chunk_{idx}_{timestamp}_{unique_id}.wav"
-            generate_audio(
-                text=chunk,
-                exaggeration=exaggeration,
-                cfg_weight=cfg_weight,
-                output_path=chunk_output_path,
-                voice_path=voice_path,
-            )
-            chunk_files.append(chunk_output_path)
-        join_audio_files(chunk_files, output_path)
-        # clean up chunk files
-        for f in chunk_files:
-            try:
-                os.remove(f)
-            except Exception as e:
-                print(f"Error removing chunk file {f}: {e}")
-        return  output_path
+        with span("synthesize", chunks=len(chunks)):
+            audios = synthesize_chunks(chunks, exaggeration=exaggeration, cfg_weight=cfg_weight, voice_path=voice_path, use_cache=use_cache)
+        # Join the chunks in memory and write the result once
+        with span("join"), JOIN_TIME.time(endpoint=current_endpoint.get()):
+            joined = join_audio_arrays([audio.squeeze(0).numpy() for audio in audios], sample_rate)
+        record_synthesis(voice_path, time.perf_counter() - started, len(joined) / sample_rate, len(chunks))
+        if output_path:
+            with span("save"):
+                save_audio(output_path, joined, sample_rate)
+            # Retention of generated files is handled in the background by the janitor
+            track_file(output_path)
+        return (sample_rate, joined)
 
     # Generate the audio
-    audio = model.generate(text,  exaggeration=exaggeration, cfg_weight=cfg_weight, audio_prompt_path=voice_path)
+    with span("synthesize", chunks=1):
+        audio = synthesize(text, exaggeration=exaggeration, cfg_weight=cfg_weight, voice_path=voice_path, use_cache=use_cache)
+    record_synthesis(voice_path, time.perf_counter() - started, audio.shape[-1] / sample_rate)
 
     if output_path:
-        ta.save(output_path, audio, model.sr)
+        with span("save"):
+            ta.save(output_path, audio, sample_rate)
+        track_file(output_path)
 
-    return (model.sr, audio.squeeze(0).numpy())
+    return (sample_rate, audio.squeeze(0).numpy())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from config.constants import (
+    AUDIO_TEMP_DIRECTORY_SIZE_LIMIT,
+    CACHE_TTL_HOURS,
+    JANITOR_INTERVAL,
+    JANITOR_RESCAN_INTERVAL,
+    OUTPUTS_MAX_MB,
+    OUTPUTS_TTL_HOURS,
+)
+from tts.result_cache import get_chunk_cache, get_result_cache
+
+
+class RetentionArea:
+    """In-memory index of the files directly inside one directory, oldest first, with a running byte total"""
+
+    def __init__(self, directory: str, max_bytes: float = 0, max_age: float = 0):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.files = OrderedDict()  # path -> (size, modified time)
+        self.total_bytes = 0
+        self.removed = 0
+
+    def add(self, path: str, size: int, modified: float):
+        previous = self.files.pop(path, None)
+        self.total_bytes += size - (previous[0] if previous else 0)
+        self.files[path] = (size, modified)
+
+    def discard(self, path: str):
+        size, _ = self.files.pop(path, (0, 0))
+        self.total_bytes -= size
+
+    def scan(self):
+        """Rebuild the index from disk; only run from the janitor thread"""
+        entries = []
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        self.files.clear()
+        self.total_bytes = 0
+        for modified, path, size in sorted(entries):
+            self.add(path, size, modified)
+
+    def expired(self, now: float):
+        """Paths to delete, oldest first, until the area is within its age and size limits"""
+        paths = []
+        remaining = self.total_bytes
+        for path, (size, modified) in self.files.items():
+            too_old = self.max_age and now - modified > self.max_age
+            too_big = self.max_bytes and remaining > self.max_bytes
+            if not (too_old or too_big):
+                break
+            paths.append(path)
+            remaining -= size
+        return paths
+
+    def stats(self):
+        return {
+            "directory": self.directory,
+            "files": len(self.files),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes or None,
+            "max_age_s": self.max_age or None,
+            "removed": self.removed,
+        }
+
+
+class Janitor:
+    """Background retention for generated files.
+
+    Writers report new files with track(), so the request path never lists a
+    directory. A background thread deletes the oldest files of each area once it is
+    over its size budget or they pass their age limit, and expires old result and
+    chunk cache entries. Areas are rescanned occasionally to pick up files written
+    by other processes.
+    """
+
+    def __init__(self, areas: dict[str, RetentionArea] = None, cache_ttl: float = CACHE_TTL_HOURS * 3600, interval: float = JANITOR_INTERVAL, rescan_interval: float = JANITOR_RESCAN_INTERVAL):
+        self.areas = areas if areas is not None else default_areas()
+        self.cache_ttl = cache_ttl
+        self.interval = interval
+        self.rescan_interval = rescan_interval
+        self._by_directory = {area.directory: area for area in self.areas.values()}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_scan = 0.0
+
+    def track(self, path: str):
+        """Record a file that was just written; files outside the managed directories are ignored"""
+        area = self._by_directory.get(os.path.dirname(os.path.abspath(path)))
+        if area is None:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            area.add(os.path.abspath(path), stat.st_size, stat.st_mtime)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="tts-janitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def sweep(self, now: float = None):
+        """Enforce every limit once; returns the number of files removed"""
+        now = now or time.time()
+        if now - self._last_scan > self.rescan_interval:
+            self.rescan()
+        removed = 0
+        for area in self.areas.values():
+            with self._lock:
+                paths = area.expired(now)
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Could not remove {path}: {e}")
+                    continue
+                with self._lock:
+                    area.discard(path)
+                    area.removed += 1
+                removed += 1
+        if self.cache_ttl:
+            for cache in (get_result_cache(), get_chunk_cache()):
+                removed += cache.expire(now - self.cache_ttl)
+        return removed
+
+    def rescan(self):
+        self._last_scan = time.time()
+        for area in self.areas.values():
+            scanned = RetentionArea(area.directory)
+            scanned.scan()
+            with self._lock:
+                area.files, area.total_bytes = scanned.files, scanned.total_bytes
+
+    def stats(self):
+        with self._lock:
+            return {name: area.stats() for name, area in self.areas.items()}
+
+    def _run(self):
+        while True:
+            try:
+                removed = self.sweep()
+                if removed:
+                    print(f"Janitor removed {removed} expired files")
+            except Exception as e:
+                print(f"Janitor sweep failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+
+def default_areas():
+    return {
+        "outputs": RetentionArea("outputs", OUTPUTS_MAX_MB * 1024 * 1024, OUTPUTS_TTL_HOURS * 3600),
+        "audio_temp": RetentionArea("audio_temp", AUDIO_TEMP_DIRECTORY_SIZE_LIMIT * 1024 * 1024),
+    }
+
+
+janitor = None
+_janitor_lock = threading.Lock()
+
+
+def get_janitor():
+    global janitor
+    with _janitor_lock:
+        if janitor is None:
+            janitor = Janitor()
+    return janitor
+
+
+def track_file(path: str):
+    """Hand a newly written file to the retention janitor"""
+    get_janitor().track(path)
+
+
+def start_janitor():
+    """Start the background retention thread (called from the FastAPI lifespan)"""
+    return get_janitor().start()
+
+
+def stop_janitor():
+    if janitor is not None:
+        janitor.stop()
@@ -0,0 +1,311 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+
+from audio.convert_audio import join_audio_arrays
+from audio.encoders import encode_audio
+from config.constants import JOB_CHUNK_CONCURRENCY, JOB_RETRY_DELAY, JOB_TTL_HOURS, JOB_WORKERS, JOBS_DIR, MAX_CHUNK_RETRIES
+from tts.batcher import get_sample_rate
+from tts.chunker import chunk_text
+from tts.inference import synthesize
+from tts.metrics import current_endpoint
+from tts.normalize import normalize_text
+from tts.priority import current_client, current_priority
+from tts.scheduler import QueueFullError, get_scheduler
+
+FINISHED = ("done", "failed", "cancelled")
+# Longest wait between retries of a chunk that timed out
+MAX_RETRY_DELAY = 60
+
+
+class Job:
+    """A long-form synthesis job; its state lives in jobs/<id>/job.json and each finished
+    chunk is checkpointed to jobs/<id>/chunks/<index>.npy so a restart can resume it.
+    """
+
+    def __init__(self, id: str, chunks: list[str], voice: str = "default", voice_path: str = None, exaggeration: float = 0.5, cfg_weight: float = 0.5, response_format: str = "wav", speed: float = 1.0, status: str = "queued", created_at: float = None, finished_at: float = None, error: str = None, client: str = "anonymous", jobs_dir: str = JOBS_DIR):
+        self.id = id
+        self.chunks = chunks
+        self.voice = voice
+        self.voice_path = voice_path
+        self.exaggeration = exaggeration
+        self.cfg_weight = cfg_weight
+        self.response_format = response_format
+        self.speed = speed
+        self.status = status
+        self.created_at = created_at or time.time()
+        self.finished_at = finished_at
+        self.error = error
+        self.client = client
+        self.jobs_dir = jobs_dir
+        self.done_chunks = set()
+        # Progress of the current run, for the ETA
+        self.started_at = None
+        self.characters_this_run = 0
+
+    @property
+    def path(self):
+        return os.path.join(self.jobs_dir, self.id)
+
+    @property
+    def result_path(self):
+        return os.path.join(self.path, f"result.{self.response_format}")
+
+    def chunk_path(self, index: int):
+        return os.path.join(self.path, "chunks", f"{index}.npy")
+
+    def eta(self):
+        """Seconds until the job finishes, extrapolated from this run's characters per second"""
+        if self.status != "running" or not self.characters_this_run:
+            return None
+        remaining = sum(len(chunk) for index, chunk in enumerate(self.chunks) if index not in self.done_chunks)
+        rate = self.characters_this_run / (time.time() - self.started_at)
+        return round(remaining / rate, 1)
+
+    def to_dict(self):
+        """Job state as written to job.json"""
+        return {
+            "id": self.id,
+            "chunks": self.chunks,
+            "voice": self.voice,
+            "voice_path": self.voice_path,
+            "exaggeration": self.exaggeration,
+            "cfg_weight": self.cfg_weight,
+            "response_format": self.response_format,
+            "speed": self.speed,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "client": self.client,
+        }
+
+    def status_dict(self):
+        """Job state as reported by the status endpoint"""
+        return {
+            "id": self.id,
+            "status": self.status,
+            "voice": self.voice,
+            "response_format": self.response_format,
+            "chunks_done": len(self.done_chunks),
+            "chunks_total": len(self.chunks),
+            "progress": round(len(self.done_chunks) / len(self.chunks), 4),
+            "eta_seconds": self.eta(),
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+    def save(self):
+        os.makedirs(os.path.join(self.path, "chunks"), exist_ok=True)
+        tmp_path = os.path.join(self.path, "job.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, os.path.join(self.path, "job.json"))
+
+    @classmethod
+    def load(cls, path: str):
+        with open(os.path.join(path, "job.json")) as f:
+            job = cls(**json.load(f), jobs_dir=os.path.dirname(path))
+        job.done_chunks = {index for index in range(len(job.chunks)) if os.path.exists(job.chunk_path(index))}
+        return job
+
+
+class JobManager:
+    """Runs synthesis jobs in the background, one chunk at a time through the inference scheduler.
+
+    Each chunk is an ordinary scheduler job in the bulk priority class, queued under
+    the client that submitted the job, so interactive requests go ahead of a job's
+    remaining chunks instead of waiting for the whole document. At most `workers` jobs
+    run at once, each with up to `chunk_concurrency` chunks in flight so the batcher
+    can group them.
+    """
+
+    def __init__(self, jobs_dir: str = JOBS_DIR, workers: int = JOB_WORKERS, chunk_concurrency: int = JOB_CHUNK_CONCURRENCY, ttl_hours: float = JOB_TTL_HOURS, retry_delay: float = JOB_RETRY_DELAY, max_retries: int = MAX_CHUNK_RETRIES):
+        self.jobs_dir = jobs_dir
+        self.workers = max(1, workers)
+        self.chunk_concurrency = max(1, chunk_concurrency)
+        self.ttl = ttl_hours * 3600
+        self.retry_delay = retry_delay
+        self.max_retries = max(0, max_retries)
+        self.jobs = {}
+        self._queue = None
+        self._tasks = []
+
+    async def start(self):
+        """Load the jobs on disk, queue the unfinished ones again and start the job runners"""
+        self._queue = asyncio.Queue()
+        await asyncio.to_thread(self._load_jobs)
+        for job in sorted(self.jobs.values(), key=lambda job: job.created_at):
+            if job.status not in FINISHED:
+                job.status = "queued"
+                self._queue.put_nowait(job.id)
+        resumed = self._queue.qsize()
+        self._tasks = [asyncio.create_task(self._runner()) for _ in range(self.workers)]
+        print(f"Job manager started ({len(self.jobs)} jobs, {resumed} resumed)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def submit(self, text: str, voice: str = "default", voice_path: str = None, exaggeration: float = 0.5, cfg_weight: float = 0.5, response_format: str = "wav", speed: float = 1.0, client: str = "anonymous"):
+        chunks = chunk_text(await asyncio.to_thread(normalize_text, text))
+        if not chunks:
+            raise ValueError("No chunks generated")
+        job = Job(uuid.uuid4().hex, chunks, voice, voice_path, exaggeration, cfg_weight, response_format, speed, client=client, jobs_dir=self.jobs_dir)
+        await asyncio.to_thread(job.save)
+        self.jobs[job.id] = job
+        self._queue.put_nowait(job.id)
+        return job
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    async def cancel(self, job_id: str):
+        """Stop a job (its running chunks finish first) and delete its files"""
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            return None
+        if job.status not in FINISHED:
+            job.status = "cancelled"
+        await asyncio.to_thread(shutil.rmtree, job.path, True)
+        return job
+
+    async def _runner(self):
+        while True:
+            job = self.jobs.get(await self._queue.get())
+            if job is None or job.status != "queued":
+                continue
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                # Shutting down: the job stays unfinished on disk and resumes on the next start
+                raise
+            except Exception as e:
+                if job.status == "cancelled":
+                    continue
+                print(f"Job {job.id} failed: {e}")
+                job.status = "failed"
+                job.error = str(e)
+                job.finished_at = time.time()
+                await asyncio.to_thread(job.save)
+            await asyncio.to_thread(self._expire_jobs)
+
+    async def _run(self, job: Job):
+        job.status = "running"
+        job.started_at = time.time()
+        job.characters_this_run = 0
+        await asyncio.to_thread(job.save)
+        current_endpoint.set("/v1/audio/jobs")
+        current_priority.set("bulk")
+        current_client.set(job.client)
+
+        pending = [index for index in range(len(job.chunks)) if index not in job.done_chunks]
+        for start in range(0, len(pending), self.chunk_concurrency):
+            await asyncio.gather(*(self._synthesize_chunk(job, index) for index in pending[start:start + self.chunk_concurrency]))
+            if job.status == "cancelled":
+                return
+
+        sample_rate = get_sample_rate()
+        await asyncio.to_thread(self._assemble, job, sample_rate)
+        job.status = "done"
+        job.finished_at = time.time()
+        await asyncio.to_thread(job.save)
+        print(f"Job {job.id} finished ({len(job.chunks)} chunks in {job.finished_at - job.started_at:.1f}s)")
+
+    async def _synthesize_chunk(self, job: Job, index: int):
+        timeouts = 0
+        # Stop once the job is cancelled or another of its chunks has failed it
+        while job.status == "running":
+            try:
+                audio = await get_scheduler().run(
+                    synthesize,
+                    text=job.chunks[index],
+                    exaggeration=job.exaggeration,
+                    cfg_weight=job.cfg_weight,
+                    voice_path=job.voice_path,
+                    use_cache=True,
+                )
+                break
+            except QueueFullError:
+                # Interactive traffic has the queue full; back off instead of failing the job
+                await asyncio.sleep(self.retry_delay)
+            except asyncio.TimeoutError:
+                # The chunk waited behind interactive work for longer than INFERENCE_TIMEOUT;
+                # retry with a growing delay, but a chunk that never finishes fails the job
+                timeouts += 1
+                if timeouts > self.max_retries:
+                    raise RuntimeError(f"Chunk {index} timed out {timeouts} times")
+                await asyncio.sleep(min(self.retry_delay * 2 ** timeouts, MAX_RETRY_DELAY))
+        if job.status != "running":
+            return
+        await asyncio.to_thread(self._checkpoint, job, index, audio.squeeze(0).numpy())
+        job.done_chunks.add(index)
+        job.characters_this_run += len(job.chunks[index])
+
+    def _checkpoint(self, job: Job, index: int, samples: np.ndarray):
+        tmp_path = f"{job.chunk_path(index)}.tmp.npy"
+        np.save(tmp_path, samples.astype(np.float32))
+        os.replace(tmp_path, job.chunk_path(index))
+
+    def _assemble(self, job: Job, sample_rate: int):
+        segments = [np.load(job.chunk_path(index)) for index in range(len(job.chunks))]
+        data = encode_audio(join_audio_arrays(segments, sample_rate), sample_rate, job.response_format, job.speed)
+        with open(f"{job.result_path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{job.result_path}.tmp", job.result_path)
+        # The checkpoints are only needed until the result exists
+        shutil.rmtree(os.path.join(job.path, "chunks"), ignore_errors=True)
+
+    def _load_jobs(self):
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        for entry in os.scandir(self.jobs_dir):
+            if not entry.is_dir():
+                continue
+            try:
+                job = Job.load(entry.path)
+            except (OSError, ValueError, TypeError) as e:
+                print(f"Skipping unreadable job {entry.name}: {e}")
+                continue
+            self.jobs[job.id] = job
+        self._expire_jobs()
+
+    def _expire_jobs(self):
+        """Delete finished jobs older than the TTL"""
+        if not self.ttl:
+            return
+        cutoff = time.time() - self.ttl
+        for job in list(self.jobs.values()):
+            if job.status in FINISHED and (job.finished_at or job.created_at) < cutoff:
+                self.jobs.pop(job.id, None)
+                shutil.rmtree(job.path, ignore_errors=True)
+
+
+job_manager = None
+
+
+def get_job_manager():
+    global job_manager
+    if job_manager is None:
+        job_manager = JobManager()
+    return job_manager
+
+
+async def start_job_manager():
+    """Resume unfinished jobs and start the job runners (called from the FastAPI lifespan)"""
+    await get_job_manager().start()
+
+
+async def stop_job_manager():
+    global job_manager
+    if job_manager is not None:
+        await job_manager.stop()
+    job_manager = None
@@ -0,0 +1,136 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Endpoint of the request being served, set by the metrics middleware and carried into
+# scheduler jobs so metrics recorded deep in the pipeline can be labelled with it
+current_endpoint = contextvars.ContextVar("current_endpoint", default="internal")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RATIO_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7)
+
+
+def voice_label(voice_path: str = None):
+    """Metric label for a voice: the reference clip's file name (voices are saved as voices/<name>.wav)"""
+    return os.path.splitext(os.path.basename(voice_path))[0] if voice_path else "default"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: tuple, values: tuple, extra: dict = None):
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{self.name}_bucket{format_labels(self.labels, key, {'le': le})} {cumulative}")
+                lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        return "\n".join(line for metric in self.metrics for line in metric.collect()) + "\n"
+
+
+registry = Registry()
+
+QUEUE_WAIT = registry.register(Histogram("tts_queue_wait_seconds", "Time jobs wait in the inference queue", ("endpoint",)))
+GENERATE_TIME = registry.register(Histogram("tts_generate_seconds", "Model generate time per text chunk", ("voice",)))
+REAL_TIME_FACTOR = registry.register(
+    Histogram("tts_real_time_factor", "Seconds of wall time per second of audio produced (lower is faster)", ("endpoint", "voice"), RATIO_BUCKETS)
+)
+CHUNKS_PER_REQUEST = registry.register(
+    Histogram("tts_chunks_per_request", "Text chunks synthesized per request", ("endpoint", "voice"), COUNT_BUCKETS)
+)
+JOIN_TIME = registry.register(Histogram("tts_join_seconds", "Time spent joining chunk audio", ("endpoint",)))
+ENCODE_TIME = registry.register(Histogram("tts_encode_seconds", "Time spent encoding audio", ("endpoint", "format")))
+RESPONSE_BYTES = registry.register(
+    Histogram("tts_response_bytes", "Size of audio responses", ("endpoint", "format"), BYTES_BUCKETS)
+)
+REQUESTS = registry.register(Counter("tts_requests_total", "Synthesis requests", ("endpoint", "voice")))
+ERRORS = registry.register(Counter("tts_errors_total", "Synthesis requests that failed with a server error", ("endpoint", "voice")))
+REJECTIONS = registry.register(Counter("tts_rejections_total", "Requests rejected by the inference queue", ("endpoint", "reason")))
+CACHE_HITS = registry.register(Counter("tts_cache_hits_total", "Cache hits", ("cache", "endpoint", "voice")))
+CACHE_MISSES = registry.register(Counter("tts_cache_misses_total", "Cache misses", ("cache", "endpoint", "voice")))
+
+
+def record_synthesis(voice_path: str, wall_seconds: float, audio_seconds: float, chunks: int = 1):
+    """Record real-time factor (wall time over audio duration, as in benchmarks/) and chunk count of one finished synthesis"""
+    labels = {"endpoint": current_endpoint.get(), "voice": voice_label(voice_path)}
+    if audio_seconds > 0:
+        REAL_TIME_FACTOR.observe(wall_seconds / audio_seconds, **labels)
+    CHUNKS_PER_REQUEST.observe(chunks, **labels)
+
+
+def record_cache(cache: str, hit: bool, voice_path: str = None):
+    (CACHE_HITS if hit else CACHE_MISSES).inc(cache=cache, endpoint=current_endpoint.get(), voice=voice_label(voice_path))
@@ -1,46 +1,198 @@
+import os
+import threading
+import time
+
 import torch
-from chatterbox.tts import ChatterboxTTS
+
+from config.constants import MODEL_DEVICES, NUM_OF_WORKERS, REPLICA_CPU_CORES, TORCH_NUM_THREADS
+from tts.tracing import traced
 
 model = None
+pool = None
+_pool_lock = threading.Lock()
 
+# Consecutive failures after which a replica stops receiving new work while others are healthy
+MAX_CONSECUTIVE_FAILURES = 3
 
-def get_model():
-    global model
-    if model is None:
-        model = load_tts_model()
-    return model
 
+class ModelReplica:
+    """One loaded ChatterboxTTS instance pinned to a device (and optionally a CPU core set)"""
+
+    def __init__(self, index: int, device: str, cpu_cores: set = None, num_threads: int = 0):
+        self.index = index
+        self.device = device
+        self.cpu_cores = cpu_cores
+        self.num_threads = num_threads
+        self.model = None
+        # ChatterboxTTS keeps the current voice conditioning on the instance, so concurrent
+        # generate() calls on the same model must be serialized
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.processed = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+
+    @property
+    def healthy(self):
+        return self.model is not None and self.consecutive_failures < MAX_CONSECUTIVE_FAILURES
+
+    def load(self):
+        self.model = load_tts_model(self.device)
+        return self
+
+    def configure_thread(self):
+        """Apply this replica's CPU pinning and torch thread count to the calling (dispatch) thread"""
+        if self.cpu_cores and hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(0, self.cpu_cores)
+            except OSError as e:
+                print(f"Could not pin replica {self.index} to cores {sorted(self.cpu_cores)}: {e}")
+        if self.num_threads:
+            # OpenMP thread counts are per calling thread, so each dispatch thread keeps its own
+            torch.set_num_threads(self.num_threads)
+
+    def record(self, success: bool, count: int = 1):
+        if success:
+            self.processed += count
+            self.consecutive_failures = 0
+        else:
+            self.errors += count
+            self.consecutive_failures += 1
+
+    def stats(self):
+        return {
+            "index": self.index,
+            "device": self.device,
+            "cpu_cores": sorted(self.cpu_cores) if self.cpu_cores else None,
+            "num_threads": self.num_threads or torch.get_num_threads(),
+            "healthy": self.healthy,
+            "queue_depth": self.pending,
+            "processed": self.processed,
+            "errors": self.errors,
+            "load_timings": getattr(self.model, "load_timings", None),
+        }
+
+
+class ModelPool:
+    """K model replicas; work goes to the healthy replica with the fewest pending requests"""
+
+    def __init__(self, replicas: list[ModelReplica]):
+        self.replicas = replicas
+
+    def load(self):
+        for replica in self.replicas:
+            print(f"Loading replica {replica.index} on {replica.device}")
+            replica.load()
+        return self
 
-def load_tts_model():
+    def least_loaded(self):
+        candidates = [replica for replica in self.replicas if replica.healthy] or self.replicas
+        return min(candidates, key=lambda replica: replica.pending)
 
+    def stats(self):
+        return [replica.stats() for replica in self.replicas]
+
+
+def default_device():
     if torch.cuda.is_available():
         print("Using CUDA")
-        device = "cuda"
-    elif torch.backends.mps.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
         print("Using MPS")
-        device = "mps"
-    else:
-        print("Using CPU")
-        device = "cpu"
+        return "mps"
+    print("Using CPU")
+    return "cpu"
+
+
+def parse_core_sets(spec: str):
+    """Parse "0-3;4-7" into [{0, 1, 2, 3}, {4, 5, 6, 7}]"""
+    core_sets = []
+    for group in filter(None, (part.strip() for part in spec.split(";"))):
+        cores = set()
+        for item in group.split(","):
+            start, _, end = item.strip().partition("-")
+            cores.update(range(int(start), int(end or start) + 1))
+        core_sets.append(cores)
+    return core_sets
+
+
+def plan_replicas(num_replicas: int = NUM_OF_WORKERS, devices_spec: str = MODEL_DEVICES, cores_spec: str = REPLICA_CPU_CORES, num_threads: int = TORCH_NUM_THREADS):
+    """Decide the device, CPU core set and thread count of each replica"""
+    num_replicas = max(1, num_replicas)
+    devices = [device.strip() for device in devices_spec.split(",") if device.strip()]
+    if not devices:
+        device = default_device()
+        if device == "cuda" and torch.cuda.device_count() > 1:
+            devices = [f"cuda:{i}" for i in range(torch.cuda.device_count())]
+        else:
+            devices = [device]
+
+    core_sets = parse_core_sets(cores_spec)
+    cpu_replicas = sum(1 for i in range(num_replicas) if devices[i % len(devices)] == "cpu")
+    if not core_sets and cpu_replicas > 1 and hasattr(os, "sched_getaffinity"):
+        # Split the available cores evenly between CPU replicas so they don't fight over them
+        available = sorted(os.sched_getaffinity(0))
+        share = len(available) // cpu_replicas
+        if share:
+            core_sets = [set(available[i * share:(i + 1) * share]) for i in range(cpu_replicas)]
 
-    map_location = torch.device(device)
-    torch_load_original = torch.load
+    replicas = []
+    cpu_index = 0
+    for index in range(num_replicas):
+        device = devices[index % len(devices)]
+        cores = None
+        threads = num_threads
+        if device == "cpu" and core_sets:
+            cores = core_sets[cpu_index % len(core_sets)]
+            threads = threads or len(cores)
+            cpu_index += 1
+        replicas.append(ModelReplica(index, device, cpu_cores=cores, num_threads=threads))
+    return replicas
 
-    def patched_torch_load(*args, **kwargs):
-        if "map_location" not in kwargs:
-            kwargs["map_location"] = map_location
-        return torch_load_original(*args, **kwargs)
 
-    torch.load = patched_torch_load
-    global model
-    model = ChatterboxTTS.from_pretrained(device=device)
+def get_model_pool():
+    global pool, model
+    with _pool_lock:
+        if pool is None:
+            pool = ModelPool(plan_replicas()).load()
+            model = pool.replicas[0].model
+    return pool
 
+
+def get_model():
+    """The first replica's model (for the sample rate and other shared attributes)"""
+    get_model_pool()
     return model
 
 
+def load_tts_model(device: str = None):
+    """Load a single ChatterboxTTS instance on device (auto-detected when not given)"""
+    # Imported here so processes that never load a model (the API process of the
+    # process backend) don't pay for the chatterbox import
+    from tts.snapshot import load_from_snapshot
+
+    device = device or default_device()
+
+    started = time.perf_counter()
+    # Weights come from a local safetensors snapshot loaded straight onto the device,
+    # so no torch.load map_location patching and no hub lookups after the first boot
+    tts_model, timings = load_from_snapshot(device)
+    tts_model.load_timings = timings
+    print(f"Loaded model on {device} in {time.perf_counter() - started:.2f}s ({', '.join(f'{stage} {seconds:.2f}s' for stage, seconds in timings.items())})")
+    # Keep the built-in voice so requests without a voice are not affected by the last custom voice used
+    tts_model.default_conds = tts_model.conds
+    # Model stages show up as spans of traced requests (the wrappers do nothing otherwise)
+    tts_model.t3.inference = traced("token_generation", tts_model.t3.inference)
+    tts_model.s3gen.inference = traced("vocoding", tts_model.s3gen.inference)
+    tts_model.watermarker.apply_watermark = traced("watermark", tts_model.watermarker.apply_watermark)
+
+    return tts_model
+
+
 def unload_tts_model():
-    """Unload the TTS model"""
-    global model
+    """Unload the TTS model replicas"""
+    global model, pool
     model = None
+    pool = None
     if torch.cuda.is_available():
         torch.cuda.empty_cache()
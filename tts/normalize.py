@@ -0,0 +1,226 @@
+import re
+from functools import lru_cache
+
+from config.constants import TEXT_NORMALIZATION
+
+# Texts longer than this are normalized without being memoized, so whole documents don't fill the cache
+MEMOIZE_MAX_LENGTH = 10000
+
+ONES = [
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen",
+]
+TENS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+SCALES = [(10**12, "trillion"), (10**9, "billion"), (10**6, "million"), (1000, "thousand")]
+ORDINALS = {"one": "first", "two": "second", "three": "third", "five": "fifth", "eight": "eighth", "nine": "ninth", "twelve": "twelfth"}
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+# Symbol: (singular, plural, singular of the hundredth, plural of the hundredth)
+CURRENCIES = {"$": ("dollar", "dollars", "cent", "cents"), "€": ("euro", "euros", "cent", "cents"), "£": ("pound", "pounds", "penny", "pence")}
+SCALE_SUFFIXES = {"k": "thousand", "m": "million", "b": "billion", "bn": "billion", "thousand": "thousand", "million": "million", "billion": "billion", "trillion": "trillion"}
+SYMBOLS = {"&": " and ", "°": " degrees ", "±": " plus or minus ", "×": " times ", "→": " to ", "½": " one half ", "¼": " one quarter ", "¾": " three quarters "}
+
+# Markdown that should not be read out
+CODE_FENCE = re.compile(r"^[ \t]*(```|~~~).*$", re.MULTILINE)
+HEADING = re.compile(r"^[ \t]{0,3}#{1,6}[ \t]+(.*?)[ \t#]*$", re.MULTILINE)
+LIST_ITEM = re.compile(r"^[ \t]*(?:[-*+•]|\d{1,3}[.)])[ \t]+(.*?)[ \t]*$", re.MULTILINE)
+QUOTE = re.compile(r"^[ \t]*>[ \t]?", re.MULTILINE)
+RULE = re.compile(r"^[ \t]*([-*_])([ \t]*\1){2,}[ \t]*$", re.MULTILINE)
+LINK = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+# Bounded so unmatched markers cannot make the scan quadratic
+EMPHASIS = re.compile(r"(\*{1,3}|_{2,3}|`+|~~)(?=\S)(.{1,200}?)(?<=\S)\1")
+
+# The path may not end in punctuation, which belongs to the sentence
+URL = re.compile(r"\b(?:https?://|www\.)(?:www\.)?([A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+)(?:[^\s<>\"')\]]*[^\s<>\"')\].,!?;:])?")
+EMAIL = re.compile(r"\b([\w.+-]+)@([A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+)\b")
+EMOJI = re.compile("[\U0001F000-\U0001FAFF\U00002600-\U000027BF\U0001F1E6-\U0001F1FF\U0000FE0F\U0000200D\U000020E3]+")
+SYMBOL = re.compile("|".join(map(re.escape, SYMBOLS)))
+
+ISO_DATE = re.compile(r"\b(\d{4})-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])\b")
+TIME = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)(?![\d:])(\s*[ap]\.?m\b\.?)?", re.IGNORECASE)
+HOUR = re.compile(r"\b(1[0-2]|0?[1-9])\s?([ap])\.?m\b\.?", re.IGNORECASE)
+CURRENCY = re.compile(r"([$€£])\s?(\d[\d,]*)(?:\.(\d+))?(?:\s?(k|m|bn|b|thousand|million|billion|trillion)\b)?", re.IGNORECASE)
+PERCENT = re.compile(r"(\d)\s?%")
+ORDINAL = re.compile(r"\b(\d+)(st|nd|rd|th)\b", re.IGNORECASE)
+THOUSANDS = re.compile(r"\b(\d{1,3}(?:,\d{3})+)(?:\.(\d+))?\b")
+DECADE = re.compile(r"\b(1[1-9]|20)(\d0)s\b")
+VERSION = re.compile(r"\b\d+(?:\.\d+){2,}\b")
+NUMBER = re.compile(r"(?<![\d.])(-(?=\d))?(\d+)(?:\.(\d+))?(?!\d)")
+
+SPACES = re.compile(r"[ \t\r\f\v ]+")
+NEWLINES = re.compile(r" ?\n ?")
+SPACE_BEFORE_PUNCTUATION = re.compile(r" +([.,!?;:])(?!\S)")
+BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def number_words(number: int):
+    if number < 20:
+        return ONES[number]
+    if number < 100:
+        return TENS[number // 10] + (f"-{ONES[number % 10]}" if number % 10 else "")
+    if number < 1000:
+        return f"{ONES[number // 100]} hundred" + (f" {number_words(number % 100)}" if number % 100 else "")
+    for scale, name in SCALES:
+        if number >= scale:
+            head, rest = divmod(number, scale)
+            if head >= 1000:
+                break
+            return f"{number_words(head)} {name}" + (f" {number_words(rest)}" if rest else "")
+    # Too large to say as a number; read the digits
+    return digit_words(str(number))
+
+
+def digit_words(digits: str):
+    return " ".join(ONES[int(digit)] for digit in digits)
+
+
+def ordinal_words(number: int):
+    words = number_words(number)
+    cut = max(words.rfind(" "), words.rfind("-")) + 1
+    head, last = words[:cut], words[cut:]
+    if last in ORDINALS:
+        last = ORDINALS[last]
+    elif last.endswith("y"):
+        last = last[:-1] + "ieth"
+    else:
+        last += "th"
+    return head + last
+
+
+def year_words(year: int):
+    """Years are read in pairs: 1995 is "nineteen ninety-five", 2007 is "two thousand seven\""""
+    if 2000 <= year < 2010 or year % 1000 == 0:
+        return number_words(year)
+    head, rest = divmod(year, 100)
+    if rest == 0:
+        return f"{number_words(head)} hundred"
+    return f"{number_words(head)} {'oh ' if rest < 10 else ''}{number_words(rest)}"
+
+
+def decimal_words(whole: str, fraction: str = None):
+    words = number_words(int(whole))
+    return f"{words} point {digit_words(fraction)}" if fraction else words
+
+
+def say_date(match):
+    year, month, day = (int(part) for part in match.groups())
+    return f"{MONTHS[month - 1]} {ordinal_words(day)}, {year_words(year)}"
+
+
+def say_time(match):
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2)), match.group(3)
+    if minute == 0:
+        spoken = number_words(hour) + ("" if meridiem else " o'clock")
+    else:
+        spoken = f"{number_words(hour)} {'oh ' if minute < 10 else ''}{number_words(minute)}"
+    if meridiem:
+        spoken += " a.m." if meridiem.strip().lower().startswith("a") else " p.m."
+    return spoken
+
+
+def say_currency(match):
+    symbol, whole, fraction, scale = match.groups()
+    singular, plural, small_singular, small_plural = CURRENCIES[symbol]
+    amount = int(whole.replace(",", ""))
+    if scale:
+        return f"{decimal_words(str(amount), fraction)} {SCALE_SUFFIXES[scale.lower()]} {plural}"
+    spoken = f"{number_words(amount)} {singular if amount == 1 else plural}"
+    if fraction and len(fraction) == 2 and int(fraction):
+        cents = int(fraction)
+        spoken += f" and {number_words(cents)} {small_singular if cents == 1 else small_plural}"
+    elif fraction and len(fraction) != 2:
+        spoken = f"{decimal_words(str(amount), fraction)} {plural}"
+    return spoken
+
+
+def say_number(match):
+    sign, whole, fraction = match.groups()
+    # "-" only means minus at the start of a word, not in "COVID-19" or "3-4"
+    if sign and match.start() > 0 and not match.string[match.start() - 1].isspace():
+        return "-" + say_number(NUMBER.match(match.group(0), 1))
+    number = int(whole)
+    if fraction is None and len(whole) == 4 and 1100 <= number < 2100 and not sign:
+        spoken = year_words(number)
+    elif len(whole) > 1 and whole.startswith("0"):
+        # Codes and zero-padded numbers are read digit by digit
+        spoken = digit_words(whole) + (f" point {digit_words(fraction)}" if fraction else "")
+    else:
+        spoken = decimal_words(whole, fraction)
+    spoken = ("minus " if sign else "") + spoken
+    # Keep the words apart from letters around them: "mp3", "4x4", "12kg"
+    if match.start() > 0 and match.string[match.start() - 1].isalpha():
+        spoken = " " + spoken
+    if match.end() < len(match.string) and match.string[match.end()].isalpha():
+        spoken += " "
+    return spoken
+
+
+def say_decade(match):
+    spoken = year_words(int(match.group(1) + match.group(2)))
+    return spoken[:-1] + "ies" if spoken.endswith("y") else spoken + "s"
+
+
+def say_version(match):
+    return " point ".join(number_words(int(part)) if len(part) < 16 else digit_words(part) for part in match.group(0).split("."))
+
+
+def strip_markdown(text: str):
+    """Drop markdown syntax, keeping the readable text; headings become paragraphs of their own"""
+    text = CODE_FENCE.sub("", text)
+    text = RULE.sub("", text)
+    text = LINK.sub(r"\1", text)
+    text = EMPHASIS.sub(r"\2", text)
+    # A heading or list item without punctuation would run into the next sentence when spoken
+    text = HEADING.sub(lambda match: "\n\n" + terminate(match.group(1)) + "\n\n", text)
+    text = LIST_ITEM.sub(lambda match: terminate(match.group(1)), text)
+    return QUOTE.sub("", text)
+
+
+def terminate(line: str):
+    return line if not line or line[-1] in ".!?…:;," else line + "."
+
+
+def speak_domain(domain: str):
+    return domain.lower().replace(".", " dot ")
+
+
+def expand(text: str):
+    text = strip_markdown(text)
+    text = URL.sub(lambda match: speak_domain(match.group(1)), text)
+    text = EMAIL.sub(lambda match: f"{speak_domain(match.group(1))} at {speak_domain(match.group(2))}", text)
+    text = EMOJI.sub("", text)
+    text = ISO_DATE.sub(say_date, text)
+    text = TIME.sub(say_time, text)
+    text = HOUR.sub(lambda match: f"{number_words(int(match.group(1)))} {match.group(2).lower()}.m.", text)
+    text = CURRENCY.sub(say_currency, text)
+    text = PERCENT.sub(r"\1 percent", text)
+    text = ORDINAL.sub(lambda match: ordinal_words(int(match.group(1))), text)
+    text = THOUSANDS.sub(lambda match: decimal_words(match.group(1).replace(",", ""), match.group(2)), text)
+    text = DECADE.sub(say_decade, text)
+    text = VERSION.sub(say_version, text)
+    text = NUMBER.sub(say_number, text)
+    text = SYMBOL.sub(lambda match: SYMBOLS[match.group(0)], text)
+    text = NEWLINES.sub("\n", SPACES.sub(" ", text))
+    text = SPACE_BEFORE_PUNCTUATION.sub(r"\1", text)
+    return BLANK_LINES.sub("\n\n", text).strip()
+
+
+@lru_cache(maxsize=4096)
+def _expand_memoized(text: str):
+    return expand(text)
+
+
+def normalize_text(text: str):
+    """Rewrite text the way it should be spoken, before it is chunked and sent to the model.
+
+    Markdown syntax and emoji are dropped, URLs and email addresses are reduced to
+    their spoken domain, and dates, times, currency, percentages, ordinals and
+    numbers are written out in words. Paragraph breaks are kept for the chunker.
+    The result is memoized, so repeated inputs and cache key lookups for the same
+    text do the work once. Disabled with TEXT_NORMALIZATION=false, in which case
+    only whitespace is tidied.
+    """
+    if not TEXT_NORMALIZATION:
+        return NEWLINES.sub("\n", SPACES.sub(" ", text)).strip()
+    if len(text) > MEMOIZE_MAX_LENGTH:
+        return expand(text)
+    return _expand_memoized(text)
@@ -0,0 +1,79 @@
+import contextvars
+from collections import OrderedDict, deque
+
+from config.constants import PRIORITY_STARVATION_LIMIT
+
+# Lower value runs first
+PRIORITY_CLASSES = {"interactive": 0, "bulk": 1}
+DEFAULT_PRIORITY = "interactive"
+
+# Priority class and client of the request being served, set by the request handlers (and the
+# job runners) and read wherever work is queued, like metrics.current_endpoint
+current_priority = contextvars.ContextVar("current_priority", default=DEFAULT_PRIORITY)
+current_client = contextvars.ContextVar("current_client", default="anonymous")
+
+
+def priority_rank(priority: str = None):
+    return PRIORITY_CLASSES.get(priority or current_priority.get(), PRIORITY_CLASSES[DEFAULT_PRIORITY])
+
+
+class FairQueue:
+    """Pending work ordered by priority class, round-robin between clients within a class.
+
+    A client with many queued chunks only gets every n-th turn when n clients are
+    waiting, so one large document cannot crowd out everyone else. Lower classes run
+    only when higher ones are empty, except that after starvation_limit higher-class
+    items in a row while lower-class work waits, one lower-class item goes first.
+    Not thread-safe; callers hold their own lock.
+    """
+
+    def __init__(self, starvation_limit: int = PRIORITY_STARVATION_LIMIT):
+        self.starvation_limit = starvation_limit
+        self._classes = {}  # rank -> OrderedDict of client -> deque of items
+        self._size = 0
+        self._passed_over = 0
+
+    def __len__(self):
+        return self._size
+
+    def push(self, item, rank: int = None, client: str = None, front: bool = False):
+        """Queue an item; front puts it back at the head of its client's queue (used for preempted work)"""
+        rank = priority_rank() if rank is None else rank
+        clients = self._classes.setdefault(rank, OrderedDict())
+        items = clients.setdefault(client or current_client.get(), deque())
+        items.appendleft(item) if front else items.append(item)
+        self._size += 1
+
+    def top_rank(self):
+        """Rank of the most urgent waiting item, or None when empty"""
+        return min(self._classes) if self._classes else None
+
+    def pop(self):
+        ranks = sorted(self._classes)
+        rank = ranks[0]
+        if len(ranks) > 1 and self.starvation_limit and self._passed_over >= self.starvation_limit:
+            rank = ranks[1]
+            self._passed_over = 0
+        elif len(ranks) > 1:
+            self._passed_over += 1
+        else:
+            self._passed_over = 0
+
+        clients = self._classes[rank]
+        client, items = next(iter(clients.items()))
+        item = items.popleft()
+        # The client goes to the back of the round-robin
+        del clients[client]
+        if items:
+            clients[client] = items
+        if not clients:
+            del self._classes[rank]
+        self._size -= 1
+        return item
+
+    def drain(self):
+        """Remove and return every item"""
+        items = [item for clients in self._classes.values() for queue in clients.values() for item in queue]
+        self._classes.clear()
+        self._size = 0
+        return items
@@ -0,0 +1,315 @@
+import itertools
+import multiprocessing as mp
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import connection, shared_memory
+
+import numpy as np
+import torch
+
+from config.constants import NUM_OF_WORKERS, WORKER_RESTART_DELAY, WORKER_START_TIMEOUT
+from tts.metrics import GENERATE_TIME, voice_label
+from tts.model import ModelReplica, plan_replicas
+from tts.priority import FairQueue, current_client, priority_rank
+from tts.tracing import Span, current_span, tracer
+
+# Tasks handed to a worker at once: one running and one waiting, so it never idles on the
+# round trip, while everything else stays in the parent where it can be reordered by priority
+WORKER_PREFETCH = 2
+
+
+class WorkerCrashedError(Exception):
+    """Raised for requests that were running on a worker process when it died"""
+
+
+def worker_main(index: int, device: str, cpu_cores, num_threads: int, tasks, results):
+    """Entry point of a worker process: load the model once, then serve tasks until told to stop.
+
+    Results go back through this worker's own pipe. Audio is written to a shared memory
+    block that the parent copies out and unlinks, so large arrays are never pickled
+    through the pipe.
+    """
+    from tts.batcher import generate_batch
+
+    replica = ModelReplica(index, device, cpu_cores=cpu_cores, num_threads=num_threads)
+    # In a dedicated process the pinning and thread count apply to the whole interpreter
+    replica.configure_thread()
+    replica.load()
+    # Spans recorded here are sent back with the result and exported by the parent
+    tracer.export = False
+    results.send(("ready", index, replica.model.sr))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, text, exaggeration, cfg_weight, voice_path, trace = task
+        parent = Span.remote_parent(*trace) if trace else None
+        if parent:
+            tracer.collect(parent.trace_id)
+        try:
+            started = time.perf_counter()
+            audio = generate_batch(replica, [text], exaggeration=exaggeration, cfg_weight=cfg_weight, voice_path=voice_path, parents=[parent])[0]
+            elapsed = time.perf_counter() - started
+            spans = [span.to_dict() for span in tracer.release(parent.trace_id)] if parent else []
+            samples = audio.detach().cpu().numpy().astype(np.float32).reshape(-1)
+            block = shared_memory.SharedMemory(create=True, size=max(1, samples.nbytes))
+            np.ndarray(samples.shape, dtype=np.float32, buffer=block.buf)[:] = samples
+            results.send(("done", task_id, block.name, len(samples), elapsed, voice_label(voice_path), spans))
+            block.close()
+        except Exception as e:
+            if parent:
+                tracer.release(parent.trace_id)
+            results.send(("error", task_id, f"{type(e).__name__}: {e}"))
+
+
+class WorkerProcess:
+    """Parent-side handle of one worker process and the requests it is running"""
+
+    def __init__(self, replica: ModelReplica, context):
+        self.replica = replica
+        self.context = context
+        self.process = None
+        self.tasks = None
+        self.results = None
+        self.in_flight = {}
+        self.ready = False
+        self.sample_rate = None
+        self.restarts = 0
+        self.started_at = 0.0
+
+    @property
+    def index(self):
+        return self.replica.index
+
+    def spawn(self):
+        """Start the worker process with a fresh task queue and result pipe.
+
+        Nothing is shared with other workers, so a worker killed in the middle of a
+        write cannot leave a lock held that the others need.
+        """
+        self.close_results()
+        self.tasks = self.context.Queue()
+        self.results, sender = self.context.Pipe(duplex=False)
+        self.ready = False
+        self.started_at = time.monotonic()
+        self.process = self.context.Process(
+            target=worker_main,
+            args=(self.index, self.replica.device, self.replica.cpu_cores, self.replica.num_threads, self.tasks, sender),
+            name=f"tts-worker-{self.index}",
+            daemon=True,
+        )
+        self.process.start()
+        # The worker now holds the only write end, so the pipe reports EOF when it dies
+        sender.close()
+
+    def close_results(self):
+        if self.results is not None:
+            self.results.close()
+            self.results = None
+
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def stats(self):
+        return {
+            **self.replica.stats(),
+            "healthy": self.ready and self.alive(),
+            "queue_depth": len(self.in_flight),
+            "pid": self.process.pid if self.process else None,
+            "restarts": self.restarts,
+        }
+
+
+class ProcessPool:
+    """Runs synthesis in separate worker processes, each holding its own model.
+
+    On CPU hosts this sidesteps the GIL and keeps each model's intra-op thread pool
+    to itself. submit() has the same contract as MicroBatcher.submit(), so the rest
+    of the inference code does not care which backend is active. A monitor thread
+    collects results and restarts workers that die, failing the requests they were
+    running with WorkerCrashedError. Requests wait in the parent, by priority class
+    and round-robin between clients, until a worker has room for them.
+    """
+
+    def __init__(self, replicas: list[ModelReplica] = None, start_timeout: float = WORKER_START_TIMEOUT, restart_delay: float = WORKER_RESTART_DELAY):
+        # spawn, because CUDA and torch's thread pools do not survive fork
+        self.context = mp.get_context("spawn")
+        self.workers = [WorkerProcess(replica, self.context) for replica in (replicas or plan_replicas(NUM_OF_WORKERS))]
+        self.start_timeout = start_timeout
+        self.restart_delay = restart_delay
+        self.sample_rate = None
+        self._ids = itertools.count()
+        self._pending = FairQueue()
+        self._lock = threading.Lock()
+        self._monitor = None
+        self._stopping = False
+
+    def start(self):
+        """Spawn every worker and wait until they have loaded the model"""
+        for worker in self.workers:
+            worker.spawn()
+        deadline = time.monotonic() + self.start_timeout
+        while not all(worker.ready for worker in self.workers):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Worker processes did not load the model in time")
+            self._receive(min(1.0, remaining))
+            for worker in self.workers:
+                if not worker.alive():
+                    raise RuntimeError(f"Worker process {worker.index} exited while loading the model")
+        self._monitor = threading.Thread(target=self._run, name="tts-process-pool", daemon=True)
+        self._monitor.start()
+        return self
+
+    def stop(self):
+        self._stopping = True
+        for worker in self.workers:
+            if worker.alive():
+                worker.tasks.put(None)
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.kill()
+            worker.close_results()
+            self._fail(worker, WorkerCrashedError("Worker pool stopped"))
+        with self._lock:
+            waiting = self._pending.drain()
+        for _, future in waiting:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(WorkerCrashedError("Worker pool stopped"))
+
+    def submit(self, text: str, exaggeration: float = 0.5, cfg_weight: float = 0.5, voice_path: str = None) -> Future:
+        """Queue a text for the least busy worker; the returned future resolves to a (1, samples) tensor"""
+        future = Future()
+        parent = current_span.get()
+        trace = (parent.trace_id, parent.span_id) if parent else None
+        with self._lock:
+            task = (next(self._ids), text, exaggeration, cfg_weight, voice_path, trace)
+            self._pending.push((task, future), priority_rank(), current_client.get())
+        self._dispatch()
+        return future
+
+    def _dispatch(self):
+        """Hand waiting tasks, most urgent first, to workers with room for them"""
+        with self._lock:
+            while len(self._pending):
+                candidates = [worker for worker in self.workers if worker.ready and worker.alive() and len(worker.in_flight) < WORKER_PREFETCH]
+                if not candidates:
+                    break
+                task, future = self._pending.pop()
+                # Skip requests whose caller gave up while they were waiting
+                if future.cancelled():
+                    continue
+                worker = min(candidates, key=lambda worker: len(worker.in_flight))
+                worker.in_flight[task[0]] = future
+                worker.tasks.put(task)
+
+    def stats(self):
+        with self._lock:
+            return [worker.stats() for worker in self.workers]
+
+    def _run(self):
+        while not self._stopping:
+            self._receive(0.5)
+            self._check_workers()
+            self._dispatch()
+
+    def _receive(self, timeout: float):
+        """Handle the messages waiting on any worker's pipe, waiting up to timeout for one"""
+        pipes = {worker.results: worker for worker in self.workers if worker.results is not None}
+        if not pipes:
+            time.sleep(timeout)
+            return
+        for pipe in connection.wait(list(pipes), timeout):
+            try:
+                message = pipe.recv()
+            except (EOFError, OSError):
+                # The worker is gone; _check_workers fails its requests and restarts it
+                pipes[pipe].close_results()
+                continue
+            try:
+                self._handle(message)
+            except Exception as e:
+                print(f"Error handling worker result: {e}")
+
+    def _handle(self, message):
+        kind = message[0]
+        if kind == "ready":
+            _, index, sample_rate = message
+            worker = self.workers[index]
+            worker.ready = True
+            worker.sample_rate = sample_rate
+            self.sample_rate = self.sample_rate or sample_rate
+            return
+
+        future = self._pop(message[1], success=kind == "done")
+        if kind == "done":
+            _, _, name, length, elapsed, voice, spans = message
+            # Metrics recorded inside the worker never reach /metrics, so the parent records generate time
+            GENERATE_TIME.observe(elapsed, voice=voice)
+            for data in spans:
+                tracer.finish(Span.from_dict(data))
+            block = shared_memory.SharedMemory(name=name)
+            try:
+                samples = np.ndarray((length,), dtype=np.float32, buffer=block.buf).copy()
+            finally:
+                block.close()
+                block.unlink()
+            # A cancelled request still ran in the worker, but nobody wants its result
+            if future is not None and future.set_running_or_notify_cancel():
+                future.set_result(torch.from_numpy(samples).unsqueeze(0))
+        elif future is not None and future.set_running_or_notify_cancel():
+            future.set_exception(RuntimeError(message[2]))
+
+    def _pop(self, task_id, success: bool):
+        with self._lock:
+            for worker in self.workers:
+                if task_id in worker.in_flight:
+                    worker.replica.record(success)
+                    return worker.in_flight.pop(task_id)
+        return None
+
+    def _check_workers(self):
+        for worker in self.workers:
+            if worker.alive() or self._stopping:
+                continue
+            self._fail(worker, WorkerCrashedError(f"Worker process {worker.index} exited with code {worker.process.exitcode}"))
+            # Don't spin if the worker keeps dying while loading the model
+            if time.monotonic() - worker.started_at < self.restart_delay:
+                continue
+            print(f"Restarting worker process {worker.index}")
+            worker.restarts += 1
+            worker.spawn()
+
+    def _fail(self, worker: WorkerProcess, error: Exception):
+        with self._lock:
+            futures = list(worker.in_flight.values())
+            worker.in_flight.clear()
+            if futures:
+                worker.replica.record(False, len(futures))
+        for future in futures:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+
+
+process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    global process_pool
+    with _process_pool_lock:
+        if process_pool is None:
+            process_pool = ProcessPool().start()
+    return process_pool
+
+
+def stop_process_pool():
+    global process_pool
+    with _process_pool_lock:
+        if process_pool is not None:
+            process_pool.stop()
+            process_pool = None
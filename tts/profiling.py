@@ -0,0 +1,79 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from config.constants import PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_SLOW_REQUEST_MS
+
+
+def folded_stack(frame, thread_name: str):
+    """One sample in the collapsed-stack format read by flamegraph.pl and speedscope"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join([thread_name] + names[::-1])
+
+
+class SamplingProfiler:
+    """Samples the stacks of every thread while profiled requests are in flight.
+
+    A request spans the event loop, scheduler and batcher threads, so all threads are
+    sampled; concurrent requests therefore share samples. Only requests slower than
+    the threshold are written out, as collapsed stacks ready for a flamegraph.
+    """
+
+    def __init__(self, threshold_ms: float = PROFILE_SLOW_REQUEST_MS, interval_ms: float = PROFILE_INTERVAL_MS, output_dir: str = PROFILE_DIR):
+        self.threshold_ms = threshold_ms
+        self.interval = interval_ms / 1000
+        self.output_dir = output_dir
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.threshold_ms > 0
+
+    def start(self, key: str):
+        with self._lock:
+            self._sessions[key] = Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="tts-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self, key: str, duration_ms: float):
+        """End a session; returns the flamegraph file written for a slow request, or None"""
+        with self._lock:
+            samples = self._sessions.pop(key, None)
+        if not samples or duration_ms < self.threshold_ms:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{datetime.now():%Y%m%d_%H%M%S}_{key}_{duration_ms:.0f}ms.folded")
+        with open(path, "w") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in samples.most_common())
+        print(f"Slow request ({duration_ms:.0f}ms), profile written to {path}")
+        return path
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                sessions = list(self._sessions.values())
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = folded_stack(frame, names.get(ident, str(ident)))
+                for samples in sessions:
+                    samples[stack] += 1
+            time.sleep(self.interval)
+
+
+profiler = SamplingProfiler()
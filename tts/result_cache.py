@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from importlib import metadata
+
+from config.constants import (
+    CHUNK_CACHE_DIR,
+    CHUNK_CACHE_DISK_MB,
+    CHUNK_CACHE_MEMORY_MB,
+    MODEL_DTYPE,
+    MODEL_SNAPSHOT_DIR,
+    RESULT_CACHE_DIR,
+    RESULT_CACHE_DISK_MB,
+    RESULT_CACHE_MEMORY_MB,
+)
+from tts.conditioning import voice_fingerprint
+from tts.normalize import normalize_text
+
+
+@lru_cache(maxsize=1)
+def get_model_version():
+    """The model that produced a cached result: package version, MODEL_DTYPE and the hub
+    revision the local snapshot was built from (see tts.snapshot).
+
+    Read on the first lookup, after startup has loaded the model and built any snapshot.
+    """
+    try:
+        parts = [f"chatterbox-tts=={metadata.version('chatterbox-tts')}"]
+    except metadata.PackageNotFoundError:
+        parts = ["chatterbox-tts"]
+    parts.append(MODEL_DTYPE)
+    try:
+        with open(os.path.join(MODEL_SNAPSHOT_DIR, MODEL_DTYPE, "manifest.json")) as f:
+            parts.append(json.load(f).get("revision") or "unknown")
+    except (OSError, ValueError):
+        pass
+    return " ".join(parts)
+
+_voice_hashes = {}
+_voice_hashes_lock = threading.Lock()
+
+
+def voice_audio_hash(voice_path: str = None):
+    """Content hash of a reference clip, memoized until the file changes"""
+    if not voice_path:
+        return "default"
+    fingerprint = voice_fingerprint(voice_path)
+    with _voice_hashes_lock:
+        cached = _voice_hashes.get(fingerprint)
+    if cached:
+        return cached
+    digest = hashlib.sha256()
+    with open(voice_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    with _voice_hashes_lock:
+        _voice_hashes[fingerprint] = digest.hexdigest()
+    return _voice_hashes[fingerprint]
+
+
+class ResultCache:
+    """Content-addressed cache of encoded synthesis results.
+
+    Entries live in a RAM tier and a disk tier, each bounded by size and evicted
+    least-recently-used first. Disk entries are indexed once at startup so lookups
+    never scan the directory.
+    """
+
+    def __init__(self, memory_mb: float = RESULT_CACHE_MEMORY_MB, disk_mb: float = RESULT_CACHE_DISK_MB, cache_dir: str = RESULT_CACHE_DIR):
+        self.memory_budget = memory_mb * 1024 * 1024
+        self.disk_budget = disk_mb * 1024 * 1024
+        self.cache_dir = cache_dir if self.disk_budget > 0 else ""
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk = OrderedDict()
+        self._disk_size = 0
+        self._written = {}
+        self._lock = threading.Lock()
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._index_disk()
+
+    def make_key(self, text: str, voice_path: str = None, exaggeration: float = 0.5, cfg_weight: float = 0.5, response_format: str = "wav", speed: float = 1.0):
+        parts = [
+            # Inputs that are spoken the same (whitespace, markdown, "$5" and "five dollars") share an entry
+            " ".join(normalize_text(text).split()),
+            voice_audio_hash(voice_path),
+            f"{float(exaggeration):.4f}",
+            f"{float(cfg_weight):.4f}",
+            response_format,
+            f"{float(speed):.4f}",
+            get_model_version(),
+        ]
+        return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+    def get(self, key: str):
+        """Return the cached bytes for key, or None on a miss"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+            on_disk = key in self._disk
+            if on_disk:
+                self._disk.move_to_end(key)
+        if on_disk:
+            try:
+                with open(self._disk_path(key), "rb") as f:
+                    data = f.read()
+            except OSError:
+                with self._lock:
+                    self._evict_disk(key)
+                data = None
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store_memory(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        with self._lock:
+            self._store_memory(key, data)
+        if not self.cache_dir or len(data) > self.disk_budget:
+            return
+        path = self._disk_path(key)
+        try:
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(data)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            print(f"Error writing result cache entry {path}: {e}")
+            return
+        with self._lock:
+            self._disk_size += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            self._written[key] = time.time()
+            while self._disk_size > self.disk_budget and self._disk:
+                self._evict_disk(next(iter(self._disk)))
+
+    def expire(self, written_before: float):
+        """Remove disk entries written before the given time; returns how many were removed"""
+        with self._lock:
+            keys = [key for key, written in self._written.items() if written < written_before]
+            for key in keys:
+                self._evict_disk(key)
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_size,
+            }
+
+    def _store_memory(self, key, data):
+        if len(data) > self.memory_budget:
+            return
+        self._memory_size += len(data) - len(self._memory.pop(key, b""))
+        self._memory[key] = data
+        while self._memory_size > self.memory_budget and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _evict_disk(self, key):
+        self._disk_size -= self._disk.pop(key, 0)
+        self._written.pop(key, None)
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    def _index_disk(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".bin"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[: -len(".bin")], stat.st_size))
+        for modified, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+            self._written[key] = modified
+        while self._disk_size > self.disk_budget and self._disk:
+            self._evict_disk(next(iter(self._disk)))
+
+
+result_cache = None
+chunk_cache = None
+
+
+def get_result_cache():
+    global result_cache
+    if result_cache is None:
+        result_cache = ResultCache()
+    return result_cache
+
+
+def get_chunk_cache():
+    """Cache of raw float32 samples per synthesized chunk, for partial reuse across long documents"""
+    global chunk_cache
+    if chunk_cache is None:
+        chunk_cache = ResultCache(CHUNK_CACHE_MEMORY_MB, CHUNK_CACHE_DISK_MB, CHUNK_CACHE_DIR)
+    return chunk_cache
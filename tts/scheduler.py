@@ -0,0 +1,136 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config.constants import INFERENCE_QUEUE_SIZE, INFERENCE_TIMEOUT, NUM_OF_WORKERS
+from tts.priority import FairQueue
+
+
+# Set (a threading.Event) while a job runs; it fires when the caller stops waiting for the
+# job, on timeout or disconnect, so long jobs can stop submitting work nobody will receive
+current_cancel = contextvars.ContextVar("current_cancel", default=None)
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue cannot accept another job"""
+
+
+class InferenceScheduler:
+    """Bounded queue of blocking TTS jobs served by a fixed pool of model workers.
+
+    Jobs run in worker threads so the event loop stays free for other requests
+    (voice listing, health checks, file downloads) while the model is busy. There is
+    one job slot per model worker, since a worker generates one text at a time; the
+    micro-batcher groups the chunks a job submits together. Waiting jobs are taken
+    by priority class, round-robin between clients (see FairQueue).
+    """
+
+    def __init__(self, num_workers: int = NUM_OF_WORKERS, queue_size: int = INFERENCE_QUEUE_SIZE, timeout: float = INFERENCE_TIMEOUT):
+        self.slots = max(1, num_workers)
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._pending = None
+        self._ready = None
+        self._workers = []
+        self._executor = None
+
+    @property
+    def running(self):
+        return self._pending is not None
+
+    @property
+    def depth(self):
+        """Number of jobs waiting for a worker"""
+        return len(self._pending) if self._pending else 0
+
+    async def start(self):
+        if self.running:
+            return
+        self._pending = FairQueue()
+        # Counts waiting jobs, so each worker wakes up for exactly one of them
+        self._ready = asyncio.Semaphore(0)
+        self._executor = ThreadPoolExecutor(max_workers=self.slots, thread_name_prefix="tts-worker")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.slots)]
+        print(f"Inference scheduler started ({self.slots} job slots, queue size {self.queue_size})")
+
+    async def stop(self):
+        if not self.running:
+            return
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        for _, future in self._pending.drain():
+            if not future.done():
+                future.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._pending = None
+        self._ready = None
+        self._workers = []
+        self._executor = None
+        print("Inference scheduler stopped")
+
+    async def run(self, fn, *args, timeout: float = None, **kwargs):
+        """Queue a blocking call and wait for its result.
+
+        The job is queued under the caller's priority class and client (see
+        tts.priority). Raises QueueFullError when the queue is saturated and
+        asyncio.TimeoutError when the job does not finish within the timeout.
+        """
+        if not self.running:
+            raise RuntimeError("Inference scheduler is not running")
+        future = asyncio.get_running_loop().create_future()
+        cancel = threading.Event()
+        future.add_done_callback(lambda future: future.cancelled() and cancel.set())
+        # Run the job in the caller's context (like asyncio.to_thread) so context variables such as the metrics endpoint label carry over
+        context = contextvars.copy_context()
+        context.run(current_cancel.set, cancel)
+        job = functools.partial(context.run, fn, *args, **kwargs)
+        if len(self._pending) >= self.queue_size:
+            raise QueueFullError(f"Inference queue is full ({self.queue_size} jobs waiting)")
+        self._pending.push((job, future))
+        self._ready.release()
+        # wait_for cancels the future on timeout or when the caller goes away, so a job still
+        # in the queue is skipped and a running one sees current_cancel set
+        return await asyncio.wait_for(future, timeout or self.timeout)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._ready.acquire()
+            job, future = self._pending.pop()
+            if future.cancelled():
+                continue
+            try:
+                result = await loop.run_in_executor(self._executor, job)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+
+scheduler = None
+
+
+def get_scheduler():
+    global scheduler
+    if scheduler is None:
+        scheduler = InferenceScheduler()
+    return scheduler
+
+
+async def start_scheduler():
+    """Start the inference scheduler (called from the FastAPI lifespan)"""
+    await get_scheduler().start()
+    return scheduler
+
+
+async def stop_scheduler():
+    """Stop the inference scheduler and cancel any queued jobs"""
+    global scheduler
+    if scheduler is not None:
+        await scheduler.stop()
+    scheduler = None
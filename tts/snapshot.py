@@ -0,0 +1,215 @@
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import torch
+from chatterbox.models.s3gen import S3Gen
+from chatterbox.models.t3 import T3
+from chatterbox.models.tokenizers import EnTokenizer
+from chatterbox.models.voice_encoder import VoiceEncoder
+from chatterbox.tts import REPO_ID, ChatterboxTTS, Conditionals
+from huggingface_hub import hf_hub_download
+from safetensors.torch import load_file, save_file
+
+from config.constants import MODEL_DTYPE, MODEL_OFFLINE, MODEL_SNAPSHOT_DIR
+
+SNAPSHOT_FORMAT = 1
+HUB_FILES = ["ve.pt", "t3_cfg.pt", "s3gen.pt", "tokenizer.json", "conds.pt"]
+COMPONENTS = {"ve": VoiceEncoder, "t3": T3, "s3gen": S3Gen}
+CHECKPOINTS = {"ve": "ve.pt", "t3": "t3_cfg.pt", "s3gen": "s3gen.pt"}
+
+DTYPES = {"float32": torch.float32, "float16": torch.float16, "bfloat16": torch.bfloat16}
+
+
+class StageTimer:
+    """Collects how long each named loading stage took"""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(time.perf_counter() - started, 3)
+
+
+def module_tensors(module: torch.nn.Module):
+    """Every tensor a module needs at inference time: parameters, all buffers (including
+    non-persistent ones such as rotary frequencies) and plain tensor attributes.
+    """
+    tensors = {}
+    for prefix, submodule in module.named_modules():
+        owned = {**submodule._parameters, **submodule._buffers}
+        owned.update((name, value) for name, value in vars(submodule).items() if torch.is_tensor(value))
+        for name, value in owned.items():
+            if value is not None:
+                tensors[f"{prefix}.{name}" if prefix else name] = value
+    return tensors
+
+
+def assign_tensors(module: torch.nn.Module, tensors: dict, aliases: dict):
+    """Install snapshot tensors into a module without copying them"""
+    for name, source in {**{name: name for name in tensors}, **aliases}.items():
+        prefix, _, attr = name.rpartition(".")
+        submodule = module.get_submodule(prefix)
+        value = tensors[source]
+        if attr in submodule._parameters:
+            submodule._parameters[attr] = torch.nn.Parameter(value, requires_grad=False)
+        elif attr in submodule._buffers:
+            submodule._buffers[attr] = value
+        else:
+            setattr(submodule, attr, value)
+    for submodule in module.modules():
+        if isinstance(submodule, torch.nn.RNNBase):
+            # RNNs keep their own list of weight references
+            submodule._init_flat_weights()
+
+
+def has_meta_tensors(module: torch.nn.Module):
+    for submodule in module.modules():
+        for value in vars(submodule).values():
+            values = value.values() if isinstance(value, dict) else value if isinstance(value, (list, tuple)) else [value]
+            if any(torch.is_tensor(item) and item.is_meta for item in values):
+                return True
+    return False
+
+
+def snapshot_path(dtype: str = MODEL_DTYPE, root: str = MODEL_SNAPSHOT_DIR):
+    return Path(root) / dtype
+
+
+def is_snapshot(path: Path):
+    return (path / "manifest.json").exists()
+
+
+def resolve_hub_files(offline: bool = MODEL_OFFLINE):
+    """Download (or, offline, locate in the hub cache) the original checkpoints"""
+    local_path = None
+    for filename in HUB_FILES:
+        local_path = hf_hub_download(repo_id=REPO_ID, filename=filename, local_files_only=offline)
+    return Path(local_path).parent
+
+
+def build_snapshot(path: Path, dtype: str = MODEL_DTYPE, offline: bool = MODEL_OFFLINE):
+    """Convert the hub checkpoints into safetensors files already in the target dtype.
+
+    The snapshot is written to a temporary directory and renamed into place, so a
+    crash or a concurrent worker never leaves a half-written snapshot behind.
+    """
+    ckpt_dir = resolve_hub_files(offline)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    # The hub cache keeps each commit of the repo in a directory named after it
+    manifest = {"format": SNAPSHOT_FORMAT, "dtype": dtype, "repo": REPO_ID, "revision": ckpt_dir.name, "components": {}}
+    for name, factory in COMPONENTS.items():
+        state = torch.load(ckpt_dir / CHECKPOINTS[name], map_location="cpu", weights_only=True)
+        if "model" in state.keys():
+            state = state["model"][0]
+        module = factory()
+        # assign avoids holding a second copy of the weights while converting
+        module.load_state_dict(state, assign=True)
+        del state
+
+        tensors, aliases, complex_keys, seen, storages = {}, {}, [], {}, set()
+        for key, value in module_tensors(module).items():
+            value = value.detach()
+            storage = value.untyped_storage().data_ptr()
+            identity = (storage, value.storage_offset(), tuple(value.shape), value.stride())
+            if value.numel() and identity in seen:
+                aliases[key] = seen[identity]
+                continue
+            seen[identity] = key
+            if value.is_complex():
+                # safetensors has no complex dtypes (rotary tables), store them as (real, imag) pairs
+                value = torch.view_as_real(value)
+                complex_keys.append(key)
+            elif value.is_floating_point():
+                value = value.to(DTYPES[dtype])
+            # safetensors refuses tensors that share storage, so views get their own copy
+            tensors[key] = value.clone() if storage in storages or not value.is_contiguous() else value
+            storages.add(storage)
+        save_file(tensors, tmp_path / f"{name}.safetensors")
+        manifest["components"][name] = {"aliases": aliases, "complex": complex_keys}
+        del module, tensors
+
+    for filename in ("tokenizer.json", "conds.pt"):
+        shutil.copy(ckpt_dir / filename, tmp_path / filename)
+    with open(tmp_path / "manifest.json", "w") as f:
+        json.dump(manifest, f)
+
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        # Another worker finished first; use its snapshot
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def load_component(name: str, path: Path, entry: dict, device: str):
+    tensors = load_file(path / f"{name}.safetensors", device=str(device))
+    for key in entry["complex"]:
+        tensors[key] = torch.view_as_complex(tensors[key])
+    aliases = entry["aliases"]
+    # Building on the meta device skips random weight initialisation, the slowest part of a cold start
+    with torch.device("meta"):
+        module = COMPONENTS[name]()
+    assign_tensors(module, tensors, aliases)
+    if has_meta_tensors(module):
+        print(f"Snapshot of {name} is missing tensors, initialising it normally")
+        module = COMPONENTS[name]()
+        assign_tensors(module, tensors, aliases)
+    return module.to(device).eval()
+
+
+def load_snapshot(path: Path, device: str, timer: StageTimer):
+    with open(path / "manifest.json") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported model snapshot format {manifest.get('format')}")
+
+    modules = {}
+    for name in COMPONENTS:
+        with timer.stage(name):
+            modules[name] = load_component(name, path, manifest["components"][name], device)
+    with timer.stage("tokenizer"):
+        tokenizer = EnTokenizer(str(path / "tokenizer.json"))
+    with timer.stage("conds"):
+        conds = Conditionals.load(path / "conds.pt", map_location=device).to(device)
+        dtype = DTYPES[manifest["dtype"]]
+        if dtype != torch.float32:
+            conds.t3.to(dtype=dtype)
+            conds.gen = {key: value.to(dtype) if torch.is_tensor(value) and value.is_floating_point() else value for key, value in conds.gen.items()}
+    with timer.stage("assemble"):
+        return ChatterboxTTS(modules["t3"], modules["s3gen"], modules["ve"], tokenizer, device, conds=conds)
+
+
+def load_from_snapshot(device: str, dtype: str = MODEL_DTYPE, root: str = MODEL_SNAPSHOT_DIR, offline: bool = MODEL_OFFLINE):
+    """Load ChatterboxTTS from the local safetensors snapshot, creating it on first use.
+
+    Once the snapshot exists the hub is never contacted. Returns the model and a
+    dict of per-stage load timings in seconds.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported MODEL_DTYPE {dtype}, expected one of {', '.join(DTYPES)}")
+    timer = StageTimer()
+    path = snapshot_path(dtype, root)
+    if not is_snapshot(path):
+        with timer.stage("snapshot"):
+            print(f"Creating model snapshot in {path}")
+            build_snapshot(path, dtype, offline)
+    try:
+        model = load_snapshot(path, device, timer)
+    except Exception as e:
+        print(f"Model snapshot in {path} is unusable ({e}), rebuilding it")
+        shutil.rmtree(path, ignore_errors=True)
+        with timer.stage("snapshot"):
+            build_snapshot(path, dtype, offline)
+        model = load_snapshot(path, device, timer)
+    return model, timer.timings
@@ -0,0 +1,209 @@
+import atexit
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from config.constants import TRACE_FILE, TRACING_ENABLED
+
+# Span of the stage currently running; stages started while it is set become its children
+current_span = contextvars.ContextVar("current_span", default=None)
+
+# Seconds between writes of finished spans to the trace file
+EXPORT_INTERVAL = 1.0
+
+
+class Span:
+    """A timed stage of a request, modelled on OpenTelemetry spans"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, start_ns: int = None, attributes: dict = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def child(self, name: str, start_ns: int = None, **attributes):
+        return Span(name, self.trace_id, self.span_id, start_ns, attributes)
+
+    def end(self, end_ns: int = None):
+        self.end_ns = end_ns or time.time_ns()
+        tracer.finish(self)
+
+    def to_dict(self):
+        """OTLP/JSON span fields, so the export can be loaded by OpenTelemetry tooling"""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": {"stringValue": str(value)}} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+
+    @classmethod
+    def remote_parent(cls, trace_id: str, span_id: str):
+        """Stand-in for a span owned by another thread or process, used only as a parent"""
+        parent = cls("remote", trace_id)
+        parent.span_id = span_id
+        return parent
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        span = cls(data["name"], data["traceId"], data["parentSpanId"] or None, int(data["startTimeUnixNano"]))
+        span.span_id = data["spanId"]
+        span.end_ns = int(data["endTimeUnixNano"])
+        span.attributes = {attribute["key"]: attribute["value"]["stringValue"] for attribute in data["attributes"]}
+        span.error = data["status"].get("message")
+        return span
+
+
+class Tracer:
+    """Collects finished spans per active trace (for the debug header) and appends them to a JSON lines file.
+
+    Exported spans are buffered and written in batches by a background thread (and at
+    exit), so finishing a span on the request path never touches the disk.
+    """
+
+    def __init__(self, trace_file: str = TRACE_FILE, export: bool = TRACING_ENABLED):
+        self.trace_file = trace_file
+        self.export = export and bool(trace_file)
+        self._traces = {}
+        self._lock = threading.Lock()
+        self._unwritten = []
+        self._export_lock = threading.Lock()
+        self._writer = None
+
+    def start_trace(self, name: str, **attributes):
+        span = Span(name, secrets.token_hex(16), attributes=attributes)
+        with self._lock:
+            self._traces[span.trace_id] = []
+        return span
+
+    def collect(self, trace_id: str):
+        """Keep the spans finished for trace_id in memory until end_trace or release"""
+        with self._lock:
+            self._traces.setdefault(trace_id, [])
+
+    def spans(self, trace_id: str):
+        """Spans finished so far for an active trace"""
+        with self._lock:
+            return list(self._traces.get(trace_id, []))
+
+    def release(self, trace_id: str):
+        with self._lock:
+            return self._traces.pop(trace_id, [])
+
+    def end_trace(self, root: Span):
+        """Finish the root span and return every span recorded for its trace"""
+        if root.end_ns is None:
+            root.end()
+        return self.release(root.trace_id)
+
+    def finish(self, span: Span):
+        with self._lock:
+            if span.trace_id in self._traces:
+                self._traces[span.trace_id].append(span)
+        if self.export:
+            with self._export_lock:
+                self._unwritten.append(span)
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_periodically, name="trace-writer", daemon=True)
+                    self._writer.start()
+                    atexit.register(self.flush)
+
+    def flush(self):
+        """Append the spans finished since the last write to the trace file"""
+        with self._export_lock:
+            spans, self._unwritten = self._unwritten, []
+        if not spans:
+            return
+        lines = "".join(json.dumps(span.to_dict()) + "\n" for span in spans)
+        os.makedirs(os.path.dirname(self.trace_file) or ".", exist_ok=True)
+        with open(self.trace_file, "a") as f:
+            f.write(lines)
+
+    def _write_periodically(self):
+        while True:
+            time.sleep(EXPORT_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error writing traces: {e}")
+
+
+tracer = Tracer()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a stage as a child of the current span; does nothing outside a traced request"""
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    stage = parent.child(name, **attributes)
+    token = current_span.set(stage)
+    try:
+        yield stage
+    except BaseException as e:
+        stage.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current_span.reset(token)
+        stage.end()
+
+
+@contextmanager
+def within(parent: Span):
+    """Make parent the current span, e.g. in a batcher thread working on a traced request"""
+    token = current_span.set(parent)
+    try:
+        yield
+    finally:
+        current_span.reset(token)
+
+
+def record_span(parent: Span, name: str, start_ns: int, end_ns: int = None, **attributes):
+    """Record a stage whose timing was measured outside a span() block"""
+    if parent is not None:
+        parent.child(name, start_ns, **attributes).end(end_ns)
+
+
+def traced(name: str, fn):
+    """Wrap a callable so each call is recorded as a span (used on model sub-modules)"""
+
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def stage_breakdown(spans: list[Span]):
+    """Total milliseconds per stage name, in the order stages first started"""
+    totals = defaultdict(float)
+    for stage in sorted(spans, key=lambda stage: stage.start_ns):
+        totals[stage.name] += stage.duration_ms
+    return dict(totals)
+
+
+def server_timing(spans: list[Span], total_ms: float = None):
+    """Server-Timing header value for a trace's stages"""
+    stages = stage_breakdown(spans)
+    if total_ms is not None:
+        stages["total"] = total_ms
+    return ", ".join(f"{name};dur={duration:.1f}" for name, duration in stages.items())
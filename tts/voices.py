@@ -1,7 +1,20 @@
 import json
 import os
+import threading
+import time
+from contextlib import contextmanager
 from typing import TypedDict
 
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+from config.constants import VOICES_RELOAD_INTERVAL
+from tts.conditioning import invalidate_voice_conditioning
+
+VOICES_FILE = "config/voices.json"
+
 
 class Voice(TypedDict):
     name: str
@@ -10,49 +23,154 @@ class Voice(TypedDict):
     cfg_weight: float
 
 
-def get_voices():
-    """returns all the current custom voices. If no voices are found, it creates a new file and returns an empty list."""
-    voices: list[Voice] = []
-    try:
-        if os.path.exists("config/voices.json"):
-            with open("config/voices.json", "r") as f:
-                voices = json.load(f)
-        else:
-            os.makedirs("config", exist_ok=True)
-            voices = []
-            with open("config/voices.json", "w") as f:
-                json.dump(voices, f)
-    except Exception as e:
-        print(f"Error getting voices: {e}")
-        return voices
+class VoiceRegistry:
+    """In-memory index of config/voices.json.
+
+    Lookups are served from a name -> voice dict without touching the disk. A
+    background thread reloads the index when the file's mtime changes, so voices
+    saved by other workers show up within VOICES_RELOAD_INTERVAL seconds.
+    Mutations hold an in-process lock plus an exclusive file lock, re-read the
+    file, and persist with an atomic write-and-rename so concurrent writers never
+    lose updates.
+    """
+
+    def __init__(self, path: str = VOICES_FILE, reload_interval: float = VOICES_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._voices: list[Voice] = []
+        self._index: dict[str, Voice] = {}
+        self._stamp = None
+        self._lock = threading.RLock()
+        self._watcher = None
+        self._load()
+
+    def all(self):
+        with self._lock:
+            return list(self._voices)
+
+    def get(self, name: str):
+        return self._index.get(name)
+
+    def add(self, voice: Voice):
+        with self._locked_file():
+            self._load()
+            replaced = self._index.get(voice["name"])
+            if replaced:
+                invalidate_voice_conditioning(replaced["path"])
+            voices = [existing for existing in self._voices if existing["name"] != voice["name"]]
+            voices.append(voice)
+            invalidate_voice_conditioning(voice["path"])
+            self._save(voices)
+            return list(voices)
+
+    def delete(self, name: str):
+        with self._locked_file():
+            self._load()
+            removed = self._index.get(name)
+            if removed:
+                invalidate_voice_conditioning(removed["path"])
+            voices = [voice for voice in self._voices if voice["name"] != name]
+            self._save(voices)
+            return list(voices)
+
+    def start_watching(self):
+        """Start the background thread that reloads the index when the file changes"""
+        if self._watcher is None or not self._watcher.is_alive():
+            self._watcher = threading.Thread(target=self._watch, name="voice-registry", daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.reload_interval)
+            try:
+                if self._file_stamp() != self._stamp:
+                    with self._lock:
+                        self._load()
+            except Exception as e:
+                print(f"Error reloading voices: {e}")
 
-  
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
 
-    return voices
+    def _load(self):
+        with self._lock:
+            voices: list[Voice] = []
+            try:
+                if os.path.exists(self.path):
+                    with open(self.path, "r") as f:
+                        voices = json.load(f)
+                else:
+                    self._save([])
+                    return
+            except Exception as e:
+                print(f"Error getting voices: {e}")
+                return
+            self._set(voices, self._file_stamp())
+
+    def _save(self, voices: list[Voice]):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(voices, f)
+        os.replace(tmp_path, self.path)
+        self._set(voices, self._file_stamp())
+
+    def _set(self, voices: list[Voice], stamp):
+        with self._lock:
+            self._voices = voices
+            # First entry wins for duplicate names, matching the old linear scan
+            index = {}
+            for voice in voices:
+                index.setdefault(voice["name"], voice)
+            self._index = index
+            self._stamp = stamp
+
+    @contextmanager
+    def _locked_file(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(f"{self.path}.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global registry
+    with _registry_lock:
+        if registry is None:
+            registry = VoiceRegistry()
+            registry.start_watching()
+    return registry
+
+
+def get_voices():
+    """returns all the current custom voices. If no voices are found, it creates a new file and returns an empty list."""
+    return get_registry().all()
 
 
 def get_voice_by_name(name: str):
     """returns a voice object by name"""
-    try:
-        voices = get_voices()
-        return next((voice for voice in voices if voice["name"] == name), None)
-    except Exception as e:
-        print(f"Error getting voice by name: {e}")
-        return None
-    
-    
+    return get_registry().get(name)
+
+
 def add_voice(voice: Voice):
-    """adds a voice to the voices.json file"""
-    voices = get_voices()
-    voices.append(voice)
-    with open("config/voices.json", "w") as f:
-        json.dump(voices, f)
-    return voices
+    """adds a voice to the voices.json file, replacing any existing voice with the same name"""
+    return get_registry().add(voice)
 
 def delete_voice(name: str):
     """deletes a voice from the voices.json file"""
-    voices = get_voices()
-    voices = [voice for voice in voices if voice["name"] != name]
-    with open("config/voices.json", "w") as f:
-        json.dump(voices, f)
-    return voices
\ No newline at end of file
+    return get_registry().delete(name)
@@ -0,0 +1,111 @@
+import itertools
+import threading
+import time
+
+from config.constants import WARMUP_LENGTHS, WARMUP_RUNS, WARMUP_VOICES
+from tts.batcher import get_batcher, worker_stats
+from tts.voices import get_voices
+
+WARMUP_SENTENCES = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Warming up the model before real requests arrive keeps the first response fast.",
+    "Every replica runs a few generations so its kernels and caches are ready.",
+]
+
+
+class WarmupState:
+    """Progress of the startup warmup, read by the readiness probe"""
+
+    def __init__(self):
+        self.status = "pending"
+        self.completed = 0
+        self.total = 0
+        self.seconds = None
+        self.errors = []
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.status in ("done", "skipped")
+
+    def advance(self, error: Exception = None):
+        with self._lock:
+            self.completed += 1
+            if error is not None:
+                self.errors.append(str(error))
+
+    def to_dict(self):
+        return {
+            "status": self.status,
+            "completed": self.completed,
+            "total": self.total,
+            "seconds": self.seconds,
+            "errors": self.errors[:10],
+        }
+
+
+warmup_state = WarmupState()
+
+
+def warmup_text(length: int):
+    """Synthetic text of roughly length characters, cut at a word boundary"""
+    text = ""
+    for word in itertools.cycle(" ".join(WARMUP_SENTENCES).split()):
+        if text and len(text) + len(word) + 1 > length:
+            return text
+        text = f"{text} {word}" if text else word
+
+
+def warmup_voices(spec: str = WARMUP_VOICES):
+    """Voice settings to warm: "all" (built-in and every saved voice), "default", or a comma separated list of names"""
+    # The built-in voice's settings in /v1/audio/speech (app.resolve_voice), so warmup primes the same entries
+    default = {"name": "default", "path": None, "exaggeration": 0.5, "cfg_weight": 0.4}
+    if spec == "default":
+        return [default]
+    voices = get_voices()
+    if spec != "all":
+        names = {name.strip() for name in spec.split(",")}
+        return [default] * ("default" in names) + [voice for voice in voices if voice["name"] in names]
+    return [default] + voices
+
+
+def run_warmup(runs: int = WARMUP_RUNS, lengths: list[int] = WARMUP_LENGTHS, voices_spec: str = WARMUP_VOICES):
+    """Run synthetic generations for every voice and text length bucket on every worker.
+
+    Each round submits one request per worker at once; the batchers route by queue
+    depth, so every replica gets one and warms its kernels, allocator and the
+    voice conditioning cache.
+    """
+    state = warmup_state
+    if runs <= 0 or not lengths:
+        state.status = "skipped"
+        return state
+
+    started = time.perf_counter()
+    workers = len(worker_stats())
+    plan = [(voice, length) for voice in warmup_voices(voices_spec) for length in lengths] * runs
+    state.status = "running"
+    state.total = len(plan) * workers
+    for voice, length in plan:
+        futures = [
+            get_batcher().submit(
+                warmup_text(length),
+                exaggeration=voice["exaggeration"],
+                cfg_weight=voice["cfg_weight"],
+                voice_path=voice["path"],
+            )
+            for _ in range(workers)
+        ]
+        for future in futures:
+            try:
+                future.result()
+                state.advance()
+            except Exception as e:
+                # A broken saved voice should not keep the whole server out of rotation
+                print(f"Warmup generation for voice {voice['name']} failed: {e}")
+                state.advance(e)
+    state.seconds = round(time.perf_counter() - started, 2)
+    # Only a model that failed every generation is considered not ready
+    state.status = "failed" if len(state.errors) == state.total else "done"
+    print(f"Warmup {state.status}: {state.total} generations in {state.seconds}s")
+    return state
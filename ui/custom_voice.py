@@ -1,4 +1,3 @@
-import json
 import shutil
 import sys
 from pathlib import Path
@@ -8,8 +7,10 @@ from audio.audio_utils import convert_to_wav
 
 sys.path.append(str(Path(__file__).parent.parent))  # Adds the parent directory to path
 import gradio as gr
+from tts.conditioning import invalidate_voice_conditioning
 from tts.inference import generate_audio
-from tts.voices import get_voices
+from tts.voices import add_voice, get_voice_by_name, get_voices
+from tts.voices import delete_voice as remove_voice
 
 
 
@@ -41,18 +42,15 @@ def save_voice(audio_file, voice_name, exaggeration = 0.5, cfg_weight = 0.5):
 
     print(f"Saving new voice '{voice_name}'")
 
-    voices = get_voices()
-
-    if voice_name and len(voices) > 0 and [voice for voice in voices if voice["name"] == voice_name]:
+    if get_voice_by_name(voice_name):
         gr.Warning(f"Voice '{voice_name}' already exists. Please enter a different name.")
         return gr.update()
 
     new_voice_path = f"voices/{voice_name}.wav"
     shutil.copy(audio_file, new_voice_path)
+    invalidate_voice_conditioning(new_voice_path)
     # save the voice
-    voices.append({"name": voice_name, "path": new_voice_path, "exaggeration": exaggeration, "cfg_weight": cfg_weight})
-    with open("config/voices.json", "w") as f:
-        json.dump(voices, f)
+    add_voice({"name": voice_name, "path": new_voice_path, "exaggeration": exaggeration, "cfg_weight": cfg_weight})
    
 
  
@@ -69,13 +67,8 @@ def delete_voice(voice_name):
         gr.Warning("Please select a valid voice to delete.")
         return gr.update()
     
-    voices = get_voices()
-    # Remove the voice from the list
-    voices = [voice for voice in voices if voice["name"] != voice_name]
-    
-    # Save updated voices list
-    with open("config/voices.json", "w") as f:
-        json.dump(voices, f)
+    # Remove the voice from the registry (also drops its cached conditioning)
+    remove_voice(voice_name)
     
     # Delete the voice file
     try: